@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+from __future__ import unicode_literals
+import frappe
+from frappe.utils import flt, cstr, getdate, get_first_day, now
+from frappe.model.document import Document
+
+KEY_FIELDS = ("company", "account", "cost_center", "party_type", "party",
+	"period_start_date", "is_period_closing_voucher")
+AMOUNT_FIELDS = ("debit", "credit", "debit_in_account_currency", "credit_in_account_currency")
+BALANCE_FIELDS = ["name", "creation", "modified", "owner", "modified_by", "docstatus"]
+
+class AccountBalance(Document):
+	pass
+
+def get_balance_key(gle):
+	return (gle.company, gle.account, cstr(gle.cost_center), cstr(gle.party_type), cstr(gle.party),
+		get_first_day(gle.posting_date), 1 if gle.voucher_type == "Period Closing Voucher" else 0)
+
+def update_account_balances(gl_entries, reverse=False):
+	"""Add the amounts of posted `gl_entries` to the monthly balances, or subtract them if `reverse`"""
+	balances = {}
+	for gle in gl_entries:
+		amounts = balances.setdefault(get_balance_key(gle), [0.0] * len(AMOUNT_FIELDS))
+		for i, fieldname in enumerate(AMOUNT_FIELDS):
+			amounts[i] += flt(gle.get(fieldname)) * (-1 if reverse else 1)
+
+	for key in sorted(balances):
+		add_to_balance(key, balances[key])
+
+def add_to_balance(key, amounts):
+	"""Add `amounts` to the balance of `key`, inserting it if it does not exist yet.
+
+	Done in one statement on the unique key, so that the first postings to a balance
+	made at the same time do not both insert it."""
+	fields = BALANCE_FIELDS + list(KEY_FIELDS) + list(AMOUNT_FIELDS)
+
+	if frappe.db.db_type == "postgres":
+		on_conflict = "on conflict ({0}) do update set {1}".format(
+			", ".join("`{0}`".format(d) for d in KEY_FIELDS),
+			", ".join("`{0}` = `tabAccount Balance`.`{0}` + excluded.`{0}`".format(d) for d in AMOUNT_FIELDS))
+	else:
+		on_conflict = "on duplicate key update {0}".format(
+			", ".join("`{0}` = `{0}` + values(`{0}`)".format(d) for d in AMOUNT_FIELDS))
+
+	frappe.db.sql("""insert into `tabAccount Balance` ({0}) values ({1}) {2}""".format(
+		", ".join("`{0}`".format(d) for d in fields), ", ".join(["%s"] * len(fields)), on_conflict),
+		tuple(get_balance_values(key, amounts)))
+
+def insert_balances(values):
+	"""`values` are rows of key and amount fields"""
+	fields = BALANCE_FIELDS + list(KEY_FIELDS) + list(AMOUNT_FIELDS)
+
+	frappe.db.bulk_insert("Account Balance", fields, [get_balance_values(d) for d in values])
+
+def get_balance_values(key, amounts=()):
+	timestamp = now()
+	return [frappe.generate_hash(length=10), timestamp, timestamp, "Administrator", "Administrator", 0] \
+		+ list(key) + list(amounts)
+
+def get_balance(conditions, date=None, year_start_date=None, in_account_currency=True):
+	"""Balance of GL Entries matching `conditions` (on `gle.` columns common to GL Entry and
+	Account Balance) upto `date`, from `year_start_date` if given (P&L accounts).
+
+	Whole months are read from Account Balance, the days of the current month from GL Entry.
+	Returns None if the period cannot be answered from monthly balances."""
+	if year_start_date and getdate(year_start_date) != get_first_day(year_start_date):
+		return None
+
+	if in_account_currency:
+		select_field = "sum(debit_in_account_currency) - sum(credit_in_account_currency)"
+	else:
+		select_field = "sum(debit) - sum(credit)"
+
+	balance_conditions, gle_conditions = list(conditions), list(conditions)
+	if year_start_date:
+		balance_conditions.append("period_start_date >= %s and is_period_closing_voucher = 0"
+			% frappe.db.escape(cstr(year_start_date)))
+		gle_conditions.append("voucher_type != 'Period Closing Voucher'")
+
+	balance = 0.0
+	if date:
+		month_start = get_first_day(date)
+		balance_conditions.append("period_start_date < %s" % frappe.db.escape(cstr(month_start)))
+		gle_conditions.append("posting_date between %s and %s"
+			% (frappe.db.escape(cstr(month_start)), frappe.db.escape(cstr(getdate(date)))))
+
+		balance += flt(frappe.db.sql("""
+			SELECT {0}
+			FROM `tabGL Entry` gle
+			WHERE {1}""".format(select_field, " and ".join(gle_conditions)))[0][0])
+
+	balance += flt(frappe.db.sql("""
+		SELECT {0}
+		FROM `tabAccount Balance` gle
+		WHERE {1}""".format(select_field, " and ".join(balance_conditions) or "1=1"))[0][0])
+
+	return balance
+
+def get_balances_from_gl_entries(company=None):
+	return frappe.db.sql("""
+		select company, account, ifnull(cost_center, ''), ifnull(party_type, ''), ifnull(party, ''),
+			{period_start_date},
+			case when voucher_type = 'Period Closing Voucher' then 1 else 0 end as is_period_closing_voucher,
+			sum(debit), sum(credit), sum(debit_in_account_currency), sum(credit_in_account_currency)
+		from `tabGL Entry`
+		where {condition}
+		group by company, account, ifnull(cost_center, ''), ifnull(party_type, ''), ifnull(party, ''),
+			{period_start_date}, is_period_closing_voucher""".format(
+			period_start_date=get_period_start_date_sql(),
+			condition="company = %s" if company else "1=1"), company)
+
+def get_period_start_date_sql():
+	if frappe.db.db_type == "postgres":
+		return "cast(date_trunc('month', posting_date) as date)"
+
+	return "date_sub(posting_date, interval dayofmonth(posting_date) - 1 day)"
+
+def rebuild_account_balances(company=None):
+	"""Recompute balances of `company` (or all companies) from GL Entries"""
+	frappe.db.sql("""delete from `tabAccount Balance` where {0}""".format(
+		"company = %s" if company else "1=1"), company)
+
+	values = get_balances_from_gl_entries(company)
+	for i in range(0, len(values), 1000):
+		insert_balances(values[i:i + 1000])
+
+def get_balance_drift(company=None):
+	"""Keys whose maintained balance differs from the sum of their GL Entries,
+	as a list of (key, maintained amounts, expected amounts)"""
+	expected = {tuple(d[:len(KEY_FIELDS)]): d[len(KEY_FIELDS):]
+		for d in get_balances_from_gl_entries(company)}
+
+	maintained = {}
+	for d in frappe.get_all("Account Balance", fields=list(KEY_FIELDS) + list(AMOUNT_FIELDS),
+		filters={"company": company} if company else None):
+			maintained[tuple(d.get(f) for f in KEY_FIELDS)] = [d.get(f) for f in AMOUNT_FIELDS]
+
+	drift = []
+	for key in set(expected) | set(maintained):
+		expected_amounts = [flt(d, 6) for d in expected.get(key) or [0] * len(AMOUNT_FIELDS)]
+		maintained_amounts = [flt(d, 6) for d in maintained.get(key) or [0] * len(AMOUNT_FIELDS)]
+		if expected_amounts != maintained_amounts:
+			drift.append((key, maintained_amounts, expected_amounts))
+
+	return drift
+
+def merge_account_balances(doc, method=None, old=None, new=None, merge=False):
+	"""`before_rename` of Account, Cost Center, Customer and Supplier.
+
+	Merging rewrites the link columns with plain updates, the balances of `old` would then
+	duplicate keys of `new`. They are added to the balances of `new` and deleted first."""
+	if not merge:
+		return
+
+	if doc.doctype == "Cost Center":
+		# completed with the abbreviation of the company by `CostCenter.before_rename`
+		from erpnext.setup.doctype.company.company import get_name_with_abbr
+		new = get_name_with_abbr(new, doc.company)
+
+	if doc.doctype in ("Account", "Cost Center"):
+		field = frappe.scrub(doc.doctype)
+		conditions, values = "{0} = %s".format(field), (old,)
+	else:
+		field = "party"
+		conditions, values = "party_type = %s and party = %s", (doc.doctype, old)
+
+	balances = frappe.db.sql("""select name, {0}, {1} from `tabAccount Balance` where {2} for update""".format(
+		", ".join(KEY_FIELDS), ", ".join(AMOUNT_FIELDS), conditions), values, as_dict=1)
+
+	for d in balances:
+		key = tuple(new if f == field else d.get(f) for f in KEY_FIELDS)
+		add_to_balance(key, [d.get(f) for f in AMOUNT_FIELDS])
+
+	for i in range(0, len(balances), 500):
+		frappe.db.sql("""delete from `tabAccount Balance` where name in %s""",
+			[tuple(d.name for d in balances[i:i + 500])])
+
+def on_doctype_update():
+	frappe.db.add_unique("Account Balance", list(KEY_FIELDS), constraint_name="unique_account_balance")
+	frappe.db.add_index("Account Balance", ["account", "period_start_date"])
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and Contributors
+# See license.txt
+from __future__ import unicode_literals
+
+import frappe
+import unittest
+from frappe.utils import nowdate, add_months, add_days
+from erpnext.accounts.utils import get_balance_on
+from erpnext.accounts.doctype.journal_entry.test_journal_entry import make_journal_entry
+from erpnext.accounts.doctype.account_balance.account_balance import (rebuild_account_balances,
+	get_balance_drift)
+
+class TestAccountBalance(unittest.TestCase):
+	def setUp(self):
+		rebuild_account_balances("_Test Company")
+
+	def test_balance_matches_gl_entries(self):
+		accounts = ["_Test Account Cost for Goods Sold - _TC", "_Test Bank - _TC"]
+
+		make_journal_entry(accounts[0], accounts[1], 100, posting_date=add_months(nowdate(), -1), submit=True)
+		make_journal_entry(accounts[0], accounts[1], 50, submit=True)
+		je = make_journal_entry(accounts[0], accounts[1], 30, submit=True)
+		je.cancel()
+
+		self.assertEqual(get_balance_drift("_Test Company"), [])
+
+		for account in accounts:
+			for date in (None, nowdate(), add_days(nowdate(), -1), add_months(nowdate(), -1)):
+				self.assertEqual(get_balance_on(account, date), get_balance_on_from_gl_entries(account, date))
+
+	def test_drift_is_reported(self):
+		make_journal_entry("_Test Account Cost for Goods Sold - _TC", "_Test Bank - _TC", 100, submit=True)
+		frappe.db.sql("""update `tabAccount Balance` set debit = debit + 1
+			where company = '_Test Company' limit 1""")
+
+		self.assertTrue(get_balance_drift("_Test Company"))
+
+		rebuild_account_balances("_Test Company")
+		self.assertEqual(get_balance_drift("_Test Company"), [])
+
+	def test_balances_folded_on_merge(self):
+		from erpnext.accounts.doctype.account.test_account import create_account
+		from erpnext.accounts.doctype.account.account import merge_account
+
+		accounts = [create_account(account_name=account_name, parent_account="Indirect Expenses - _TC",
+			company="_Test Company") for account_name in ("_Test Merged Expense", "_Test Merge Into Expense")]
+
+		# both accounts have a balance for the month, same cost center
+		for account in accounts:
+			make_journal_entry(account, "_Test Bank - _TC", 100, submit=True)
+
+		merge_account(accounts[0], accounts[1], 0, "Expense", "_Test Company")
+
+		self.assertFalse(frappe.db.exists("Account Balance", {"account": accounts[0]}))
+		self.assertEqual(get_balance_drift("_Test Company"), [])
+
+def get_balance_on_from_gl_entries(account, date):
+	frappe.flags.ignore_account_balances = True
+	try:
+		return get_balance_on(account, date)
+	finally:
+		frappe.flags.ignore_account_balances = False
@@ -53,7 +53,7 @@ class GLEntry(Document):
 			if not self.get(k):
 				frappe.throw(_("{0} is required").format(_(self.meta.get_label(k))))
 
-		account_type = frappe.db.get_value("Account", self.account, "account_type")
+		account_type = self.get_account_details().account_type
 		if not (self.party_type and self.party):
 			if account_type == "Receivable":
 				frappe.throw(_("{0} {1}: Customer is required against Receivable account {2}")
@@ -67,8 +67,19 @@ class GLEntry(Document):
 			frappe.throw(_("{0} {1}: Either debit or credit amount is required for {2}")
 				.format(self.voucher_type, self.voucher_no, self.account))
 
+	def get_account_details(self):
+		"""Account master values used in validation, `flags.account_details` can hold
+		the details of many accounts fetched upfront when validating entries in bulk"""
+		if self.flags.account_details is None:
+			self.flags.account_details = {}
+
+		if self.account not in self.flags.account_details:
+			self.flags.account_details.update(get_account_details([self.account]))
+
+		return self.flags.account_details.get(self.account) or frappe._dict()
+
 	def pl_must_have_cost_center(self):
-		if frappe.db.get_value("Account", self.account, "report_type") == "Profit and Loss":
+		if self.get_account_details().report_type == "Profit and Loss":
 			if not self.cost_center and self.voucher_type != 'Period Closing Voucher':
 				frappe.throw(_("{0} {1}: Cost Center is required for 'Profit and Loss' account {2}. Please set up a default Cost Center for the Company.")
 					.format(self.voucher_type, self.voucher_no, self.account))
@@ -81,7 +92,7 @@ class GLEntry(Document):
 
 	def validate_dimensions_for_pl_and_bs(self):
 
-		account_type = frappe.db.get_value("Account", self.account, "report_type")
+		account_type = self.get_account_details().report_type
 
 		for dimension in get_checks_for_pl_and_bs_accounts():
 
@@ -100,7 +111,7 @@ class GLEntry(Document):
 
 	def check_pl_account(self):
 		if self.is_opening=='Yes' and \
-				frappe.db.get_value("Account", self.account, "report_type")=="Profit and Loss" and \
+				self.get_account_details().report_type=="Profit and Loss" and \
 				self.voucher_type not in ['Purchase Invoice', 'Sales Invoice']:
 			frappe.throw(_("{0} {1}: 'Profit and Loss' type account {2} not allowed in Opening Entry")
 				.format(self.voucher_type, self.voucher_no, self.account))
@@ -108,8 +119,7 @@ class GLEntry(Document):
 	def validate_account_details(self, adv_adj):
 		"""Account must be ledger, active and not freezed"""
 
-		ret = frappe.db.sql("""select is_group, docstatus, company
-			from tabAccount where name=%s""", self.account, as_dict=1)[0]
+		ret = self.get_account_details()
 
 		if ret.is_group==1:
 			frappe.throw(_('''{0} {1}: Account {2} is a Group Account and group accounts cannot be used in
@@ -125,7 +135,7 @@ class GLEntry(Document):
 
 	def validate_cost_center(self):
 		if not hasattr(self, "cost_center_company"):
-			self.cost_center_company = {}
+			self.cost_center_company = self.flags.cost_center_company or {}
 
 		def _get_cost_center_company():
 			if not self.cost_center_company.get(self.cost_center):
@@ -168,6 +178,14 @@ class GLEntry(Document):
 			self.fiscal_year = get_fiscal_year(self.posting_date, company=self.company)[0]
 
 
+def get_account_details(accounts):
+	"""Returns {account: details} of the values of `accounts` used to validate GL Entries"""
+	return {d.name: d for d in frappe.db.sql("""
+		select name, account_type, report_type, root_type, is_group, docstatus, company,
+			account_currency, freeze_account, balance_must_be
+		from tabAccount where name in ({0})""".format(", ".join(["%s"] * len(accounts))),
+		tuple(accounts), as_dict=1)}
+
 def validate_balance_type(account, adv_adj=False):
 	if not adv_adj and account:
 		balance_must_be = frappe.db.get_value("Account", account, "balance_must_be")
@@ -271,6 +289,8 @@ def update_against_account(voucher_type, voucher_no):
 def on_doctype_update():
 	frappe.db.add_index("GL Entry", ["against_voucher_type", "against_voucher"])
 	frappe.db.add_index("GL Entry", ["voucher_type", "voucher_no"])
+	# chunks of the General Ledger are read in this order, see `general_ledger.iter_gl_entries`
+	frappe.db.add_index("GL Entry", ["company", "posting_date", "creation", "name"])
 
 def rename_gle_sle_docs():
 	for doctype in ["GL Entry", "Stock Ledger Entry"]:
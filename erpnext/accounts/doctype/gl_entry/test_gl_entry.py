@@ -3,9 +3,15 @@
 
 from __future__ import unicode_literals
 import frappe, unittest
+import time
+from frappe.utils import nowdate
 from frappe.model.naming import parse_naming_series
 from erpnext.accounts.doctype.journal_entry.test_journal_entry import make_journal_entry
 from erpnext.accounts.doctype.gl_entry.gl_entry import rename_gle_sle_docs
+from frappe.utils import flt, cstr
+from erpnext.accounts.general_ledger import (make_gl_entries, merge_similar_entries, use_bulk_insert,
+	BULK_INSERT_THRESHOLD)
+from erpnext.accounts.doctype.accounting_dimension.accounting_dimension import get_accounting_dimensions
 
 class TestGLEntry(unittest.TestCase):
 	def test_round_off_entry(self):
@@ -55,3 +61,119 @@ class TestGLEntry(unittest.TestCase):
 
 		new_naming_series_current_value = frappe.db.sql("SELECT current from tabSeries where name = %s", naming_series)[0][0]
 		self.assertEquals(old_naming_series_current_value + 2, new_naming_series_current_value)
+
+	def test_bulk_insert_matches_row_wise_insert(self):
+		timings = benchmark_gl_insert(BULK_INSERT_THRESHOLD, rollback=False)
+
+		fields = ["account", "cost_center", "debit", "credit", "debit_in_account_currency",
+			"credit_in_account_currency", "account_currency", "fiscal_year", "docstatus", "is_opening"]
+
+		def get_entries(voucher_no):
+			return frappe.get_all("GL Entry", fields=fields,
+				filters={"voucher_type": "Journal Entry", "voucher_no": voucher_no},
+				order_by="account, debit, credit")
+
+		row_wise, bulk = get_entries(timings.row_wise_voucher), get_entries(timings.bulk_voucher)
+		self.assertEqual(len(row_wise), BULK_INSERT_THRESHOLD)
+		self.assertEqual(row_wise, bulk)
+
+	def test_no_bulk_insert_with_hooks_for_all_doctypes(self):
+		gl_map = get_test_gl_map("_Test GL Bulk Insert Hooks", BULK_INSERT_THRESHOLD)
+
+		# doc hooks are cached per request, hooks for all doctypes are added to the cached map
+		doc_hooks = frappe.get_doc_hooks()
+		hooks_for_all = doc_hooks.pop("*", None)
+		try:
+			self.assertTrue(use_bulk_insert(gl_map))
+
+			doc_hooks["*"] = {"on_submit": ["frappe.utils.nowdate"]}
+			self.assertFalse(use_bulk_insert(gl_map))
+		finally:
+			doc_hooks.pop("*", None)
+			if hooks_for_all:
+				doc_hooks["*"] = hooks_for_all
+
+	def test_merge_similar_entries(self):
+		je = make_journal_entry("_Test Account Cost for Goods Sold - _TC", "_Test Bank - _TC", 100, submit=True)
+		fixture = frappe.get_all("GL Entry", fields=["*"],
+			filters={"voucher_type": "Journal Entry", "voucher_no": je.name})
+
+		gl_map = []
+		for i in range(5):
+			for d in fixture:
+				entry = frappe._dict(d)
+				entry.project = "_Test Project" if i % 2 else None
+				entry.cost_center = d.cost_center if i < 3 else ""
+				gl_map.append(entry)
+
+		expected = merge_by_linear_scan([frappe._dict(d) for d in gl_map])
+		merged = merge_similar_entries([frappe._dict(d) for d in gl_map])
+
+		self.assertEqual(len(merged), len(expected))
+		for d, e in zip(merged, expected):
+			self.assertEqual((d.account, d.project, d.cost_center, d.debit, d.credit),
+				(e.account, e.project, e.cost_center, e.debit, e.credit))
+
+def merge_by_linear_scan(gl_map):
+	"""reference merge, compares each entry with every merged entry"""
+	fieldnames = ['party_type', 'party', 'against_voucher', 'against_voucher_type',
+		'cost_center', 'project'] + get_accounting_dimensions()
+
+	merged = []
+	for entry in gl_map:
+		for e in merged:
+			if e.account == entry.account and all(cstr(e.get(f)) == cstr(entry.get(f)) for f in fieldnames):
+				e.debit = flt(e.debit) + flt(entry.debit)
+				e.credit = flt(e.credit) + flt(entry.credit)
+				break
+		else:
+			merged.append(entry)
+
+	return [d for d in merged if flt(d.debit) or flt(d.credit)]
+
+def benchmark_gl_insert(rows=1000, rollback=True):
+	"""Time posting a voucher of `rows` GL Entries row by row and in bulk and return the timings, e.g.
+
+		bench execute erpnext.accounts.doctype.gl_entry.test_gl_entry.benchmark_gl_insert --kwargs "{'rows': 5000}"
+	"""
+	timings = frappe._dict()
+	for path in ("row_wise", "bulk"):
+		voucher_no = "_Test GL Bulk Insert {0} {1}".format(path, frappe.generate_hash(length=5))
+		gl_map = get_test_gl_map(voucher_no, rows)
+
+		frappe.flags.disable_gl_bulk_insert = path == "row_wise"
+		start = time.time()
+		try:
+			make_gl_entries(gl_map, merge_entries=False)
+		finally:
+			frappe.flags.disable_gl_bulk_insert = False
+
+		timings[path] = time.time() - start
+		timings[path + "_voucher"] = voucher_no
+
+	if rollback:
+		frappe.db.rollback()
+
+	return timings
+
+def get_test_gl_map(voucher_no, rows):
+	"""`rows` entries, pairs of debit to expense and credit to bank of increasing amounts"""
+	gl_map = []
+	for i in range(rows // 2):
+		for account, debit, credit in (("_Test Account Cost for Goods Sold - _TC", i + 1, 0),
+			("_Test Bank - _TC", 0, i + 1)):
+				gl_map.append(frappe._dict({
+					"account": account,
+					"cost_center": "_Test Cost Center - _TC",
+					"debit": debit,
+					"credit": credit,
+					"debit_in_account_currency": debit,
+					"credit_in_account_currency": credit,
+					"voucher_type": "Journal Entry",
+					"voucher_no": voucher_no,
+					"company": "_Test Company",
+					"posting_date": nowdate(),
+					"remarks": "test"
+				}))
+
+	return gl_map
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+from __future__ import unicode_literals
+import frappe
+from frappe.utils import now
+from frappe.model.document import Document
+
+PAYMENT_LEDGER_FIELDS = ("company", "account", "account_currency", "finance_book", "party_type", "party",
+	"posting_date", "voucher_type", "voucher_no", "against_voucher_type", "against_voucher",
+	"debit", "credit", "debit_in_account_currency", "credit_in_account_currency", "remarks")
+
+class PaymentLedgerEntry(Document):
+	pass
+
+def make_payment_ledger_entries(gl_entries):
+	"""Copy the party entries of receivable and payable accounts from `gl_entries`,
+	these are what Accounts Receivable and Accounts Payable read"""
+	gl_entries = [d for d in gl_entries if d.get("party_type") and d.get("party")]
+	if not gl_entries:
+		return
+
+	party_accounts = get_party_accounts(list(set(d.account for d in gl_entries)))
+
+	fields = ["name", "creation", "modified", "owner", "modified_by", "docstatus"] + list(PAYMENT_LEDGER_FIELDS)
+	timestamp, values = now(), []
+	for d in gl_entries:
+		if d.account not in party_accounts:
+			continue
+
+		# keep the creation of the GL Entry, reports filter post-dated payments on it
+		creation = d.get("creation") or timestamp
+		values.append([frappe.generate_hash(length=10), creation, creation, frappe.session.user,
+			frappe.session.user, 0] + [d.get(fieldname) for fieldname in PAYMENT_LEDGER_FIELDS])
+
+	if values:
+		frappe.db.bulk_insert("Payment Ledger Entry", fields, values)
+
+def get_party_accounts(accounts):
+	return frappe.db.sql_list("""select name from `tabAccount`
+		where account_type in ('Receivable', 'Payable') and name in ({0})"""
+		.format(", ".join(["%s"] * len(accounts))), tuple(accounts))
+
+def delete_payment_ledger_entries(voucher_type, voucher_no):
+	frappe.db.sql("""delete from `tabPayment Ledger Entry`
+		where voucher_type=%s and voucher_no=%s""", (voucher_type, voucher_no))
+
+def unlink_payment_ledger_entries(against_voucher_type, against_voucher):
+	"""Same as unlinking GL Entries of payments from a cancelled invoice"""
+	frappe.db.sql("""update `tabPayment Ledger Entry`
+		set against_voucher_type=null, against_voucher=null,
+		modified=%s, modified_by=%s
+		where against_voucher_type=%s and against_voucher=%s
+		and voucher_no != ifnull(against_voucher, '')""",
+		(now(), frappe.session.user, against_voucher_type, against_voucher))
+
+def rebuild_payment_ledger(company=None):
+	"""Recreate the payment ledger of `company` (or all companies) from GL Entries"""
+	condition = "company = %s" if company else "1=1"
+	frappe.db.sql("""delete from `tabPayment Ledger Entry` where {0}""".format(condition), company)
+
+	frappe.db.sql("""
+		insert into `tabPayment Ledger Entry`
+			(name, creation, modified, owner, modified_by, docstatus, {fields})
+		select
+			name, creation, modified, owner, modified_by, 0, {fields}
+		from `tabGL Entry`
+		where {condition} and ifnull(party, '') != ''
+			and account in (select name from `tabAccount` where account_type in ('Receivable', 'Payable'))
+	""".format(fields=", ".join(PAYMENT_LEDGER_FIELDS), condition=condition), company)
+
+def on_doctype_update():
+	frappe.db.add_index("Payment Ledger Entry", ["company", "party_type", "posting_date"])
+	frappe.db.add_index("Payment Ledger Entry", ["voucher_type", "voucher_no"])
+	frappe.db.add_index("Payment Ledger Entry", ["against_voucher_type", "against_voucher"])
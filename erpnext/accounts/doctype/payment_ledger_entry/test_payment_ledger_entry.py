@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and Contributors
+# See license.txt
+from __future__ import unicode_literals
+
+import frappe
+import unittest
+from frappe.utils import today
+from erpnext.accounts.report.accounts_receivable.accounts_receivable import execute
+from erpnext.accounts.report.accounts_receivable.test_accounts_receivable import (make_sales_invoice,
+	make_payment, make_credit_note)
+from erpnext.accounts.doctype.payment_ledger_entry.payment_ledger_entry import rebuild_payment_ledger
+
+class TestPaymentLedgerEntry(unittest.TestCase):
+	def test_ledger_follows_gl_entries(self):
+		name = make_sales_invoice()
+		make_payment(name)
+
+		self.assertEqual(get_ledger_amounts("Payment Ledger Entry", name),
+			get_ledger_amounts("GL Entry", name))
+
+		cancelled = frappe.get_doc("Sales Invoice", make_sales_invoice())
+		cancelled.cancel()
+
+		self.assertEqual(get_ledger_amounts("Payment Ledger Entry", cancelled.name),
+			get_ledger_amounts("GL Entry", cancelled.name))
+
+	def test_receivable_report_matches_gl_entries(self):
+		name = make_sales_invoice()
+		make_payment(name)
+		make_credit_note(name)
+		frappe.get_doc("Sales Invoice", make_sales_invoice()).cancel()
+
+		filters = {
+			"company": "_Test Company 2",
+			"report_date": today(),
+			"based_on_payment_terms": 1
+		}
+
+		self.assertEqual(get_report_rows(filters), get_report_rows(filters, from_gl_entries=True))
+
+		rebuild_payment_ledger("_Test Company 2")
+		self.assertEqual(get_report_rows(filters), get_report_rows(filters, from_gl_entries=True))
+
+def get_ledger_amounts(doctype, voucher_no):
+	return frappe.db.sql("""select party, against_voucher, posting_date, debit, credit
+		from `tab{0}`
+		where (voucher_no = %s or against_voucher = %s) and ifnull(party, '') != ''
+		order by party, against_voucher, posting_date, debit, credit""".format(doctype),
+		(voucher_no, voucher_no), as_dict=1)
+
+def get_report_rows(filters, from_gl_entries=False):
+	frappe.flags.ignore_payment_ledger = from_gl_entries
+	try:
+		data = execute(filters)[1]
+	finally:
+		frappe.flags.ignore_payment_ledger = False
+
+	return [[row.voucher_type, row.voucher_no, row.party, row.invoiced, row.paid, row.credit_note,
+		row.outstanding] for row in data]
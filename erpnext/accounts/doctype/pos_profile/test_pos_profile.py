@@ -6,7 +6,10 @@ from __future__ import unicode_literals
 import frappe
 import unittest
 from erpnext.stock.get_item_details import get_pos_profile
-from erpnext.accounts.doctype.sales_invoice.pos import get_items_list, get_customers_list
+from frappe.utils import now
+from erpnext.accounts.doctype.sales_invoice.pos import (get_items_list, get_customers_list,
+	get_catalog_data, get_catalog_delta, apply_catalog_delta)
+from erpnext.stock.doctype.item.test_item import make_item
 
 class TestPOSProfile(unittest.TestCase):
 	def test_pos_profile(self):
@@ -29,6 +32,55 @@ class TestPOSProfile(unittest.TestCase):
 
 		frappe.db.sql("delete from `tabPOS Profile`")
 
+	def test_pos_catalog_delta(self):
+		pos_profile = make_pos_profile()
+		company, price_list = pos_profile.company, pos_profile.selling_price_list
+
+		data = get_catalog_data(pos_profile, company, price_list)
+		version = now()
+
+		item = make_item("_Test POS Catalog Item", {"is_sales_item": 1})
+		item.item_name = "_Test POS Catalog Item " + version
+		item.save()
+
+		frappe.db.sql("delete from `tabItem Price` where item_code=%s", item.name)
+		frappe.get_doc({
+			"doctype": "Item Price",
+			"item_code": item.name,
+			"price_list": price_list,
+			"price_list_rate": 100
+		}).insert()
+
+		delta = get_catalog_delta(pos_profile, company, price_list, version)
+		self.assertTrue(item.name in delta["items"]["updated"])
+
+		apply_catalog_delta(data, delta)
+		self.assertEqual(data, get_catalog_data(pos_profile, company, price_list))
+
+		frappe.db.sql("delete from `tabPOS Profile`")
+
+	def test_item_search_index(self):
+		from erpnext.selling.page.point_of_sale.point_of_sale import get_items
+
+		item = make_item("_Test POS Search Item", {"is_sales_item": 1})
+		if not item.barcodes:
+			item.append("barcodes", {"barcode": "_Test POS Search Barcode"})
+			item.save()
+
+		for search_value in ("", "_test pos", "Search Item", "_Test POS Search Barcode"):
+			args = ("0", "500", "_Test Price List", "All Item Groups", search_value)
+			from_index = get_items(*args)
+
+			frappe.flags.disable_item_search_index = True
+			try:
+				from_db = get_items(*args)
+			finally:
+				frappe.flags.disable_item_search_index = False
+
+			self.assertEqual(sorted(d["item_code"] for d in from_index["items"]),
+				sorted(d["item_code"] for d in from_db["items"]))
+			self.assertEqual(from_index.get("barcode"), from_db.get("barcode"))
+
 def make_pos_profile(**args):
 	frappe.db.sql("delete from `tabPOS Profile`")
 
@@ -11,6 +11,8 @@ from frappe import throw, _
 from frappe.utils import flt, cint, getdate
 
 from frappe.model.document import Document
+from erpnext.accounts.doctype.pricing_rule.pricing_rule_index import (get_pricing_rule_index,
+	clear_pricing_rule_index)
 
 from six import string_types
 
@@ -34,6 +36,12 @@ class PricingRule(Document):
 
 		if not self.margin_type: self.margin_rate_or_amount = 0.0
 
+	def on_update(self):
+		clear_pricing_rule_index()
+
+	def on_trash(self):
+		clear_pricing_rule_index()
+
 	def validate_duplicate_apply_on(self):
 		field = apply_on_dict.get(self.apply_on)
 		values = [d.get(frappe.scrub(self.apply_on)) for d in self.get(field) if field]
@@ -184,13 +192,18 @@ def apply_pricing_rule(args, doc=None):
 	set_serial_nos_based_on_fifo = frappe.db.get_single_value("Stock Settings",
 		"automatically_set_serial_nos_based_on_fifo")
 
-	for item in item_list:
-		args_copy = copy.deepcopy(args)
-		args_copy.update(item)
-		data = get_pricing_rule_for_item(args_copy, item.get('price_list_rate'), doc=doc)
-		out.append(data)
-		if not item.get("serial_no") and set_serial_nos_based_on_fifo and not args.get('is_return'):
-			out[0].update(get_serial_no_for_item(args_copy))
+	# price all the items against the same index
+	frappe.flags.pricing_rule_index = get_pricing_rule_index()
+	try:
+		for item in item_list:
+			args_copy = copy.deepcopy(args)
+			args_copy.update(item)
+			data = get_pricing_rule_for_item(args_copy, item.get('price_list_rate'), doc=doc)
+			out.append(data)
+			if not item.get("serial_no") and set_serial_nos_based_on_fifo and not args.get('is_return'):
+				out[0].update(get_serial_no_for_item(args_copy))
+	finally:
+		frappe.flags.pricing_rule_index = None
 
 	return out
 
@@ -0,0 +1,144 @@
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and Contributors
+# License: GNU General Public License v3. See license.txt
+
+from __future__ import unicode_literals
+
+import frappe
+from frappe import _
+from frappe.utils import cint, cstr, getdate
+
+# indexes loaded by this process, by site
+_indexes = {}
+
+apply_on_doctypes = {
+	'Item Code': 'Pricing Rule Item Code',
+	'Item Group': 'Pricing Rule Item Group',
+	'Brand': 'Pricing Rule Brand'
+}
+
+class PricingRuleIndex(object):
+	"""Enabled Pricing Rules indexed by the items, item groups and brands they apply on.
+
+	Answers the same as the query in `utils._get_pricing_rules`, with the rule
+	conditions checked in memory against tree ancestors looked up once per request."""
+	def __init__(self, key=None):
+		self.key = key
+		self.rows = {}
+		self.other_rows = {}
+		self.load()
+
+	def load(self):
+		rules = {d.name: d for d in frappe.db.sql("""select * from `tabPricing Rule`
+			where disable = 0""", as_dict=1)}
+
+		for apply_on, child_doctype in apply_on_doctypes.items():
+			field = frappe.scrub(apply_on)
+			for child in frappe.db.sql("""select parent, {0}, uom from `tab{1}`"""
+				.format(field, child_doctype), as_dict=1):
+				rule = rules.get(child.parent)
+				if not rule:
+					continue
+
+				row = (rule, child)
+				self.rows.setdefault((field, child.get(field)), []).append(row)
+
+				if rule.apply_rule_on_other is not None:
+					self.other_rows.setdefault((field, rule.get("other_" + field)), []).append(row)
+
+	def get_pricing_rules(self, apply_on, args, values):
+		"""Rules for one apply on level of an item, ordered by priority like the query"""
+		apply_on_field = frappe.scrub(apply_on)
+		values[apply_on_field] = args.get(apply_on_field)
+
+		if apply_on_field == 'item_group':
+			apply_on_values = get_tree_ancestors("Item Group", args.item_group)
+		else:
+			apply_on_values = [args.get(apply_on_field)]
+
+			if apply_on_field == 'item_code':
+				if "variant_of" not in args:
+					args.variant_of = frappe.get_cached_value("Item", args.item_code, "variant_of")
+
+				if args.variant_of:
+					apply_on_values.append(args.variant_of)
+					values['variant_of'] = args.variant_of
+
+		if not args.price_list: args.price_list = None
+
+		rows, seen = [], set()
+		candidates = [self.rows.get((apply_on_field, d), []) for d in apply_on_values]
+		candidates.append(self.other_rows.get((apply_on_field, args.get(apply_on_field)), []))
+		for candidate_rows in candidates:
+			for row in candidate_rows:
+				if id(row) not in seen and rule_matches(row[0], args):
+					seen.add(id(row))
+					rows.append(row)
+
+		rows.sort(key=lambda d: (cstr(d[0].priority).lower(), d[0].name.lower()), reverse=True)
+
+		pricing_rules = []
+		for rule, child in rows:
+			pricing_rule = frappe._dict(rule)
+			pricing_rule[apply_on_field] = child.get(apply_on_field)
+			pricing_rule.uom = child.uom
+			pricing_rules.append(pricing_rule)
+
+		return pricing_rules
+
+def rule_matches(rule, args):
+	if not cint(rule.get(args.transaction_type)):
+		return False
+
+	for field in ["company", "customer", "supplier", "campaign", "sales_partner"]:
+		if cstr(rule.get(field)) not in ((args.get(field), '') if args.get(field) else ('',)):
+			return False
+
+	for parenttype in ["Customer Group", "Territory", "Supplier Group", "Warehouse"]:
+		field = frappe.scrub(parenttype)
+		if args.get(field) and cstr(rule.get(field)) \
+			and rule.get(field) not in get_tree_ancestors(parenttype, args.get(field)):
+				return False
+
+	if args.get("transaction_date"):
+		transaction_date = getdate(args.transaction_date)
+		if not (getdate(rule.valid_from or '2000-01-01') <= transaction_date
+			<= getdate(rule.valid_upto or '2500-12-31')):
+				return False
+
+	return cstr(rule.for_price_list) == '' or bool(args.price_list and rule.for_price_list == args.price_list)
+
+def get_tree_ancestors(parenttype, name):
+	"""`name` and its ancestors in the tree of `parenttype`, cached for the request"""
+	if not frappe.flags.tree_ancestors:
+		frappe.flags.tree_ancestors = {}
+
+	key = (parenttype, name)
+	if key not in frappe.flags.tree_ancestors:
+		try:
+			lft, rgt = frappe.db.get_value(parenttype, name, ["lft", "rgt"])
+		except TypeError:
+			frappe.throw(_("Invalid {0}").format(name))
+
+		frappe.flags.tree_ancestors[key] = set(frappe.db.sql_list("""select name from `tab%s`
+			where lft<=%s and rgt>=%s""" % (parenttype, '%s', '%s'), (lft, rgt)))
+
+	return frappe.flags.tree_ancestors[key]
+
+def get_pricing_rule_index():
+	"""Index of the current site, reloaded when Pricing Rules are added, changed or deleted.
+
+	While a whole document is priced the index set by `apply_pricing_rule` is used as is."""
+	if frappe.flags.pricing_rule_index:
+		return frappe.flags.pricing_rule_index
+
+	key = tuple(frappe.db.sql("""select count(*), max(modified) from `tabPricing Rule`""")[0])
+
+	index = _indexes.get(frappe.local.site)
+	if not index or index.key != key:
+		index = _indexes[frappe.local.site] = PricingRuleIndex(key)
+
+	return index
+
+def clear_pricing_rule_index():
+	_indexes.pop(frappe.local.site, None)
+	frappe.flags.pricing_rule_index = None
@@ -430,6 +430,39 @@ class TestPricingRule(unittest.TestCase):
 
 		self.assertTrue(details)
 
+	def test_pricing_rule_index_matches_query(self):
+		from erpnext.accounts.doctype.pricing_rule.utils import _get_pricing_rules
+
+		make_pricing_rule(title="_Test Item Code Rule", selling=1, discount_percentage=10)
+		make_pricing_rule(title="_Test Item Code Rule for Customer", selling=1, applicable_for="Customer",
+			customer="_Test Customer", discount_percentage=20)
+		make_pricing_rule(title="_Test Item Group Rule", apply_on="Item Group",
+			item_group="_Test Item Group", selling=1, buying=1, discount_percentage=5)
+		make_pricing_rule(title="_Test Brand Rule", apply_on="Brand", brand="_Test Brand", buying=1)
+
+		for transaction_type in ("selling", "buying"):
+			for customer in ("_Test Customer", "_Test Customer 1", None):
+				args = frappe._dict({
+					"item_code": "_Test Item",
+					"item_group": "_Test Item Group",
+					"brand": "_Test Brand",
+					"company": "_Test Company",
+					"customer": customer,
+					"transaction_type": transaction_type,
+					"transaction_date": frappe.utils.nowdate()
+				})
+
+				for apply_on in ("Item Code", "Item Group", "Brand"):
+					from_index = _get_pricing_rules(apply_on, args.copy(), {})
+
+					frappe.flags.disable_pricing_rule_index = True
+					try:
+						from_query = _get_pricing_rules(apply_on, args.copy(), {})
+					finally:
+						frappe.flags.disable_pricing_rule_index = False
+
+					self.assertEqual(from_index, from_query)
+
 def make_pricing_rule(**args):
 	args = frappe._dict(args)
 
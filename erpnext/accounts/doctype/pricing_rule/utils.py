@@ -11,6 +11,7 @@ import json
 from six import string_types
 
 import frappe
+from erpnext.accounts.doctype.pricing_rule.pricing_rule_index import get_pricing_rule_index
 from erpnext.setup.doctype.item_group.item_group import get_child_item_groups
 from erpnext.stock.doctype.warehouse.warehouse import get_child_warehouses
 from erpnext.stock.get_item_details import get_conversion_factor
@@ -56,6 +57,9 @@ def _get_pricing_rules(apply_on, args, values):
 
 	if not args.get(apply_on_field): return []
 
+	if not frappe.flags.disable_pricing_rule_index:
+		return get_pricing_rule_index().get_pricing_rules(apply_on, args, values)
+
 	child_doc = '`tabPricing Rule {0}`'.format(apply_on)
 
 	conditions = item_variant_condition = item_conditions = ""
@@ -11,13 +11,29 @@ from erpnext.setup.utils import get_exchange_rate
 from erpnext.stock.get_item_details import get_pos_profile
 from frappe import _
 from frappe.core.doctype.communication.email import make
-from frappe.utils import nowdate, cint
+from frappe.utils import nowdate, cint, cstr, flt, getdate, get_datetime, now, now_datetime, time_diff_in_seconds
 
 from six import string_types, iteritems
 
 
+# masters sent to POS terminals, kept per POS Profile and sent again only when they change
+CATALOG_SECTIONS = ("items", "customers", "address", "contacts", "serial_no_data", "batch_no_data",
+	"barcode_data", "tax_data", "price_list_data", "customer_wise_price_list", "bin_data")
+
+# sections sent as lists, kept in the catalog by these fields
+CATALOG_LIST_SECTIONS = {"items": "item_code", "customers": "name"}
+
+# offline invoices made while the sync request waits, more are submitted by background jobs
+OFFLINE_INVOICE_SYNC_LIMIT = 20
+
+# background jobs the queued offline invoices are split into
+OFFLINE_INVOICE_SYNC_JOBS = 4
+
+# seconds after which an invoice still queued is taken as lost and queued again
+OFFLINE_INVOICE_QUEUE_TIMEOUT = 3600
+
 @frappe.whitelist()
-def get_pos_data():
+def get_pos_data(catalog_key=None, catalog_version=None):
 	doc = frappe.new_doc('Sales Invoice')
 	doc.is_pos = 1
 	pos_profile = get_pos_profile(doc.company) or {}
@@ -38,32 +54,22 @@ def get_pos_data():
 	update_multi_mode_option(doc, pos_profile)
 	default_print_format = pos_profile.get('print_format') or "Point of Sale"
 	print_template = frappe.db.get_value('Print Format', default_print_format, 'html')
-	items_list = get_items_list(pos_profile, doc.company)
-	customers = get_customers_list(pos_profile)
 
 	doc.plc_conversion_rate = update_plc_conversion_rate(doc, pos_profile)
 
-	return {
+	data = {
 		'doc': doc,
 		'default_customer': pos_profile.get('customer'),
-		'items': items_list,
 		'item_groups': get_item_groups(pos_profile),
-		'customers': customers,
-		'address': get_customers_address(customers),
-		'contacts': get_contacts(customers),
-		'serial_no_data': get_serial_no_data(pos_profile, doc.company),
-		'batch_no_data': get_batch_no_data(),
-		'barcode_data': get_barcode_data(items_list),
-		'tax_data': get_item_tax_data(),
-		'price_list_data': get_price_list_data(doc.selling_price_list, doc.plc_conversion_rate),
-		'customer_wise_price_list': get_customer_wise_price_list(),
-		'bin_data': get_bin_data(pos_profile),
 		'pricing_rules': get_pricing_rule_data(doc),
 		'print_template': print_template,
 		'pos_profile': pos_profile,
 		'meta': get_meta()
 	}
 
+	data.update(get_pos_catalog(pos_profile, doc, catalog_key, catalog_version))
+	return data
+
 def update_plc_conversion_rate(doc, pos_profile):
 	conversion_rate = 1.0
 
@@ -165,7 +171,7 @@ def update_tax_table(doc):
 		doc.append('taxes', tax)
 
 
-def get_items_list(pos_profile, company):
+def get_items_list(pos_profile, company, item_codes=None):
 	cond = ""
 	args_list = []
 	if pos_profile.get('item_groups'):
@@ -175,6 +181,13 @@ def get_items_list(pos_profile, company):
 		if args_list:
 			cond = "and i.item_group in (%s)" % (', '.join(['%s'] * len(args_list)))
 
+	if item_codes is not None:
+		if not item_codes:
+			return []
+
+		cond += " and i.name in (%s)" % (', '.join(['%s'] * len(item_codes)))
+		args_list.extend(item_codes)
+
 	return frappe.db.sql("""
 		select
 			i.name, i.item_code, i.item_name, i.description, i.item_group, i.has_batch_no,
@@ -201,18 +214,25 @@ def get_item_groups(pos_profile):
 	return item_group_dict
 
 
-def get_customers_list(pos_profile={}):
+def get_customers_list(pos_profile={}, customers=None):
 	cond = "1=1"
-	customer_groups = []
+	args_list = []
 	if pos_profile.get('customer_groups'):
 		# Get customers based on the customer groups defined in the POS profile
 		for d in pos_profile.get('customer_groups'):
-			customer_groups.extend([d.get('name') for d in get_child_nodes('Customer Group', d.get('customer_group'))])
-		cond = "customer_group in (%s)" % (', '.join(['%s'] * len(customer_groups)))
+			args_list.extend([d.get('name') for d in get_child_nodes('Customer Group', d.get('customer_group'))])
+		cond = "customer_group in (%s)" % (', '.join(['%s'] * len(args_list)))
+
+	if customers is not None:
+		if not customers:
+			return []
+
+		cond += " and name in (%s)" % (', '.join(['%s'] * len(customers)))
+		args_list.extend(customers)
 
 	return frappe.db.sql(""" select name, customer_name, customer_group,
 		territory, customer_pos_id from tabCustomer where disabled = 0
-		and {cond}""".format(cond=cond), tuple(customer_groups), as_dict=1) or {}
+		and {cond}""".format(cond=cond), tuple(args_list), as_dict=1) or {}
 
 
 def get_customers_address(customers):
@@ -220,15 +240,11 @@ def get_customers_address(customers):
 	if isinstance(customers, string_types):
 		customers = [frappe._dict({'name': customers})]
 
-	for data in customers:
-		address = frappe.db.sql(""" select name, address_line1, address_line2, city, state,
-			email_id, phone, fax, pincode from `tabAddress` where is_primary_address =1 and name in
-			(select parent from `tabDynamic Link` where link_doctype = 'Customer' and link_name = %s
-			and parenttype = 'Address')""", data.name, as_dict=1)
-		address_data = {}
-		if address:
-			address_data = address[0]
+	addresses = get_primary_links('Address', """a.name, a.address_line1, a.address_line2, a.city, a.state,
+		a.email_id, a.phone, a.fax, a.pincode""", 'is_primary_address', [d.name for d in customers])
 
+	for data in customers:
+		address_data = addresses.get(data.name) or {}
 		address_data.update({'full_name': data.customer_name, 'customer_pos_id': data.customer_pos_id})
 		customer_address[data.name] = address_data
 
@@ -236,19 +252,27 @@ def get_customers_address(customers):
 
 
 def get_contacts(customers):
-	customer_contact = {}
 	if isinstance(customers, string_types):
 		customers = [frappe._dict({'name': customers})]
 
-	for data in customers:
-		contact = frappe.db.sql(""" select email_id, phone, mobile_no from `tabContact`
-			where is_primary_contact=1 and name in
-			(select parent from `tabDynamic Link` where link_doctype = 'Customer' and link_name = %s
-			and parenttype = 'Contact')""", data.name, as_dict=1)
-		if contact:
-			customer_contact[data.name] = contact[0]
+	return get_primary_links('Contact', "a.email_id, a.phone, a.mobile_no", 'is_primary_contact',
+		[d.name for d in customers])
+
+
+def get_primary_links(doctype, fields, primary_field, customers):
+	"""Primary `doctype` (Address or Contact) of each customer, a few hundred customers per query"""
+	links = {}
+	for i in range(0, len(customers), 500):
+		batch = customers[i:i + 500]
+		for d in frappe.db.sql(""" select dl.link_name as customer, {fields}
+			from `tab{doctype}` a, `tabDynamic Link` dl
+			where dl.parent = a.name and dl.parenttype = %s and dl.link_doctype = 'Customer'
+			and a.{primary_field} = 1 and dl.link_name in ({names})""".format(fields=fields, doctype=doctype,
+				primary_field=primary_field, names=', '.join(['%s'] * len(batch))),
+			tuple([doctype] + batch), as_dict=1):
+				links.setdefault(d.pop('customer'), d)
 
-	return customer_contact
+	return links
 
 
 def get_child_nodes(group_type, root):
@@ -257,7 +281,7 @@ def get_child_nodes(group_type, root):
 			lft >= {lft} and rgt <= {rgt} order by lft""".format(tab=group_type, lft=lft, rgt=rgt), as_dict=1)
 
 
-def get_serial_no_data(pos_profile, company):
+def get_serial_no_data(pos_profile, company, item_codes=None):
 	# get itemwise serial no data
 	# example {'Nokia Lumia 1020': {'SN0001': 'Pune'}}
 	# where Nokia Lumia 1020 is item code, SN0001 is serial no and Pune is warehouse
@@ -266,9 +290,15 @@ def get_serial_no_data(pos_profile, company):
 	if pos_profile.get('update_stock') and pos_profile.get('warehouse'):
 		cond = "warehouse = %(warehouse)s"
 
+	if item_codes is not None:
+		if not item_codes:
+			return {}
+		cond += " and item_code in %(item_codes)s"
+
 	serial_nos = frappe.db.sql("""select name, warehouse, item_code
 		from `tabSerial No` where {0} and company = %(company)s """.format(cond),{
-			'company': company, 'warehouse': frappe.db.escape(pos_profile.get('warehouse'))
+			'company': company, 'warehouse': frappe.db.escape(pos_profile.get('warehouse')),
+			'item_codes': tuple(item_codes or [])
 		}, as_dict=1)
 
 	itemwise_serial_no = {}
@@ -280,14 +310,21 @@ def get_serial_no_data(pos_profile, company):
 	return itemwise_serial_no
 
 
-def get_batch_no_data():
+def get_batch_no_data(item_codes=None):
 	# get itemwise batch no data
 	# exmaple: {'LED-GRE': [Batch001, Batch002]}
 	# where LED-GRE is item code, SN0001 is serial no and Pune is warehouse
 
+	cond = ""
+	if item_codes is not None:
+		if not item_codes:
+			return {}
+		cond = "and item in %(item_codes)s"
+
 	itemwise_batch = {}
 	batches = frappe.db.sql("""select name, item from `tabBatch`
-		where ifnull(expiry_date, '4000-10-10') >= curdate()""", as_dict=1)
+		where ifnull(expiry_date, '4000-10-10') >= curdate() {0}""".format(cond),
+		{'item_codes': tuple(item_codes or [])}, as_dict=1)
 
 	for batch in batches:
 		if batch.item not in itemwise_batch:
@@ -298,30 +335,38 @@ def get_batch_no_data():
 
 
 def get_barcode_data(items_list):
-	# get itemwise batch no data
-	# exmaple: {'LED-GRE': [Batch001, Batch002]}
-	# where LED-GRE is item code, SN0001 is serial no and Pune is warehouse
+	# get itemwise barcode data
+	# exmaple: {'LED-GRE': [Barcode001, Barcode002]}
+
+	item_codes = [item.item_code for item in items_list]
 
 	itemwise_barcode = {}
-	for item in items_list:
+	for i in range(0, len(item_codes), 500):
 		barcodes = frappe.db.sql("""
-			select barcode from `tabItem Barcode` where parent = %s
-		""", item.item_code, as_dict=1)
+			select parent, barcode from `tabItem Barcode` where parent in %s
+		""", [tuple(item_codes[i:i + 500])], as_dict=1)
 
 		for barcode in barcodes:
-			if item.item_code not in itemwise_barcode:
-				itemwise_barcode.setdefault(item.item_code, [])
-			itemwise_barcode[item.item_code].append(barcode.get("barcode"))
+			if barcode.parent not in itemwise_barcode:
+				itemwise_barcode.setdefault(barcode.parent, [])
+			itemwise_barcode[barcode.parent].append(barcode.get("barcode"))
 
 	return itemwise_barcode
 
 
-def get_item_tax_data():
+def get_item_tax_data(templates=None):
 	# get default tax of an item
 	# example: {'Consulting Services': {'Excise 12 - TS': '12.000'}}
 
+	cond = ""
+	if templates is not None:
+		if not templates:
+			return {}
+		cond = "where parent in %(templates)s"
+
 	itemwise_tax = {}
-	taxes = frappe.db.sql(""" select parent, tax_type, tax_rate from `tabItem Tax Template Detail`""", as_dict=1)
+	taxes = frappe.db.sql(""" select parent, tax_type, tax_rate from `tabItem Tax Template Detail` {0}"""
+		.format(cond), {'templates': tuple(templates or [])}, as_dict=1)
 
 	for tax in taxes:
 		if tax.parent not in itemwise_tax:
@@ -331,23 +376,38 @@ def get_item_tax_data():
 	return itemwise_tax
 
 
-def get_price_list_data(selling_price_list, conversion_rate):
+def get_price_list_data(selling_price_list, conversion_rate, item_codes=None):
+	cond = ""
+	if item_codes is not None:
+		if not item_codes:
+			return {}
+		cond = "and item_code in %(item_codes)s"
+
 	itemwise_price_list = {}
 	price_lists = frappe.db.sql("""Select ifnull(price_list_rate, 0) as price_list_rate,
-		item_code from `tabItem Price` ip where price_list = %(price_list)s""",
-        {'price_list': selling_price_list}, as_dict=1)
+		item_code from `tabItem Price` ip where price_list = %(price_list)s {0}""".format(cond),
+		{'price_list': selling_price_list, 'item_codes': tuple(item_codes or [])}, as_dict=1)
 
 	for item in price_lists:
 		itemwise_price_list[item.item_code] = item.price_list_rate * conversion_rate
 
 	return itemwise_price_list
 
-def get_customer_wise_price_list():
+def get_customer_wise_price_list(customers=None):
 	customer_wise_price = {}
 	customer_price_list_mapping = frappe._dict(frappe.get_all('Customer',fields = ['default_price_list', 'name'], as_list=1))
+	customer_price_list_mapping.pop(None, None)
+
+	if customers is not None:
+		customer_price_list_mapping = {price_list: customer for price_list, customer
+			in iteritems(customer_price_list_mapping) if customer in customers}
+
+	if not customer_price_list_mapping:
+		return customer_wise_price
 
 	price_lists = frappe.db.sql(""" Select ifnull(price_list_rate, 0) as price_list_rate,
-		item_code, price_list from `tabItem Price` """, as_dict=1)
+		item_code, price_list from `tabItem Price` where price_list in %s""",
+		[tuple(customer_price_list_mapping)], as_dict=1)
 
 	for item in price_lists:
 		if item.price_list and customer_price_list_mapping.get(item.price_list):
@@ -358,12 +418,17 @@ def get_customer_wise_price_list():
 
 	return customer_wise_price
 
-def get_bin_data(pos_profile):
+def get_bin_data(pos_profile, item_codes=None):
 	itemwise_bin_data = {}
 	filters = { 'actual_qty': ['>', 0] }
 	if pos_profile.get('warehouse'):
 		filters.update({ 'warehouse': pos_profile.get('warehouse') })
 
+	if item_codes is not None:
+		if not item_codes:
+			return itemwise_bin_data
+		filters.update({ 'item_code': ['in', list(item_codes)] })
+
 	bin_data = frappe.db.get_all('Bin', fields = ['item_code', 'warehouse', 'actual_qty'], filters=filters)
 
 	for bins in bin_data:
@@ -386,6 +451,211 @@ def get_pricing_rule_data(doc):
 	return pricing_rules
 
 
+def get_pos_catalog(pos_profile, doc, catalog_key=None, catalog_version=None):
+	"""Masters of the POS Profile for a terminal (items, customers, prices, stock...).
+
+	A terminal keeps the catalog with the `catalog_key` and `catalog_version` it was sent
+	and passes them back on its next load, it is then only sent what changed since
+	as `catalog_delta`. Full catalogs are served from a snapshot kept per POS Profile."""
+	snapshot = get_catalog_snapshot(pos_profile, doc.company, doc.selling_price_list, update=False)
+
+	if catalog_key == snapshot.key and catalog_version \
+		and get_datetime(catalog_version) >= get_datetime(snapshot.built_on):
+		version = now()
+		delta = get_catalog_delta(pos_profile, doc.company, doc.selling_price_list, catalog_version)
+
+		# prices are sent converted, the conversion rate may have changed since
+		if flt(doc.plc_conversion_rate) != 1:
+			snapshot = get_catalog_snapshot(pos_profile, doc.company, doc.selling_price_list)
+			delta['price_list_data'] = {'updated': snapshot.data['price_list_data'], 'deleted': [], 'replace': 1}
+
+		return {
+			'catalog_key': snapshot.key,
+			'catalog_version': version,
+			'catalog_delta': {section: dict(d, updated=convert_catalog_section(section, d['updated'],
+				doc.plc_conversion_rate, as_list=False)) for section, d in iteritems(delta)}
+		}
+
+	snapshot = get_catalog_snapshot(pos_profile, doc.company, doc.selling_price_list)
+
+	data = {'catalog_key': snapshot.key, 'catalog_version': snapshot.version}
+	for section in CATALOG_SECTIONS:
+		data[section] = convert_catalog_section(section, snapshot.data[section], doc.plc_conversion_rate)
+
+	return data
+
+
+def convert_catalog_section(section, values, conversion_rate, as_list=True):
+	if section == 'price_list_data' and flt(conversion_rate) != 1:
+		values = {item_code: rate * flt(conversion_rate) for item_code, rate in iteritems(values)}
+
+	if as_list and section in CATALOG_LIST_SECTIONS:
+		values = list(values.values())
+
+	return values
+
+
+def get_catalog_snapshot(pos_profile, company, price_list, update=True):
+	"""Catalog of the POS Profile kept in cache, brought up to date (if `update`) with the changes
+	since it was last read. It is read again as a whole when the POS Profile is changed.
+
+	Prices are kept unconverted, in the currency of the price list."""
+	key = "{0}::{1}::{2}".format(pos_profile.get('name'), company, price_list)
+	snapshot = frappe.cache().hget('pos_catalog', key)
+
+	if not snapshot or get_datetime(snapshot.built_on) < get_datetime(pos_profile.get('modified')):
+		version = now()
+		snapshot = frappe._dict({
+			'key': key,
+			'pos_profile': pos_profile.get('name'),
+			'company': company,
+			'price_list': price_list,
+			'built_on': version,
+			'version': version,
+			'data': get_catalog_data(pos_profile, company, price_list)
+		})
+	elif update:
+		version = now()
+		apply_catalog_delta(snapshot.data,
+			get_catalog_delta(pos_profile, company, price_list, snapshot.version))
+		snapshot.version = version
+	else:
+		return snapshot
+
+	frappe.cache().hset('pos_catalog', key, snapshot)
+	return snapshot
+
+
+def get_catalog_data(pos_profile, company, price_list):
+	items = get_items_list(pos_profile, company)
+	customers = get_customers_list(pos_profile)
+
+	return {
+		'items': {d.item_code: d for d in items},
+		'customers': {d.name: d for d in customers},
+		'address': get_customers_address(customers),
+		'contacts': get_contacts(customers),
+		'serial_no_data': get_serial_no_data(pos_profile, company),
+		'batch_no_data': get_batch_no_data(),
+		'barcode_data': get_barcode_data(items),
+		'tax_data': get_item_tax_data(),
+		'price_list_data': get_price_list_data(price_list, 1.0),
+		'customer_wise_price_list': get_customer_wise_price_list(),
+		'bin_data': get_bin_data(pos_profile)
+	}
+
+
+def get_catalog_delta(pos_profile, company, price_list, since):
+	"""Sections of the catalog changed since `since`, as values to update and keys to delete.
+
+	Changes are found from the `modified` of the masters, the stock ledger for stock
+	and Deleted Documents for deleted masters."""
+	changed = get_changed_catalog_keys(price_list, since)
+	delta = {}
+
+	def add(section, keys, values):
+		if keys:
+			delta[section] = {'updated': values, 'deleted': [key for key in keys if key not in values]}
+
+	items = get_items_list(pos_profile, company, list(changed.items))
+	add('items', changed.items, {d.item_code: d for d in items})
+	add('barcode_data', changed.items, get_barcode_data(items))
+
+	customers = get_customers_list(pos_profile, list(changed.customers))
+	add('customers', changed.customers, {d.name: d for d in customers})
+	add('customer_wise_price_list', changed.price_list_customers,
+		get_customer_wise_price_list(list(changed.price_list_customers)))
+
+	add('address', changed.address_customers,
+		get_customers_address(get_customers_list(pos_profile, list(changed.address_customers))))
+	add('contacts', changed.contact_customers,
+		get_contacts(get_customers_list(pos_profile, list(changed.contact_customers))))
+
+	add('serial_no_data', changed.serial_no_items,
+		get_serial_no_data(pos_profile, company, list(changed.serial_no_items)))
+	add('batch_no_data', changed.batch_items, get_batch_no_data(list(changed.batch_items)))
+	add('tax_data', changed.tax_templates, get_item_tax_data(list(changed.tax_templates)))
+	add('price_list_data', changed.price_items,
+		get_price_list_data(price_list, 1.0, list(changed.price_items)))
+	add('bin_data', changed.bin_items, get_bin_data(pos_profile, list(changed.bin_items)))
+
+	return delta
+
+
+def get_changed_catalog_keys(price_list, since):
+	def modified(doctype, field='name', cond=''):
+		return set(frappe.db.sql_list("""select distinct {0} from `tab{1}` where modified >= %s {2}"""
+			.format(field, doctype, cond), since))
+
+	def deleted(doctype):
+		return [frappe._dict(json.loads(d.data)) for d in frappe.db.sql("""select data from `tabDeleted Document`
+			where deleted_doctype = %s and creation >= %s""", (doctype, since), as_dict=1)]
+
+	def linked_customers(doctype):
+		names = list(modified(doctype))
+		customers = set(frappe.db.sql_list("""select link_name from `tabDynamic Link`
+			where parenttype = %s and link_doctype = 'Customer' and parent in %s""",
+			(doctype, tuple(names)))) if names else set()
+
+		for d in deleted(doctype):
+			customers.update(l.get('link_name') for l in d.get('links') or []
+				if l.get('link_doctype') == 'Customer')
+
+		return customers
+
+	changed = frappe._dict()
+	changed.items = modified('Item') | set(d.name for d in deleted('Item'))
+	changed.customers = modified('Customer') | set(d.name for d in deleted('Customer'))
+	changed.address_customers = changed.customers | linked_customers('Address')
+	changed.contact_customers = changed.customers | linked_customers('Contact')
+
+	changed.serial_no_items = modified('Serial No', 'item_code') \
+		| set(d.item_code for d in deleted('Serial No'))
+
+	# batches that expired since are no longer sent
+	changed.batch_items = modified('Batch', 'item') | set(d.item for d in deleted('Batch')) \
+		| set(frappe.db.sql_list("""select distinct item from `tabBatch`
+			where expiry_date >= %s and expiry_date < curdate()""", getdate(since)))
+
+	changed.tax_templates = modified('Item Tax Template') | set(d.name for d in deleted('Item Tax Template'))
+
+	deleted_prices = deleted('Item Price')
+	changed.price_items = modified('Item Price', 'item_code', 'and price_list = %s' % frappe.db.escape(price_list)) \
+		| set(d.item_code for d in deleted_prices if d.price_list == price_list)
+
+	price_lists = list(modified('Item Price', 'price_list') | set(d.price_list for d in deleted_prices))
+	changed.price_list_customers = changed.customers | (set(frappe.db.sql_list("""select name from `tabCustomer`
+		where default_price_list in %s""", [tuple(price_lists)])) if price_lists else set())
+
+	changed.bin_items = set(frappe.db.sql_list("""select distinct item_code from `tabStock Ledger Entry`
+		where creation >= %s""", since))
+
+	return changed
+
+
+def apply_catalog_delta(data, delta):
+	for section, d in iteritems(delta):
+		if d.get('replace'):
+			data[section] = {}
+
+		data[section].update(d['updated'])
+		for key in d['deleted']:
+			data[section].pop(key, None)
+
+
+def update_pos_catalogs():
+	"""Bring the kept catalogs up to date so that terminals loading a full catalog only wait for the recent changes"""
+	for key in frappe.cache().hkeys('pos_catalog'):
+		key = frappe.safe_decode(key)
+		snapshot = frappe.cache().hget('pos_catalog', key)
+		if not snapshot or not frappe.db.exists('POS Profile', snapshot.pos_profile):
+			frappe.cache().hdel('pos_catalog', key)
+			continue
+
+		get_catalog_snapshot(frappe.get_doc('POS Profile', snapshot.pos_profile),
+			snapshot.company, snapshot.price_list)
+
+
 @frappe.whitelist()
 def make_invoice(pos_profile, doc_list={}, email_queue_list={}, customers_list={}):
 	import json
@@ -400,27 +670,19 @@ def make_invoice(pos_profile, doc_list={}, email_queue_list={}, customers_list={
 		customers_list = json.loads(customers_list)
 
 	customers_list = make_customer_and_address(customers_list)
-	name_list = []
-	for docs in doc_list:
-		for name, doc in iteritems(docs):
-			if not frappe.db.exists('Sales Invoice', {'offline_pos_name': name}):
-				if isinstance(doc, dict):
-					validate_records(doc)
-					si_doc = frappe.new_doc('Sales Invoice')
-					si_doc.offline_pos_name = name
-					si_doc.update(doc)
-					si_doc.set_posting_time = 1
-					si_doc.customer = get_customer_id(doc)
-					si_doc.due_date = doc.get('posting_date')
-					name_list = submit_invoice(si_doc, name, doc, name_list)
-				else:
-					doc.due_date = doc.get('posting_date')
-					doc.customer = get_customer_id(doc)
-					doc.set_posting_time = 1
-					doc.offline_pos_name = name
-					name_list = submit_invoice(doc, name, doc, name_list)
-			else:
-				name_list.append(name)
+
+	invoices = [(name, doc) for docs in doc_list for name, doc in iteritems(docs)]
+	synced = get_synced_offline_invoices([name for name, doc in invoices])
+
+	name_list = [name for name, doc in invoices if cstr(name) in synced]
+	invoices = [(name, doc) for name, doc in invoices if cstr(name) not in synced]
+
+	queued_invoices = {}
+	if len(invoices) > OFFLINE_INVOICE_SYNC_LIMIT:
+		queued_invoices = enqueue_offline_invoices(invoices)
+	else:
+		for name, doc in invoices:
+			name_list = make_offline_invoice(name, doc, name_list)
 
 	email_queue = make_email_queue(email_queue_list)
 
@@ -430,6 +692,7 @@ def make_invoice(pos_profile, doc_list={}, email_queue_list={}, customers_list={
 	customers = get_customers_list(pos_profile)
 	return {
 		'invoice': name_list,
+		'queued_invoices': queued_invoices,
 		'email_queue': email_queue,
 		'customers': customers_list,
 		'synced_customers_list': customers,
@@ -438,6 +701,139 @@ def make_invoice(pos_profile, doc_list={}, email_queue_list={}, customers_list={
 	}
 
 
+def make_offline_invoice(name, doc, name_list):
+	if isinstance(doc, dict):
+		validate_records(doc)
+		si_doc = frappe.new_doc('Sales Invoice')
+		si_doc.offline_pos_name = name
+		si_doc.update(doc)
+		si_doc.set_posting_time = 1
+		si_doc.customer = get_customer_id(doc)
+		si_doc.due_date = doc.get('posting_date')
+		return submit_invoice(si_doc, name, doc, name_list)
+	else:
+		doc.due_date = doc.get('posting_date')
+		doc.customer = get_customer_id(doc)
+		doc.set_posting_time = 1
+		doc.offline_pos_name = name
+		return submit_invoice(doc, name, doc, name_list)
+
+
+def get_synced_offline_invoices(names):
+	"""Docstatus of the Sales Invoices already made for offline invoices, by offline name"""
+	if not names:
+		return {}
+
+	return dict(frappe.db.sql("""select offline_pos_name, docstatus from `tabSales Invoice`
+		where offline_pos_name in %s""", [tuple(cstr(name) for name in names)]))
+
+
+def enqueue_offline_invoices(invoices):
+	"""Submit offline invoices in background jobs, invoices sharing an item are submitted
+	one after the other by the same job so that jobs do not wait on each other's stock locks.
+
+	Invoices already queued are skipped, the terminal sends them again until they are made."""
+	statuses = {}
+	pending = []
+	for name, doc in invoices:
+		status = frappe.cache().hget('offline_invoice_sync', cstr(name))
+		if status and status.status == 'Queued' \
+			and time_diff_in_seconds(now_datetime(), status.queued_on) < OFFLINE_INVOICE_QUEUE_TIMEOUT:
+				statuses[name] = 'Queued'
+				continue
+
+		if not isinstance(doc, dict):
+			doc = doc.as_dict()
+
+		pending.append((name, doc))
+		statuses[name] = 'Queued'
+		frappe.cache().hset('offline_invoice_sync', cstr(name),
+			frappe._dict({'status': 'Queued', 'queued_on': now_datetime()}))
+
+	for group in group_invoices_by_item(pending, OFFLINE_INVOICE_SYNC_JOBS):
+		frappe.enqueue('erpnext.accounts.doctype.sales_invoice.pos.make_offline_invoices',
+			queue='long', invoices=group, now=frappe.flags.in_test)
+
+	return statuses
+
+
+def group_invoices_by_item(invoices, jobs):
+	"""Split `invoices` in at most `jobs` groups, invoices with an item in common are kept together"""
+	parent = {}
+	def find(item_code):
+		while parent.setdefault(item_code, item_code) != item_code:
+			parent[item_code] = parent[parent[item_code]]
+			item_code = parent[item_code]
+		return item_code
+
+	invoice_items = []
+	for name, doc in invoices:
+		item_codes = [d.get('item_code') for d in doc.get('items') or []] or [cstr(name)]
+		for item_code in item_codes[1:]:
+			parent[find(item_code)] = find(item_codes[0])
+		invoice_items.append(item_codes[0])
+
+	components = {}
+	for (name, doc), item_code in zip(invoices, invoice_items):
+		components.setdefault(find(item_code), []).append((name, doc))
+
+	# largest first, each to the job with the fewest invoices
+	groups = [[] for i in range(min(jobs, len(components)))]
+	for component in sorted(components.values(), key=len, reverse=True):
+		min(groups, key=len).extend(component)
+
+	return groups
+
+
+def make_offline_invoices(invoices):
+	"""Make the Sales Invoices of a group of offline invoices, one after the other.
+
+	An invoice that fails is logged and marked Failed, and the rest of the group is still made."""
+	for name, doc in invoices:
+		frappe.db.sql("savepoint offline_invoice")
+		try:
+			if cstr(name) not in get_synced_offline_invoices([name]):
+				make_offline_invoice(name, frappe._dict(doc), [])
+
+			docstatus = get_synced_offline_invoices([name]).get(cstr(name))
+			status = {0: 'Draft', 1: 'Submitted'}.get(docstatus, 'Failed')
+		except Exception:
+			rollback_offline_invoice()
+			frappe.log_error(frappe.get_traceback(), _("Offline invoice {0} could not be synced").format(name))
+			frappe.db.commit()
+			status = 'Failed'
+
+		frappe.cache().hset('offline_invoice_sync', cstr(name), frappe._dict({'status': status}))
+
+
+def rollback_offline_invoice():
+	"""Undo the uncommitted changes of the invoice being made, the invoices before it are committed"""
+	try:
+		frappe.db.sql("rollback to savepoint offline_invoice")
+	except Exception:
+		# the item or customer made for the invoice was committed, which releases the savepoint
+		frappe.db.rollback()
+
+
+@frappe.whitelist()
+def get_offline_invoice_status(offline_pos_names):
+	"""Status of each offline invoice: Submitted, Draft (could not be submitted), Queued, Failed or Not Found"""
+	if isinstance(offline_pos_names, string_types):
+		offline_pos_names = json.loads(offline_pos_names)
+
+	synced = get_synced_offline_invoices(offline_pos_names)
+
+	statuses = {}
+	for name in offline_pos_names:
+		if cstr(name) in synced:
+			statuses[name] = 'Submitted' if synced[cstr(name)] == 1 else 'Draft'
+		else:
+			status = frappe.cache().hget('offline_invoice_sync', cstr(name))
+			statuses[name] = status.status if status else 'Not Found'
+
+	return statuses
+
+
 def validate_records(doc):
 	validate_item(doc)
 
@@ -5,7 +5,7 @@ from __future__ import unicode_literals
 import frappe
 
 import unittest, copy, time
-from frappe.utils import nowdate, flt, getdate, cint, add_days, add_months
+from frappe.utils import nowdate, flt, getdate, cint, add_days, add_months, cstr
 from frappe.model.dynamic_links import get_dynamic_link_map
 from erpnext.stock.doctype.stock_entry.test_stock_entry import make_stock_entry, get_qty_after_transaction
 from erpnext.accounts.doctype.purchase_invoice.test_purchase_invoice import unlink_payment_on_cancel_of_invoice
@@ -824,6 +824,36 @@ class TestSalesInvoice(unittest.TestCase):
 
 		self.pos_gl_entry(si, pos, 50)
 
+	def test_group_offline_invoices_by_item(self):
+		from erpnext.accounts.doctype.sales_invoice.pos import group_invoices_by_item
+
+		invoices = [
+			("1", {"items": [{"item_code": "A"}, {"item_code": "B"}]}),
+			("2", {"items": [{"item_code": "B"}]}),
+			("3", {"items": [{"item_code": "C"}]}),
+			("4", {"items": [{"item_code": "D"}, {"item_code": "A"}]}),
+			("5", {"items": [{"item_code": "E"}]})
+		]
+
+		groups = [sorted(name for name, doc in group) for group in group_invoices_by_item(invoices, 2)]
+		self.assertEqual(sorted(groups), [["1", "2", "4"], ["3", "5"]])
+
+	def test_failed_offline_invoice_does_not_stop_the_group(self):
+		from erpnext.accounts.doctype.sales_invoice.pos import make_offline_invoices
+
+		timestamp = cint(time.time())
+		si = create_sales_invoice(do_not_save=True)
+		invoices = [
+			(timestamp, {"customer": "_Test Customer", "items": None}),
+			(timestamp + 1, si.as_dict())
+		]
+
+		make_offline_invoices(invoices)
+
+		statuses = [frappe.cache().hget('offline_invoice_sync', cstr(name)).status for name, doc in invoices]
+		self.assertEqual(statuses, ['Failed', 'Submitted'])
+		self.assertFalse(frappe.db.exists('Sales Invoice', {'offline_pos_name': cstr(timestamp)}))
+
 	def test_make_pos_invoice_in_draft(self):
 		from erpnext.accounts.doctype.sales_invoice.pos import make_invoice
 		from erpnext.stock.doctype.item.test_item import make_item
@@ -9,7 +9,15 @@ from erpnext.accounts.utils import get_stock_and_account_balance
 from frappe.model.meta import get_field_precision
 from erpnext.accounts.doctype.budget.budget import validate_expense_against_budget
 from erpnext.accounts.doctype.accounting_dimension.accounting_dimension import get_accounting_dimensions
+from erpnext.accounts.doctype.gl_entry.gl_entry import (get_account_details, validate_frozen_account,
+	validate_balance_type, update_outstanding_amt)
+from erpnext.accounts.doctype.account_balance.account_balance import update_account_balances
+from erpnext.selling.doctype.customer_credit_exposure.customer_credit_exposure import update_gl_exposure
+from erpnext.accounts.doctype.payment_ledger_entry.payment_ledger_entry import make_payment_ledger_entries
 
+# vouchers with at least these many entries are inserted in bulk, see `make_entries_in_bulk`
+BULK_INSERT_THRESHOLD = 100
+BULK_INSERT_BATCH_SIZE = 500
 
 class ClosedAccountingPeriod(frappe.ValidationError): pass
 class StockAccountInvalidTransaction(frappe.ValidationError): pass
@@ -75,11 +83,13 @@ def process_gl_map(gl_map, merge_entries=True):
 
 def merge_similar_entries(gl_map):
 	merged_gl_map = []
-	accounting_dimensions = get_accounting_dimensions()
+	merge_keys = {}
+	merge_properties = get_merge_properties(get_accounting_dimensions())
 	for entry in gl_map:
 		# if there is already an entry in this account then just add it
 		# to that entry
-		same_head = check_if_in_list(entry, merged_gl_map, accounting_dimensions)
+		key = get_merge_key(entry, merge_properties)
+		same_head = merge_keys.get(key)
 		if same_head:
 			same_head.debit	= flt(same_head.debit) + flt(entry.debit)
 			same_head.debit_in_account_currency	= \
@@ -88,6 +98,7 @@ def merge_similar_entries(gl_map):
 			same_head.credit_in_account_currency = \
 				flt(same_head.credit_in_account_currency) + flt(entry.credit_in_account_currency)
 		else:
+			merge_keys[key] = entry
 			merged_gl_map.append(entry)
 
 	company = gl_map[0].company if gl_map else erpnext.get_default_company()
@@ -100,23 +111,25 @@ def merge_similar_entries(gl_map):
 
 	return merged_gl_map
 
-def check_if_in_list(gle, gl_map, dimensions=None):
-	account_head_fieldnames = ['party_type', 'party', 'against_voucher', 'against_voucher_type',
+def get_merge_properties(dimensions=None):
+	merge_properties = ['account', 'party_type', 'party', 'against_voucher', 'against_voucher_type',
 		'cost_center', 'project']
 
 	if dimensions:
-		account_head_fieldnames = account_head_fieldnames + dimensions
+		merge_properties = merge_properties + dimensions
 
-	for e in gl_map:
-		same_head = True
-		if e.account != gle.account:
-			same_head = False
+	return merge_properties
 
-		for fieldname in account_head_fieldnames:
-			if cstr(e.get(fieldname)) != cstr(gle.get(fieldname)):
-				same_head = False
+def get_merge_key(entry, merge_properties):
+	"""Entries with the same key are merged, values are compared as strings like `check_if_in_list`"""
+	return tuple(cstr(entry.get(fieldname)) for fieldname in merge_properties)
 
-		if same_head:
+def check_if_in_list(gle, gl_map, dimensions=None):
+	merge_properties = get_merge_properties(dimensions)
+	key = get_merge_key(gle, merge_properties)
+
+	for e in gl_map:
+		if get_merge_key(e, merge_properties) == key:
 			return e
 
 def save_entries(gl_map, adv_adj, update_outstanding):
@@ -127,14 +140,82 @@ def save_entries(gl_map, adv_adj, update_outstanding):
 	if gl_map:
 		check_freezing_date(gl_map[0]["posting_date"], adv_adj)
 
-	for entry in gl_map:
-		make_entry(entry, adv_adj, update_outstanding)
+	if use_bulk_insert(gl_map):
+		gl_entries = make_entries_in_bulk(gl_map, adv_adj, update_outstanding)
+	else:
+		gl_entries = []
+		for entry in gl_map:
+			gl_entries.append(make_entry(entry, adv_adj, update_outstanding))
 
-		# check against budget
-		validate_expense_against_budget(entry)
+			# check against budget
+			validate_expense_against_budget(entry)
+
+	update_account_balances(gl_entries)
+	update_gl_exposure(gl_entries)
+	make_payment_ledger_entries(gl_entries)
 
 	validate_account_for_perpetual_inventory(gl_map)
 
+def use_bulk_insert(gl_map):
+	"""Large vouchers are validated and inserted in bulk, unless apps hook into GL Entry events,
+	directly or with hooks for all doctypes, which are not run for entries inserted in bulk"""
+	if len(gl_map) < BULK_INSERT_THRESHOLD or frappe.flags.disable_gl_bulk_insert:
+		return False
+
+	doc_hooks = frappe.get_doc_hooks()
+	return not (doc_hooks.get("GL Entry") or doc_hooks.get("*"))
+
+def make_entries_in_bulk(gl_map, adv_adj, update_outstanding):
+	"""Validate and insert GL Entries of a voucher with a few multi-row inserts.
+
+	Account and cost center details are fetched once for the whole map and
+	per-account checks run once per account after all entries are inserted,
+	same as `make_entry` checks the balance of each account after inserting it."""
+	account_details = get_account_details(list(set(d.account for d in gl_map)))
+	cost_center_company = dict(frappe.db.sql("""select name, company from `tabCost Center`
+		where name in ({0})""".format(", ".join(["%s"] * len(gl_map))),
+		tuple(d.get("cost_center") for d in gl_map)))
+
+	gl_entries, timestamp = [], now()
+	for args in gl_map:
+		gle = frappe.new_doc("GL Entry")
+		gle.update(args)
+		gle.flags.ignore_permissions = 1
+		gle.flags.account_details = account_details
+		gle.flags.cost_center_company = cost_center_company
+		gle.validate()
+		gle.validate_account_details(adv_adj)
+		gle.validate_dimensions_for_pl_and_bs()
+
+		gle.name = frappe.generate_hash(txt="", length=10)
+		gle.docstatus = 1
+		gle.owner = gle.modified_by = frappe.session.user
+		gle.creation = gle.modified = timestamp
+		gl_entries.append(gle)
+
+		# check against budget
+		validate_expense_against_budget(args)
+
+	fields = list(gl_entries[0].get_valid_dict(convert_dates_to_str=True))
+	for i in range(0, len(gl_entries), BULK_INSERT_BATCH_SIZE):
+		frappe.db.bulk_insert("GL Entry", fields, [[d.get_valid_dict(convert_dates_to_str=True).get(f) for f in fields]
+			for d in gl_entries[i:i + BULK_INSERT_BATCH_SIZE]])
+
+	for account in set(d.account for d in gl_entries):
+		validate_frozen_account(account, adv_adj)
+		validate_balance_type(account, adv_adj)
+
+	if update_outstanding == 'Yes':
+		against_vouchers = set()
+		for d in gl_entries:
+			if d.against_voucher_type in ['Journal Entry', 'Sales Invoice', 'Purchase Invoice', 'Fees'] \
+				and d.against_voucher:
+					against_vouchers.add((d.account, d.party_type, d.party, d.against_voucher_type, d.against_voucher))
+
+		for args in against_vouchers:
+			update_outstanding_amt(*args)
+
+	return gl_entries
 
 def make_entry(args, adv_adj, update_outstanding):
 	gle = frappe.new_doc("GL Entry")
@@ -149,6 +230,8 @@ def make_entry(args, adv_adj, update_outstanding):
 	# check against budget
 	validate_expense_against_budget(args)
 
+	return gle
+
 def validate_account_for_perpetual_inventory(gl_map):
 	if cint(erpnext.is_perpetual_inventory_enabled(gl_map[0].company)):
 		account_list = [gl_entries.account for gl_entries in gl_map]
@@ -305,6 +388,7 @@ def make_reverse_gl_entries(gl_entries=None, voucher_type=None, voucher_no=None,
 		set_as_cancel(gl_entries[0]['voucher_type'], gl_entries[0]['voucher_no'])
 		check_freezing_date(gl_entries[0]["posting_date"], adv_adj)
 
+		reverse_entries = []
 		for entry in gl_entries:
 			entry['name'] = None
 			debit = entry.get('debit', 0)
@@ -323,7 +407,11 @@ def make_reverse_gl_entries(gl_entries=None, voucher_type=None, voucher_no=None,
 			entry['posting_date'] = today()
 
 			if entry['debit'] or entry['credit']:
-				make_entry(entry, adv_adj, "Yes")
+				reverse_entries.append(make_entry(entry, adv_adj, "Yes"))
+
+		update_account_balances(reverse_entries)
+		update_gl_exposure(reverse_entries)
+		make_payment_ledger_entries(reverse_entries)
 
 
 def check_freezing_date(posting_date, adv_adj=False):
@@ -280,12 +280,19 @@ erpnext.pos.PointOfSale = erpnext.taxes_and_totals.extend({
 
 	get_data_from_server: function (callback) {
 		var me = this;
+		var catalog = this.get_catalog_from_localstorage();
+
 		frappe.call({
 			method: "erpnext.accounts.doctype.sales_invoice.pos.get_pos_data",
+			args: {
+				catalog_key: catalog.key || null,
+				catalog_version: catalog.version || null
+			},
 			freeze: true,
 			freeze_message: __("Master data syncing, it might take some time"),
 			callback: function (r) {
 				localStorage.setItem('doc', JSON.stringify(r.message.doc));
+				me.update_catalog(r.message, catalog);
 				me.init_master_data(r)
 				me.set_interval_for_si_sync();
 				me.check_internet_connection();
@@ -299,6 +306,56 @@ erpnext.pos.PointOfSale = erpnext.taxes_and_totals.extend({
 		})
 	},
 
+	get_catalog_from_localstorage: function () {
+		try {
+			return JSON.parse(localStorage.getItem('pos_catalog')) || {};
+		} catch (e) {
+			return {}
+		}
+	},
+
+	update_catalog: function (data, catalog) {
+		// masters are sent as a whole the first time, after that only what changed since the kept version
+		var list_keys = {"items": "item_code", "customers": "name"};
+
+		if (data.catalog_delta) {
+			$.each(data.catalog_delta, function (section, delta) {
+				var values = {};
+				if (!delta.replace && list_keys[section]) {
+					$.each(catalog.data[section] || [], function (i, row) {
+						values[row[list_keys[section]]] = row;
+					});
+				} else if (!delta.replace) {
+					values = catalog.data[section] || {};
+				}
+
+				$.extend(values, delta.updated);
+				$.each(delta.deleted, function (i, key) {
+					delete values[key];
+				});
+
+				catalog.data[section] = list_keys[section] ? Object.values(values) : values;
+			});
+		} else {
+			catalog.data = {};
+			$.each(["items", "customers", "address", "contacts", "serial_no_data", "batch_no_data",
+				"barcode_data", "tax_data", "price_list_data", "customer_wise_price_list", "bin_data"], function (i, section) {
+				catalog.data[section] = data[section];
+			});
+		}
+
+		catalog.key = data.catalog_key;
+		catalog.version = data.catalog_version;
+		$.extend(data, catalog.data);
+
+		try {
+			localStorage.setItem('pos_catalog', JSON.stringify(catalog));
+		} catch (e) {
+			// too large to keep, the whole catalog is loaded again next time
+			localStorage.removeItem('pos_catalog');
+		}
+	},
+
 	init_master_data: function (r) {
 		var me = this;
 		this.doc = JSON.parse(localStorage.getItem('doc'));
@@ -1781,6 +1838,10 @@ erpnext.pos.PointOfSale = erpnext.taxes_and_totals.extend({
 						me.address = r.message.synced_address;
 						me.contacts = r.message.synced_contacts;
 						me.removed_items = r.message.invoice;
+						if (!$.isEmptyObject(r.message.queued_invoices)) {
+							frappe.show_alert(__("{0} invoices are being submitted in the background",
+								[Object.keys(r.message.queued_invoices).length]));
+						}
 						me.removed_email = r.message.email_queue;
 						me.removed_customers = r.message.customers;
 						me.remove_doc_from_localstorage();
@@ -571,9 +571,16 @@ class ReceivablePayableReport(object):
 			date_condition = "AND posting_date <=%s"
 
 		if self.filters.get(scrub(self.party_type)):
-			select_fields = "debit_in_account_currency as debit, credit_in_account_currency as credit"
+			debit_field, credit_field = "debit_in_account_currency", "credit_in_account_currency"
 		else:
-			select_fields = "debit, credit"
+			debit_field, credit_field = "debit", "credit"
+
+		if self.use_payment_ledger():
+			self.gl_entries = self.get_payment_ledger_entries(debit_field, credit_field,
+				date_condition, conditions, order_by, values)
+			return
+
+		select_fields = "{0} as debit, {1} as credit".format(debit_field, credit_field)
 
 		self.gl_entries = frappe.db.sql("""
 			select
@@ -588,6 +595,34 @@ class ReceivablePayableReport(object):
 				{1} {2} {3}"""
 			.format(select_fields, date_condition, conditions, order_by), values, as_dict=True)
 
+	def use_payment_ledger(self):
+		# the payment ledger does not have accounting dimensions
+		return not (frappe.flags.ignore_payment_ledger
+			or any(self.filters.get(d.fieldname) for d in get_accounting_dimensions(as_list=False)))
+
+	def get_payment_ledger_entries(self, debit_field, credit_field, date_condition, conditions, order_by, values):
+		"""Entries of the payment ledger, summed per voucher, party and invoice.
+
+		Debits and credits are summed separately as `update_voucher_balance`
+		classifies each entry by the sign of its balance."""
+		return frappe.db.sql("""
+			select
+				min(name) as name, min(posting_date) as posting_date, account, party_type, party,
+				voucher_type, voucher_no, against_voucher_type, against_voucher, account_currency,
+				max(remarks) as remarks, sum({debit}) as debit, sum({credit}) as credit
+			from
+				`tabPayment Ledger Entry`
+			where
+				party_type=%s
+				and (party is not null and party != '')
+				{date_condition} {conditions}
+			group by
+				voucher_type, voucher_no, party, account, party_type, against_voucher_type,
+				against_voucher, account_currency, case when {debit} > {credit} then 1 else 0 end
+			{order_by}"""
+			.format(debit=debit_field, credit=credit_field, date_condition=date_condition,
+				conditions=conditions, order_by=order_by), values, as_dict=True)
+
 	def get_sales_invoices_or_customers_based_on_sales_person(self):
 		if self.filters.get("sales_person"):
 			lft, rgt = frappe.db.get_value("Sales Person",
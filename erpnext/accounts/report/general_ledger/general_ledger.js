@@ -161,7 +161,18 @@ frappe.query_reports["General Ledger"] = {
 			"label": __("Show Cancelled Entries"),
 			"fieldtype": "Check"
 		}
-	]
+	],
+
+	onload: function(report) {
+		report.page.add_inner_button(__("Export Full Ledger"), function() {
+			frappe.call({
+				method: "erpnext.accounts.report.general_ledger.general_ledger.export_ledger_csv",
+				args: {
+					filters: report.get_values()
+				}
+			});
+		});
+	}
 }
 
 erpnext.utils.add_dimensions('General Ledger', 15)
@@ -5,18 +5,31 @@ from __future__ import unicode_literals
 import frappe, erpnext
 from erpnext import get_company_currency, get_default_company
 from erpnext.accounts.report.utils import get_currency, convert_to_presentation_currency
-from frappe.utils import getdate, cstr, flt, fmt_money
+from frappe.utils import getdate, cstr, flt, cint, fmt_money
 from frappe import _, _dict
 from erpnext.accounts.utils import get_account_currency
 from erpnext.accounts.report.financial_statements import get_cost_centers_with_children
-from six import iteritems
+from six import iteritems, string_types
 from erpnext.accounts.doctype.accounting_dimension.accounting_dimension import get_accounting_dimensions, get_dimension_with_children
 from collections import OrderedDict
+import csv, io
+
+# entries fetched per query when the ledger is streamed, see `iter_gl_entries`
+STREAMING_CHUNK_SIZE = 1000
 
 def execute(filters=None):
 	if not filters:
 		return [], []
 
+	filters, account_details = prepare_filters(filters)
+
+	columns = get_columns(filters)
+
+	res = get_result(filters, account_details)
+
+	return columns, res
+
+def prepare_filters(filters):
 	account_details = {}
 
 	if filters and filters.get('print_in_account_currency') and \
@@ -35,11 +48,7 @@ def execute(filters=None):
 
 	filters = set_account_currency(filters)
 
-	columns = get_columns(filters)
-
-	res = get_result(filters, account_details)
-
-	return columns, res
+	return filters, account_details
 
 
 def validate_filters(filters, account_details):
@@ -116,25 +125,54 @@ def get_result(filters, account_details):
 
 def get_gl_entries(filters):
 	currency_map = get_currency(filters)
-	select_fields = """, debit, credit, debit_in_account_currency,
-		credit_in_account_currency """
 
 	order_by_statement = "order by posting_date, account, creation"
 
 	if filters.get("group_by") == _("Group by Voucher"):
 		order_by_statement = "order by posting_date, voucher_type, voucher_no"
 
+	gl_entries = frappe.db.sql(
+		"""
+		{query}
+		{order_by_statement}
+		""".format(query=get_gl_entries_query(filters), order_by_statement=order_by_statement),
+		filters, as_dict=1)
+
+	if filters.get('presentation_currency'):
+		return convert_to_presentation_currency(gl_entries, currency_map)
+	else:
+		return gl_entries
+
+def get_gl_entries_query(filters):
+	return "\n\t\tUNION ALL\n".join(get_gl_entries_selects(filters))
+
+def get_gl_entries_selects(filters, additional_conditions=""):
+	"""Selects of the entries of the ledger, their union gives all the rows.
+	`additional_conditions` are added to each of them, so that they use the indexes of GL Entry"""
+	select_fields = """, debit, credit, debit_in_account_currency,
+		credit_in_account_currency """
+
 	if filters.get("include_default_book_entries"):
 		filters['company_fb'] = frappe.db.get_value("Company",
 			filters.get("company"), 'default_finance_book')
 
-	distributed_cost_center_query = ""
+	conditions = get_conditions(filters)
+	selects = ["""
+		select
+			name as gl_entry, posting_date, account, party_type, party,
+			voucher_type, voucher_no, cost_center, project,
+			against_voucher_type, against_voucher, account_currency,
+			remarks, against, is_opening, creation {select_fields}
+		from `tabGL Entry`
+		where company=%(company)s {conditions} {additional_conditions}
+		""".format(select_fields=select_fields, conditions=conditions,
+			additional_conditions=additional_conditions)]
+
 	if filters and filters.get('cost_center'):
 		select_fields_with_percentage = """, debit*(DCC_allocation.percentage_allocation/100) as debit, credit*(DCC_allocation.percentage_allocation/100) as credit, debit_in_account_currency*(DCC_allocation.percentage_allocation/100) as debit_in_account_currency,
 		credit_in_account_currency*(DCC_allocation.percentage_allocation/100) as credit_in_account_currency """
-		
-		distributed_cost_center_query = """
-		UNION ALL
+
+		selects.append("""
 		SELECT name as gl_entry,
 			posting_date,
 			account,
@@ -160,30 +198,12 @@ def get_gl_entries(filters):
 		{conditions}
 		AND posting_date <= %(to_date)s
 		AND cost_center = DCC_allocation.parent
-		""".format(select_fields_with_percentage=select_fields_with_percentage, conditions=get_conditions(filters).replace("and cost_center in %(cost_center)s ", ''))
-
-	gl_entries = frappe.db.sql(
-		"""
-		select
-			name as gl_entry, posting_date, account, party_type, party,
-			voucher_type, voucher_no, cost_center, project,
-			against_voucher_type, against_voucher, account_currency,
-			remarks, against, is_opening, creation {select_fields}
-		from `tabGL Entry`
-		where company=%(company)s {conditions}
-		{distributed_cost_center_query}
-		{order_by_statement}
-		""".format(
-			select_fields=select_fields, conditions=get_conditions(filters), distributed_cost_center_query=distributed_cost_center_query,
-			order_by_statement=order_by_statement
-		),
-		filters, as_dict=1)
-
-	if filters.get('presentation_currency'):
-		return convert_to_presentation_currency(gl_entries, currency_map)
-	else:
-		return gl_entries
+		{additional_conditions}
+		""".format(select_fields_with_percentage=select_fields_with_percentage,
+			conditions=conditions.replace("and cost_center in %(cost_center)s ", ''),
+			additional_conditions=additional_conditions))
 
+	return selects
 
 def get_conditions(filters):
 	conditions = []
@@ -394,6 +414,220 @@ def get_balance(row, balance, debit_field, credit_field):
 
 	return balance
 
+@frappe.whitelist()
+def get_ledger_page(filters, cursor=None, page_length=500):
+	"""A page of the ledger in posting order, without grouping.
+
+	Pass the returned `cursor` to get the next page, it carries the position
+	and the running balance so pages continue from it in the order of an index
+	instead of skipping an offset. The opening row is only returned with the first page."""
+	if not frappe.get_doc("Report", "General Ledger").is_permitted():
+		frappe.throw(_("Not permitted"), frappe.PermissionError)
+
+	filters, account_details = prepare_filters(get_filters_dict(filters))
+	cursor = frappe._dict(frappe.parse_json(cursor)) if cursor else None
+	opening = None
+	if not cursor:
+		opening = get_opening_balance(filters, get_gl_entries_query(filters))
+		opening.balance = get_balance(opening, 0, 'debit', 'credit')
+		cursor = frappe._dict(balance=opening.balance)
+
+	entries = next(iter_gl_entries(filters, cursor, chunk_size=cint(page_length)), [])
+	balance = add_running_balance(entries, flt(cursor.balance), filters)
+
+	next_cursor = None
+	if len(entries) == cint(page_length):
+		next_cursor = get_cursor(entries[-1], balance)
+
+	return {
+		"opening": opening,
+		"entries": entries,
+		"cursor": next_cursor
+	}
+
+@frappe.whitelist()
+def export_ledger_csv(filters):
+	"""Queue a CSV export of the ledger, the user is notified with a link when it is ready"""
+	if not frappe.get_doc("Report", "General Ledger").is_permitted():
+		frappe.throw(_("Not permitted"), frappe.PermissionError)
+
+	filters, account_details = prepare_filters(get_filters_dict(filters))
+
+	frappe.enqueue("erpnext.accounts.report.general_ledger.general_ledger.make_ledger_csv",
+		queue="long", timeout=7200, filters=filters, user=frappe.session.user)
+	frappe.msgprint(_("The General Ledger is being exported, you will be notified when it is ready"))
+
+def make_ledger_csv(filters, user=None):
+	filters = frappe._dict(filters)
+	file_name = "general-ledger-{0}-{1}.csv".format(frappe.scrub(filters.company), frappe.generate_hash(length=6))
+
+	with io.open(frappe.get_site_path("private", "files", file_name), "w", newline="", encoding="utf-8") as f:
+		write_ledger_csv(filters, f)
+
+	file_doc = frappe.get_doc({
+		"doctype": "File",
+		"file_name": file_name,
+		"file_url": "/private/files/" + file_name,
+		"is_private": 1
+	})
+	file_doc.flags.ignore_permissions = True
+	file_doc.insert()
+	frappe.db.commit()
+
+	frappe.publish_realtime("msgprint", _("General Ledger export is ready: {0}").format(
+		'<a href="{0}">{1}</a>'.format(file_doc.file_url, file_name)), user=user)
+
+def write_ledger_csv(filters, f):
+	"""Write the ledger to the file `f`, one chunk of entries at a time"""
+	columns = [d for d in get_columns(filters) if not d.get("hidden")]
+	fieldnames = [d["fieldname"] for d in columns]
+
+	writer = csv.writer(f)
+	writer.writerow([d["label"] for d in columns])
+
+	opening = get_opening_balance(filters, get_gl_entries_query(filters))
+	balance = get_balance(opening, 0, 'debit', 'credit')
+	opening.balance = balance
+	writer.writerow([opening.get(d) for d in fieldnames])
+
+	for entries in iter_gl_entries(filters):
+		balance = add_running_balance(entries, balance, filters)
+		writer.writerows([[d.get(fieldname) for fieldname in fieldnames] for d in entries])
+
+def get_filters_dict(filters):
+	if isinstance(filters, string_types):
+		filters = frappe.parse_json(filters)
+
+	return frappe._dict(filters)
+
+def get_opening_condition(filters):
+	if filters.get("show_opening_entries"):
+		return "posting_date < %(from_date)s"
+
+	return "(posting_date < %(from_date)s or ifnull(is_opening, 'No') = 'Yes')"
+
+def get_opening_balance(filters, query):
+	"""Opening row of the ledger, summed in the database instead of over the fetched entries"""
+	opening = get_totals_dict().opening
+
+	if filters.get("presentation_currency"):
+		# conversion depends on the account and, for P&L accounts, the posting date,
+		# so debits and credits are summed per account and date and converted separately
+		group_by = "group by account, account_currency, posting_date"
+		select_fields = "account, account_currency, posting_date,"
+	else:
+		group_by, select_fields = "", ""
+
+	balances = frappe.db.sql("""
+		select {select_fields} sum(debit) as debit, sum(credit) as credit,
+			sum(debit_in_account_currency) as debit_in_account_currency,
+			sum(credit_in_account_currency) as credit_in_account_currency
+		from ({query}) gle
+		where {condition}
+		{group_by}""".format(select_fields=select_fields, query=query,
+			condition=get_opening_condition(filters), group_by=group_by), filters, as_dict=1)
+
+	if filters.get("presentation_currency"):
+		rows = []
+		for d in balances:
+			rows.append(_dict(d, credit=0, credit_in_account_currency=0))
+			rows.append(_dict(d, debit=0, debit_in_account_currency=0))
+
+		balances = convert_to_presentation_currency(rows, get_currency(filters))
+
+	for d in balances:
+		for fieldname in ("debit", "credit", "debit_in_account_currency", "credit_in_account_currency"):
+			opening[fieldname] += flt(d.get(fieldname))
+
+	return opening
+
+def iter_gl_entries(filters, cursor=None, chunk_size=STREAMING_CHUNK_SIZE):
+	"""Yield the entries of the period after `cursor` in chunks, ordered by posting date,
+	creation, name and cost center. Each chunk continues from the last entry of the previous one.
+
+	Each select of the ledger reads its chunk in the order of the company, posting date and
+	creation index of GL Entry. Rows allocated from a distributed cost center carry the name
+	of the entry they come from, so the cost center is part of the key to keep the order unique."""
+	currency_map = get_currency(filters) if filters.get("presentation_currency") else None
+
+	period_condition = "and posting_date >= %(from_date)s and posting_date <= %(to_date)s"
+	if not filters.get("show_opening_entries"):
+		period_condition += " and ifnull(is_opening, 'No') != 'Yes'"
+
+	keyset_condition = """and posting_date >= %(cursor_posting_date)s
+		and (posting_date > %(cursor_posting_date)s or creation > %(cursor_creation)s
+		or (creation = %(cursor_creation)s and (name > %(cursor_gl_entry)s
+		or (name = %(cursor_gl_entry)s and ifnull(cost_center, '') > %(cursor_cost_center)s))))"""
+
+	first_query = get_chunk_query(filters, period_condition, chunk_size)
+	next_query = get_chunk_query(filters, period_condition + " " + keyset_condition, chunk_size)
+
+	values = frappe._dict(filters)
+	while True:
+		query = first_query
+		if cursor and cursor.get("gl_entry"):
+			query = next_query
+			values.update({
+				"cursor_posting_date": cursor.posting_date,
+				"cursor_creation": cursor.creation,
+				"cursor_gl_entry": cursor.gl_entry,
+				"cursor_cost_center": cstr(cursor.get("cost_center"))
+			})
+
+		entries = frappe.db.sql(query, values, as_dict=1)
+
+		if not entries:
+			break
+
+		cursor = get_cursor(entries[-1])
+		if currency_map:
+			entries = convert_to_presentation_currency(entries, currency_map)
+
+		yield entries
+
+		if len(entries) < chunk_size:
+			break
+
+def get_chunk_query(filters, conditions, chunk_size):
+	limit = "limit {0}".format(cint(chunk_size))
+	selects = get_gl_entries_selects(filters, conditions)
+
+	if len(selects) == 1:
+		return "{0} order by posting_date, creation, name {1}".format(selects[0], limit)
+
+	# each select stops after a chunk, only those rows are sorted together
+	return """select * from ({0}) gle
+		order by posting_date, creation, gl_entry, ifnull(cost_center, '') {1}""".format(
+			" union all ".join("({0} order by posting_date, creation, name {1})".format(d, limit)
+				for d in selects), limit)
+
+def add_running_balance(entries, balance, filters):
+	"""Set the balance after each entry, starting from `balance`, and return the closing balance"""
+	inv_details = get_supplier_invoice_details_for(entries)
+
+	for d in entries:
+		balance = get_balance(d, balance, 'debit', 'credit')
+		d['balance'] = balance
+
+		d['account_currency'] = filters.account_currency
+		d['bill_no'] = inv_details.get(d.get('against_voucher'), '')
+
+	return balance
+
+def get_supplier_invoice_details_for(entries):
+	invoices = list(set(d.against_voucher for d in entries
+		if d.against_voucher_type == "Purchase Invoice" and d.against_voucher))
+	if not invoices:
+		return {}
+
+	return frappe._dict(frappe.db.sql("""select name, bill_no from `tabPurchase Invoice`
+		where docstatus = 1 and bill_no is not null and bill_no != '' and name in ({0})"""
+		.format(", ".join(["%s"] * len(invoices))), tuple(invoices)))
+
+def get_cursor(gle, balance=None):
+	return _dict(posting_date=cstr(gle.posting_date), creation=cstr(gle.creation),
+		gl_entry=gle.gl_entry, cost_center=cstr(gle.cost_center), balance=balance)
+
 def get_columns(filters):
 	if filters.get("presentation_currency"):
 		currency = filters["presentation_currency"]
@@ -0,0 +1,55 @@
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and Contributors
+# License: GNU General Public License v3. See license.txt
+
+from __future__ import unicode_literals
+
+import frappe
+import unittest, io
+from frappe.utils import nowdate, add_days, flt
+from erpnext.accounts.report.general_ledger.general_ledger import (execute, get_ledger_page,
+	write_ledger_csv, prepare_filters)
+from erpnext.accounts.doctype.journal_entry.test_journal_entry import make_journal_entry
+
+class TestGeneralLedger(unittest.TestCase):
+	def setUp(self):
+		self.account = "_Test Bank - _TC"
+		make_journal_entry("_Test Account Cost for Goods Sold - _TC", self.account, 100,
+			posting_date=add_days(nowdate(), -10), submit=True)
+		for amount in (10, 20, 30, 40, 50):
+			make_journal_entry("_Test Account Cost for Goods Sold - _TC", self.account, amount, submit=True)
+
+	def get_filters(self):
+		return frappe._dict({
+			"company": "_Test Company",
+			"from_date": add_days(nowdate(), -5),
+			"to_date": nowdate(),
+			"account": self.account,
+			"group_by": ""
+		})
+
+	def test_pages_match_report(self):
+		columns, data = execute(self.get_filters())
+		expected_entries = [d for d in data if d.get("gl_entry")]
+		opening, total = data[0], [d for d in data if d.get("account") == "'Total'"][-1]
+
+		page = get_ledger_page(self.get_filters(), page_length=2)
+		self.assertEqual(flt(page["opening"].balance), flt(opening.balance))
+
+		entries = page["entries"]
+		while page["cursor"]:
+			page = get_ledger_page(self.get_filters(), cursor=frappe.as_json(page["cursor"]), page_length=2)
+			entries += page["entries"]
+
+		self.assertEqual(sorted(d.gl_entry for d in entries), sorted(d.gl_entry for d in expected_entries))
+		self.assertEqual(flt(sum(flt(d.debit) - flt(d.credit) for d in entries), 2),
+			flt(total.debit - total.credit, 2))
+		self.assertEqual(flt(entries[-1].balance, 2), flt(opening.balance + total.debit - total.credit, 2))
+
+	def test_csv_export(self):
+		filters, account_details = prepare_filters(self.get_filters())
+		f = io.StringIO()
+		write_ledger_csv(filters, f)
+
+		columns, data = execute(self.get_filters())
+		# header and opening row, then one row per entry
+		self.assertEqual(len(f.getvalue().splitlines()), 2 + len([d for d in data if d.get("gl_entry")]))
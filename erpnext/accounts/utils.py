@@ -15,6 +15,11 @@ from erpnext.accounts.doctype.account.account import get_account_currency
 
 from erpnext.stock.utils import get_stock_value_on
 from erpnext.stock import get_warehouse_account_map
+from erpnext.accounts.doctype.account_balance.account_balance import (update_account_balances,
+	get_balance as get_balance_from_account_balances)
+from erpnext.accounts.doctype.payment_ledger_entry.payment_ledger_entry import (delete_payment_ledger_entries,
+	unlink_payment_ledger_entries)
+from erpnext.selling.doctype.customer_credit_exposure.customer_credit_exposure import update_gl_exposure
 
 
 class FiscalYearError(frappe.ValidationError): pass
@@ -122,9 +127,11 @@ def get_balance_on(account=None, date=None, party_type=None, party=None, company
 		cost_center = frappe.form_dict.get("cost_center")
 
 
-	cond = []
+	# conditions on the posting period are kept apart, the others also apply to Account Balance
+	cond, period_cond = [], []
+	balance_date, pl_year_start_date = date, None
 	if date:
-		cond.append("posting_date <= %s" % frappe.db.escape(cstr(date)))
+		period_cond.append("posting_date <= %s" % frappe.db.escape(cstr(date)))
 	else:
 		# get balance of all entries that exist
 		date = nowdate()
@@ -171,8 +178,9 @@ def get_balance_on(account=None, date=None, party_type=None, party=None, company
 
 		if report_type == 'Profit and Loss':
 			# for pl accounts, get balance within a fiscal year
-			cond.append("posting_date >= '%s' and voucher_type != 'Period Closing Voucher'" \
+			period_cond.append("posting_date >= '%s' and voucher_type != 'Period Closing Voucher'" \
 				% year_start_date)
+			pl_year_start_date = year_start_date
 		# different filter for group and ledger - improved performance
 		if acc.is_group:
 			cond.append("""exists (
@@ -195,14 +203,20 @@ def get_balance_on(account=None, date=None, party_type=None, party=None, company
 		cond.append("""gle.company = %s """ % (frappe.db.escape(company, percent=False)))
 
 	if account or (party_type and party):
-		if in_account_currency:
-			select_field = "sum(debit_in_account_currency) - sum(credit_in_account_currency)"
-		else:
-			select_field = "sum(debit) - sum(credit)"
-		bal = frappe.db.sql("""
-			SELECT {0}
-			FROM `tabGL Entry` gle
-			WHERE {1}""".format(select_field, " and ".join(cond)))[0][0]
+		bal = None
+		if not frappe.flags.ignore_account_balances:
+			bal = get_balance_from_account_balances(cond, balance_date, pl_year_start_date,
+				in_account_currency)
+
+		if bal is None:
+			if in_account_currency:
+				select_field = "sum(debit_in_account_currency) - sum(credit_in_account_currency)"
+			else:
+				select_field = "sum(debit) - sum(credit)"
+			bal = frappe.db.sql("""
+				SELECT {0}
+				FROM `tabGL Entry` gle
+				WHERE {1}""".format(select_field, " and ".join(cond + period_cond) or "1=1"))[0][0]
 
 		# if bal is None, return 0
 		return flt(bal)
@@ -515,6 +529,7 @@ def unlink_ref_doc_from_payment_entries(ref_doc):
 		where against_voucher_type=%s and against_voucher=%s
 		and voucher_no != ifnull(against_voucher, '')""",
 		(now(), frappe.session.user, ref_doc.doctype, ref_doc.name))
+	unlink_payment_ledger_entries(ref_doc.doctype, ref_doc.name)
 
 	if ref_doc.doctype in ("Sales Invoice", "Purchase Invoice"):
 		ref_doc.set("advances", [])
@@ -910,9 +925,17 @@ def get_stock_accounts(company):
 
 def update_gl_entries_after(posting_date, posting_time, for_warehouses=None, for_items=None,
 		warehouse_account=None, company=None):
+	"""Make the GL entries of the stock vouchers posted after the given datetime match their
+	stock ledger again. Only called by the Repost Item Valuation job, submitting a back-dated
+	voucher posts its own entries and queues the repost of the ones after it."""
 	def _delete_gl_entries(voucher_type, voucher_no):
+		gl_entries = frappe.get_all("GL Entry", fields=["*"],
+			filters={"voucher_type": voucher_type, "voucher_no": voucher_no})
+		update_account_balances(gl_entries, reverse=True)
+		update_gl_exposure(gl_entries, reverse=True)
 		frappe.db.sql("""delete from `tabGL Entry`
 			where voucher_type=%s and voucher_no=%s""", (voucher_type, voucher_no))
+		delete_payment_ledger_entries(voucher_type, voucher_no)
 
 	if not warehouse_account:
 		warehouse_account = get_warehouse_account_map(company)
@@ -927,7 +950,7 @@ def update_gl_entries_after(posting_date, posting_time, for_warehouses=None, for
 		if expected_gle:
 			if not existing_gle or not compare_existing_and_expected_gle(existing_gle, expected_gle):
 				_delete_gl_entries(voucher_type, voucher_no)
-				voucher_obj.make_gl_entries(gl_entries=expected_gle, repost_future_gle=False, from_repost=True)
+				voucher_obj.make_gl_entries(gl_entries=expected_gle)
 		else:
 			_delete_gl_entries(voucher_type, voucher_no)
 
@@ -9,6 +9,7 @@ import json
 
 from erpnext.stock.doctype.item.item import get_last_purchase_details
 from erpnext.stock.doctype.item.item import validate_end_of_life
+from erpnext.controllers.master_data_cache import clear_master_value
 
 def update_last_purchase_rate(doc, is_submit):
 	"""updates last_purchase_rate in item table for each item"""
@@ -38,6 +39,7 @@ def update_last_purchase_rate(doc, is_submit):
 		if last_purchase_rate:
 			frappe.db.sql("""update `tabItem` set last_purchase_rate = %s where name = %s""",
 				(flt(last_purchase_rate), d.item_code))
+			clear_master_value("Item", d.item_code)
 
 def validate_for_items(doc):
 	items = []
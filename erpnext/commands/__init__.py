@@ -44,6 +44,94 @@ def make_demo(context, site, domain='Manufacturing', days=100,
 			from erpnext.demo import demo
 			demo.make(domain, days)
 
+@click.command('verify-account-balances')
+@click.option('--company', help='Only verify balances of this company')
+@click.option('--rebuild', default=False, is_flag=True,
+	help='Rebuild balances that have drifted from the GL Entries')
+@pass_context
+def verify_account_balances(context, company=None, rebuild=False):
+	"Compare the monthly Account Balance totals with the GL Entries"
+	from erpnext.accounts.doctype.account_balance.account_balance import (get_balance_drift,
+		rebuild_account_balances)
+
+	for site in context.sites:
+		with frappe.init_site(site):
+			frappe.connect()
+			drift = get_balance_drift(company)
+			for key, maintained, expected in drift:
+				print("{0}: {1} != {2}".format(", ".join(str(d) for d in key), maintained, expected))
+
+			print("{0}: {1} balance(s) out of sync".format(site, len(drift)))
+
+			if drift and rebuild:
+				for balance_company in set(key[0] for key, maintained, expected in drift):
+					rebuild_account_balances(balance_company)
+
+				frappe.db.commit()
+				print("{0}: balances rebuilt".format(site))
+
+@click.command('verify-bin-reservations')
+@click.option('--item', help='Only verify Bins of this item')
+@click.option('--warehouse', help='Only verify Bins of this warehouse')
+@click.option('--rebuild', default=False, is_flag=True,
+	help='Rebuild the reserved and ordered qty of Bins that have drifted from open vouchers')
+@pass_context
+def verify_bin_reservations(context, item=None, warehouse=None, rebuild=False):
+	"Compare the reserved, ordered, requested and planned qty of Bins with open vouchers"
+	from erpnext.stock.doctype.bin_reservation.bin_reservation import (get_reservation_drift,
+		rebuild_bin_reservations)
+
+	for site in context.sites:
+		with frappe.init_site(site):
+			frappe.connect()
+			drift = get_reservation_drift(item, warehouse)
+			for key, maintained, expected in drift:
+				print("{0}: {1} != {2}".format(", ".join(key), maintained, expected))
+
+			print("{0}: {1} Bin qty(s) out of sync".format(site, len(drift)))
+
+			if drift and rebuild:
+				for item_code, bin_warehouse in set(key[:2] for key, maintained, expected in drift):
+					rebuild_bin_reservations(item_code, bin_warehouse)
+
+				frappe.db.commit()
+				print("{0}: Bins rebuilt".format(site))
+
+@click.command('repost-stock')
+@click.option('--workers', default=4, type=int, help='Number of worker processes. Default 4')
+@click.option('--partition-size', default=100, type=int,
+	help='Item warehouses reposted and committed together. Default 100')
+@click.option('--only-actual', default=False, is_flag=True, help='Only repost the stock ledger')
+@click.option('--only-bin', default=False, is_flag=True, help='Only recompute Bin quantities')
+@click.option('--allow-negative-stock', default=False, is_flag=True)
+@click.option('--allow-zero-rate', default=False, is_flag=True)
+@click.option('--restart', default=False, is_flag=True,
+	help='Ignore the checkpoint of an interrupted run and repost everything')
+@pass_context
+def repost_stock(context, workers=4, partition_size=100, only_actual=False, only_bin=False,
+	allow_negative_stock=False, allow_zero_rate=False, restart=False):
+	"Repost the stock ledger and Bins of all item warehouses in parallel, resuming an interrupted run"
+	from erpnext.stock.stock_balance import repost_in_partitions
+
+	for site in context.sites:
+		with frappe.init_site(site):
+			frappe.connect()
+			failed = repost_in_partitions(workers, partition_size, resume=not restart,
+				only_actual=only_actual, allow_negative_stock=allow_negative_stock,
+				allow_zero_rate=allow_zero_rate, only_bin=only_bin)
+
+			for pairs, error in failed:
+				print("Failed {0}: {1}".format(", ".join(sorted(set(d[0] for d in pairs))),
+					error.strip().splitlines()[-1]))
+
+			if failed:
+				print("{0}: {1} partition(s) failed, run again to retry them".format(site, len(failed)))
+			else:
+				print("{0}: stock reposted".format(site))
+
 commands = [
-	make_demo
+	make_demo,
+	verify_account_balances,
+	verify_bin_reservations,
+	repost_stock
 ]
\ No newline at end of file
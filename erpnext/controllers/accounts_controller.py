@@ -13,6 +13,8 @@ from erpnext.accounts.utils import get_fiscal_years, validate_fiscal_year, get_a
 from erpnext.utilities.transaction_base import TransactionBase
 from erpnext.buying.utils import update_last_purchase_rate
 from erpnext.controllers.sales_and_purchase_return import validate_return
+from erpnext.controllers.master_data_cache import (get_master_value, start_master_data_cache_stats,
+	log_master_data_cache_stats)
 from erpnext.accounts.party import get_party_account_currency, validate_party_frozen_disabled
 from erpnext.accounts.doctype.pricing_rule.utils import (apply_pricing_rule_on_transaction,
 	apply_pricing_rule_for_free_items, get_applied_pricing_rules)
@@ -63,6 +65,8 @@ class AccountsController(TransactionBase):
 						_('{0} is blocked so this transaction cannot proceed').format(supplier_name), raise_exception=1)
 
 	def validate(self):
+		start_master_data_cache_stats(self)
+
 		if not self.get('is_return'):
 			self.validate_qty_is_not_zero()
 
@@ -108,6 +112,12 @@ class AccountsController(TransactionBase):
 		if self.doctype != 'Material Request':
 			apply_pricing_rule_on_transaction(self)
 
+	def run_post_save_methods(self):
+		super(AccountsController, self).run_post_save_methods()
+
+		if self._action == "submit":
+			log_master_data_cache_stats(self)
+
 	def validate_deferred_start_and_end_date(self):
 		for d in self.items:
 			if d.get("enable_deferred_revenue") or d.get("enable_deferred_expense"):
@@ -372,7 +382,7 @@ class AccountsController(TransactionBase):
 	def validate_tax_account_company(self):
 		for d in self.get("taxes"):
 			if d.account_head:
-				tax_account_company = frappe.db.get_value("Account", d.account_head, "company")
+				tax_account_company = get_master_value("Account", d.account_head, "company")
 				if tax_account_company != self.company:
 					frappe.throw(_("Row #{0}: Account {1} does not belong to company {2}")
 								 .format(d.idx, d.account_head, self.company))
@@ -711,7 +721,7 @@ class AccountsController(TransactionBase):
 	@property
 	def company_abbr(self):
 		if not hasattr(self, "_abbr"):
-			self._abbr = frappe.db.get_value('Company',  self.company,  "abbr")
+			self._abbr = get_master_value('Company', self.company, "abbr")
 
 		return self._abbr
 
@@ -873,7 +883,7 @@ class AccountsController(TransactionBase):
 
 @frappe.whitelist()
 def get_tax_rate(account_head):
-	return frappe.db.get_value("Account", account_head, ["tax_rate", "account_name"], as_dict=True)
+	return get_master_value("Account", account_head, ["tax_rate", "account_name"], as_dict=True)
 
 
 @frappe.whitelist()
@@ -1328,6 +1338,7 @@ def update_child_qty_rate(parent_doctype, trans_items, parent_doctype_name, chil
 			parent.update_reserved_qty_for_subcontract()
 	else:
 		parent.update_reserved_qty()
+		parent.update_credit_exposure()
 		parent.update_project()
 		parent.update_prevdoc_status('submit')
 		parent.update_delivery_status()
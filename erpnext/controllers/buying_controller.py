@@ -16,6 +16,7 @@ from frappe.contacts.doctype.address.address import get_address_display
 
 from erpnext.accounts.doctype.budget.budget import validate_expense_against_budget
 from erpnext.controllers.stock_controller import StockController
+from erpnext.controllers.master_data_cache import get_master_value
 
 class BuyingController(StockController):
 	def __setup__(self):
@@ -85,7 +86,7 @@ class BuyingController(StockController):
 				if supplier:
 					self.supplier = supplier
 				else:
-					item_group = frappe.db.get_value("Item", d.item_code, "item_group")
+					item_group = get_master_value("Item", d.item_code, "item_group")
 					supplier = frappe.db.get_value("Item Default",
 					{"parent": item_group, "company": self.company}, "default_supplier")
 					if supplier:
@@ -309,7 +310,7 @@ class BuyingController(StockController):
 				else:
 					qty = (rm_qty_to_be_consumed / fg_yet_to_be_received) * item.qty
 
-					if frappe.get_cached_value('UOM', raw_material.stock_uom, 'must_be_whole_number'):
+					if get_master_value('UOM', raw_material.stock_uom, 'must_be_whole_number'):
 						qty = frappe.utils.ceil(qty)
 
 				if qty > rm_qty_to_be_consumed:
@@ -376,7 +377,7 @@ class BuyingController(StockController):
 		for bom_item in bom_items:
 			if self.doctype == "Purchase Order":
 				reserve_warehouse = bom_item.source_warehouse or item_wh.get(bom_item.item_code)
-				if frappe.db.get_value("Warehouse", reserve_warehouse, "company") != self.company:
+				if get_master_value("Warehouse", reserve_warehouse, "company") != self.company:
 					reserve_warehouse = None
 
 			conversion_factor = item.conversion_factor
@@ -416,7 +417,7 @@ class BuyingController(StockController):
 			if self.doctype in ["Purchase Receipt", "Purchase Invoice"]:
 				rm.consumed_qty = required_qty
 				rm.description = bom_item.description
-				if item.batch_no and frappe.db.get_value("Item", rm.rm_item_code, "has_batch_no") and not rm.batch_no:
+				if item.batch_no and get_master_value("Item", rm.rm_item_code, "has_batch_no") and not rm.batch_no:
 					rm.batch_no = item.batch_no
 
 			# get raw materials rate
@@ -717,7 +718,7 @@ class BuyingController(StockController):
 		if not row.asset_location:
 			frappe.throw(_("Row {0}: Enter location for the asset item {1}").format(row.idx, row.item_code))
 
-		item_data = frappe.db.get_value('Item',
+		item_data = get_master_value('Item',
 			row.item_code, ['asset_naming_series', 'asset_category'], as_dict=1)
 
 		purchase_amount = flt(row.base_rate + row.item_tax_amount)
@@ -748,7 +749,7 @@ class BuyingController(StockController):
 	def update_fixed_asset(self, field, delete_asset = False):
 		for d in self.get("items"):
 			if d.is_fixed_asset:
-				is_auto_create_enabled = frappe.db.get_value('Item', d.item_code, 'auto_create_assets')
+				is_auto_create_enabled = get_master_value('Item', d.item_code, 'auto_create_assets')
 				assets = frappe.db.get_all('Asset', filters={ field : self.name, 'item_code' : d.item_code })
 
 				for asset in assets:
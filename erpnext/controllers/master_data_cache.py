@@ -0,0 +1,138 @@
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and Contributors
+# License: GNU General Public License v3. See license.txt
+
+from __future__ import unicode_literals
+
+import frappe
+from frappe.utils import flt
+from six import string_types
+
+# masters read by the transaction controllers many times while a document is validated and submitted
+memoized_doctypes = ("Item", "Account", "Warehouse", "Company", "UOM")
+
+def get_master_value(doctype, name, fieldname, as_dict=False):
+	"""`frappe.get_cached_value` of a master record by name, read once per request.
+
+	Fields are fetched from the document cache the first time they are asked for a record
+	and kept in `frappe.local`, released with it at the end of the request or job, until the
+	record is written (see `clear_master_value`). Writes made with `frappe.db.set_value` skip
+	the doc events, so code doing those in the middle of a request must call
+	`clear_master_value` itself."""
+	if doctype not in memoized_doctypes:
+		return frappe.db.get_value(doctype, name, fieldname, as_dict=as_dict)
+
+	fieldnames = [fieldname] if isinstance(fieldname, string_types) else list(fieldname)
+
+	cache = get_master_data_cache()
+	stats = cache["stats"]
+	stats.lookups += 1
+
+	key = (doctype, name)
+	row = cache["rows"].get(key)
+	missing = [d for d in fieldnames if row is None or d not in row] if row is not False else []
+
+	if missing:
+		stats.queries += 1
+		if any((doctype, name, d) in cache["queried"] for d in missing):
+			stats.repeated_queries += 1
+
+		values = get_cached_values(doctype, name, missing)
+		if values is None:
+			cache["rows"][key] = row = False
+		else:
+			row = cache["rows"].setdefault(key, frappe._dict())
+			row.update(values)
+
+		cache["queried"].update((doctype, name, d) for d in missing)
+	else:
+		stats.hits += 1
+
+	if not row:
+		return None
+
+	if as_dict:
+		return frappe._dict({d: row.get(d) for d in fieldnames})
+
+	if isinstance(fieldname, string_types):
+		return row.get(fieldname)
+
+	return tuple(row.get(d) for d in fieldnames)
+
+def get_cached_values(doctype, name, fieldnames):
+	"""Fields of a record from the document cache shared by all the requests, None if the
+	record does not exist"""
+	if not name:
+		return None
+
+	try:
+		return frappe.get_cached_value(doctype, name, fieldnames, as_dict=True)
+	except frappe.DoesNotExistError:
+		frappe.clear_last_message()
+		return None
+
+def get_master_data_cache():
+	if not getattr(frappe.local, "master_data_cache", None):
+		frappe.local.master_data_cache = {
+			"rows": {},
+			"queried": set(),
+			"stats": frappe._dict(lookups=0, hits=0, queries=0, repeated_queries=0)
+		}
+
+	return frappe.local.master_data_cache
+
+def reset_master_data_cache():
+	"""Forget all the values read so far"""
+	frappe.local.master_data_cache = None
+
+def clear_master_value(doctype, name=None):
+	"""Forget the values read for a record (or all records of `doctype`) after it was written"""
+	cache = getattr(frappe.local, "master_data_cache", None)
+	if not cache:
+		return
+
+	for key in list(cache["rows"]):
+		if key[0] == doctype and (name is None or key[1] == name):
+			del cache["rows"][key]
+
+def clear_master_data_cache(doc, method=None, *args):
+	"""`doc_events` handler for writes and renames of `memoized_doctypes`"""
+	clear_master_value(doc.doctype, doc.name)
+
+	if method == "after_rename":
+		clear_master_value(doc.doctype)
+
+def get_master_data_cache_stats():
+	"""Lookups, hits and queries of the current request so far"""
+	return frappe._dict(get_master_data_cache()["stats"])
+
+def start_master_data_cache_stats(doc):
+	"""Remember the stats when `doc` starts validating, to log what its submit used"""
+	if frappe.conf.get("log_master_data_cache_stats"):
+		doc.flags.master_data_cache_stats = get_master_data_cache_stats()
+
+def log_master_data_cache_stats(doc):
+	"""Log how many master lookups made since `doc` started validating were served from
+	the cache, if the site config has `log_master_data_cache_stats` set. Called by the
+	controller once `doc` is submitted."""
+	since = doc.flags.master_data_cache_stats
+	if not since:
+		return
+
+	stats = get_master_data_cache_stats()
+	for field in stats:
+		stats[field] -= since.get(field, 0)
+
+	stats.hit_rate = flt(stats.hits * 100.0 / stats.lookups, 2) if stats.lookups else 0.0
+
+	frappe.logger("master_data_cache").info({
+		"doctype": doc.doctype,
+		"name": doc.name,
+		"lookups": stats.lookups,
+		"hits": stats.hits,
+		"hit_rate": stats.hit_rate,
+		"queries": stats.queries,
+		"repeated_queries": stats.repeated_queries
+	})
+
+	doc.flags.master_data_cache_stats = None
+	return stats
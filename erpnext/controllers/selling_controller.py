@@ -12,6 +12,7 @@ from erpnext.stock.doctype.item.item import set_item_default
 from frappe.contacts.doctype.address.address import get_address_display
 
 from erpnext.controllers.stock_controller import StockController
+from erpnext.controllers.master_data_cache import get_master_value
 
 class SellingController(StockController):
 	def __setup__(self):
@@ -149,10 +150,17 @@ class SellingController(StockController):
 		if sales_team and total != 100.0:
 			throw(_("Total allocated percentage for sales team should be 100"))
 
+	def update_credit_exposure(self):
+		'''Apply the change in the unbilled amount of this order or delivery note
+			to the credit exposure of the customer'''
+		from erpnext.selling.doctype.customer_credit_exposure.customer_credit_exposure import update_voucher_exposure
+
+		update_voucher_exposure(self.doctype, self.name)
+
 	def validate_max_discount(self):
 		for d in self.get("items"):
 			if d.item_code:
-				discount = flt(frappe.get_cached_value("Item", d.item_code, "max_discount"))
+				discount = flt(get_master_value("Item", d.item_code, "max_discount"))
 
 				if discount and flt(d.discount_percentage) > discount:
 					frappe.throw(_("Maximum discount for Item {0} is {1}%").format(d.item_code, discount))
@@ -179,7 +187,7 @@ class SellingController(StockController):
 			if not it.item_code:
 				continue
 
-			last_purchase_rate, is_stock_item = frappe.get_cached_value("Item", it.item_code, ["last_purchase_rate", "is_stock_item"])
+			last_purchase_rate, is_stock_item = get_master_value("Item", it.item_code, ["last_purchase_rate", "is_stock_item"])
 			last_purchase_rate_in_sales_uom = last_purchase_rate / (it.conversion_factor or 1)
 			if flt(it.base_rate) < flt(last_purchase_rate_in_sales_uom):
 				throw_message(it.idx, frappe.bold(it.item_name), last_purchase_rate_in_sales_uom, "last purchase rate")
@@ -297,7 +305,7 @@ class SellingController(StockController):
 
 		sl_entries = []
 		for d in self.get_item_list():
-			if frappe.get_cached_value("Item", d.item_code, "is_stock_item") == 1 and flt(d.qty):
+			if get_master_value("Item", d.item_code, "is_stock_item") == 1 and flt(d.qty):
 				if flt(d.conversion_factor)==0.0:
 					d.conversion_factor = get_conversion_factor(d.item_code, d.uom).get("conversion_factor") or 1.0
 				return_rate = 0
@@ -393,7 +401,7 @@ class SellingController(StockController):
 				e = [d.item_code, d.description, d.warehouse, '']
 				f = [d.item_code, d.description]
 
-			if frappe.db.get_value("Item", d.item_code, "is_stock_item") == 1:
+			if get_master_value("Item", d.item_code, "is_stock_item") == 1:
 				if e in check_list:
 					frappe.throw(_("Note: Item {0} entered multiple times").format(d.item_code))
 				else:
@@ -133,6 +133,9 @@ class StatusUpdater(Document):
 			if update:
 				self.db_set('status', self.status, update_modified = update_modified)
 
+				if self.doctype in ("Sales Order", "Delivery Note"):
+					self.update_credit_exposure()
+
 	def validate_qty(self):
 		"""Validates qty at row level"""
 		self.item_allowance = {}
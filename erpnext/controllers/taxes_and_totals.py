@@ -9,6 +9,7 @@ from frappe.utils import cint, flt, round_based_on_smallest_currency_fraction
 from erpnext.controllers.accounts_controller import validate_conversion_rate, \
 	validate_taxes_and_charges, validate_inclusive_tax
 from erpnext.stock.get_item_details import _get_item_tax_template
+from erpnext.controllers.master_data_cache import get_master_value
 
 class calculate_taxes_and_totals(object):
 	def __init__(self, doc):
@@ -79,7 +80,7 @@ class calculate_taxes_and_totals(object):
 
 	def validate_conversion_rate(self):
 		# validate conversion rate
-		company_currency = erpnext.get_company_currency(self.doc.company)
+		company_currency = get_master_value("Company", self.doc.company, "default_currency")
 		if not self.doc.currency or self.doc.currency == company_currency:
 			self.doc.currency = company_currency
 			self.doc.conversion_rate = 1.0
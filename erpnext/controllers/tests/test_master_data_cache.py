@@ -0,0 +1,50 @@
+from __future__ import unicode_literals
+import unittest
+
+import frappe
+from erpnext.controllers.master_data_cache import (get_master_value, clear_master_value,
+	get_master_data_cache_stats, reset_master_data_cache)
+
+test_dependencies = ["Item"]
+
+class TestMasterDataCache(unittest.TestCase):
+	def setUp(self):
+		frappe.local.master_data_cache = None
+
+	def test_values_read_once(self):
+		self.assertEqual(get_master_value("Item", "_Test Item", "stock_uom"),
+			frappe.db.get_value("Item", "_Test Item", "stock_uom"))
+		self.assertEqual(get_master_value("Item", "_Test Item", ["stock_uom", "is_stock_item"]),
+			frappe.db.get_value("Item", "_Test Item", ["stock_uom", "is_stock_item"]))
+		self.assertEqual(get_master_value("Item", "_Test Item", ["stock_uom"], as_dict=1),
+			{"stock_uom": frappe.db.get_value("Item", "_Test Item", "stock_uom")})
+		self.assertEqual(get_master_value("Item", "_Test Item Does Not Exist", "stock_uom"), None)
+		self.assertEqual(get_master_value("Item", "_Test Item Does Not Exist", "stock_uom"), None)
+
+		stats = get_master_data_cache_stats()
+		self.assertEqual((stats.lookups, stats.hits, stats.queries, stats.repeated_queries), (5, 2, 3, 0))
+
+	def test_cleared_on_write(self):
+		item = frappe.get_doc("Item", "_Test Item")
+		max_discount = item.max_discount
+		self.assertEqual(get_master_value("Item", item.name, "max_discount"), max_discount)
+
+		item.max_discount = (max_discount or 0) + 5
+		item.save()
+		self.assertEqual(get_master_value("Item", item.name, "max_discount"), item.max_discount)
+
+		frappe.db.set_value("Item", item.name, "max_discount", max_discount)
+		clear_master_value("Item", item.name)
+		self.assertEqual(get_master_value("Item", item.name, "max_discount"), max_discount)
+		self.assertEqual(get_master_data_cache_stats().repeated_queries, 2)
+
+	def test_reset_between_requests(self):
+		max_discount = frappe.db.get_value("Item", "_Test Item", "max_discount")
+		self.assertEqual(get_master_value("Item", "_Test Item", "max_discount"), max_discount)
+
+		# written by another request
+		frappe.db.set_value("Item", "_Test Item", "max_discount", (max_discount or 0) + 5)
+		reset_master_data_cache()
+		self.assertEqual(get_master_value("Item", "_Test Item", "max_discount"), (max_discount or 0) + 5)
+
+		frappe.db.set_value("Item", "_Test Item", "max_discount", max_discount)
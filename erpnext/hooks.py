@@ -217,6 +217,23 @@ standard_queries = {
 }
 
 doc_events = {
+	"BOM": {
+		"on_submit": "erpnext.manufacturing.doctype.bom.bom_graph.clear_bom_graph",
+		"on_cancel": "erpnext.manufacturing.doctype.bom.bom_graph.clear_bom_graph",
+		"on_update_after_submit": "erpnext.manufacturing.doctype.bom.bom_graph.clear_bom_graph",
+		"on_trash": "erpnext.manufacturing.doctype.bom.bom_graph.clear_bom_graph"
+	},
+	("Item", "Account", "Warehouse", "Company", "UOM"): {
+		"on_update": "erpnext.controllers.master_data_cache.clear_master_data_cache",
+		"on_trash": "erpnext.controllers.master_data_cache.clear_master_data_cache",
+		"after_rename": "erpnext.controllers.master_data_cache.clear_master_data_cache"
+	},
+	("Account", "Cost Center", "Customer", "Supplier"): {
+		"before_rename": "erpnext.accounts.doctype.account_balance.account_balance.merge_account_balances"
+	},
+	"Customer": {
+		"before_rename": "erpnext.selling.doctype.customer_credit_exposure.customer_credit_exposure.merge_credit_exposures"
+	},
 	"Stock Entry": {
 		"on_submit": "erpnext.stock.doctype.material_request.material_request.update_completed_and_requested_qty",
 		"on_cancel": "erpnext.stock.doctype.material_request.material_request.update_completed_and_requested_qty"
@@ -285,7 +302,8 @@ scheduler_events = {
 	"all": [
 		"erpnext.projects.doctype.project.project.project_status_update_reminder",
 		"erpnext.healthcare.doctype.patient_appointment.patient_appointment.send_appointment_reminder",
-		"erpnext.crm.doctype.social_media_post.social_media_post.process_scheduled_social_media_posts"
+		"erpnext.crm.doctype.social_media_post.social_media_post.process_scheduled_social_media_posts",
+		"erpnext.stock.doctype.repost_item_valuation.repost_item_valuation.enqueue_reposting"
 	],
 	"hourly": [
 		'erpnext.hr.doctype.daily_work_summary_group.daily_work_summary_group.trigger_emails',
@@ -297,6 +315,7 @@ scheduler_events = {
 		"erpnext.projects.doctype.project.project.collect_project_status",
 		"erpnext.hr.doctype.shift_type.shift_type.process_auto_attendance_for_all_shifts",
 		"erpnext.support.doctype.issue.issue.set_service_level_agreement_variance",
+		"erpnext.accounts.doctype.sales_invoice.pos.update_pos_catalogs",
 	],
 	"daily": [
 		"erpnext.stock.reorder_item.reorder_item",
@@ -309,6 +328,8 @@ scheduler_events = {
 		"erpnext.assets.doctype.asset.depreciation.post_depreciation_entries",
 		"erpnext.hr.doctype.daily_work_summary_group.daily_work_summary_group.send_summary",
 		"erpnext.stock.doctype.serial_no.serial_no.update_maintenance_status",
+		"erpnext.stock.doctype.bin_reservation.bin_reservation.verify_bin_reservations",
+		"erpnext.selling.doctype.customer_credit_exposure.customer_credit_exposure.verify_credit_exposure",
 		"erpnext.buying.doctype.supplier_scorecard.supplier_scorecard.refresh_scorecards",
 		"erpnext.setup.doctype.company.company.cache_companies_monthly_sales_history",
 		"erpnext.assets.doctype.asset.asset.update_maintenance_status",
@@ -327,6 +348,7 @@ scheduler_events = {
 	"daily_long": [
 		"erpnext.setup.doctype.email_digest.email_digest.send",
 		"erpnext.manufacturing.doctype.bom_update_tool.bom_update_tool.update_latest_price_in_all_boms",
+		"erpnext.stock.doctype.stock_ledger_snapshot.stock_ledger_snapshot.make_snapshots",
 		"erpnext.hr.doctype.leave_ledger_entry.leave_ledger_entry.process_expired_allocation",
 		"erpnext.hr.utils.generate_leave_encashment",
 		"erpnext.loan_management.doctype.loan_security_shortfall.loan_security_shortfall.create_process_loan_security_shortfall",
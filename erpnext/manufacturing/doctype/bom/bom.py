@@ -12,6 +12,8 @@ from erpnext.stock.get_item_details import get_price_list_rate
 from frappe.core.doctype.version.version import get_diff
 from erpnext.controllers.queries import get_match_cond
 from erpnext.stock.doctype.item.item import get_item_details
+from erpnext.manufacturing.doctype.bom.bom_graph import (get_bom_graph, clear_bom_graph, is_recursive_bom,
+	get_bom_descendants)
 from frappe.model.mapper import get_mapped_doc
 
 import functools
@@ -80,7 +82,7 @@ class BOM(WebsiteGenerator):
 		context.parents = [{'name': 'boms', 'title': _('All BOMs') }]
 
 	def on_update(self):
-		frappe.cache().hdel('bom_children', self.name)
+		clear_bom_graph()
 		self.check_recursion()
 		self.update_stock_qty()
 		self.update_exploded_items()
@@ -353,56 +355,25 @@ class BOM(WebsiteGenerator):
 				frappe.throw(_("Quantity required for Item {0} in row {1}").format(m.item_code, m.idx))
 			check_list.append(m)
 
-	def check_recursion(self, bom_list=[]):
+	def check_recursion(self, bom_list=None):
 		""" Check whether recursion occurs in any bom"""
-		bom_list = self.traverse_tree()
-		bom_nos = frappe.get_all('BOM Item', fields=["bom_no"],
-			filters={'parent': ('in', bom_list), 'parenttype': 'BOM'})
-
-		raise_exception = False
-		if bom_nos and self.name in [d.bom_no for d in bom_nos]:
-			raise_exception = True
-
-		if not raise_exception:
-			bom_nos = frappe.get_all('BOM Item', fields=["parent"],
-				filters={'bom_no': self.name, 'parenttype': 'BOM'})
-
-			if self.name in [d.parent for d in bom_nos]:
-				raise_exception = True
-
-		if raise_exception:
+		if is_recursive_bom(self.name):
 			frappe.throw(_("BOM recursion: {0} cannot be parent or child of {1}").format(self.name, self.name))
 
-	def update_cost_and_exploded_items(self, bom_list=[]):
+	def update_cost_and_exploded_items(self, bom_list=None):
+		"""Explode this BOM and the BOMs below it again, sub-assemblies first"""
+		graph = get_bom_graph()
 		bom_list = self.traverse_tree(bom_list)
-		for bom in bom_list:
+		for bom in graph.get_bottom_up_order(bom_list, get_next=lambda d: []):
 			bom_obj = frappe.get_doc("BOM", bom)
-			bom_obj.check_recursion(bom_list=bom_list)
+			bom_obj.check_recursion()
 			bom_obj.update_exploded_items()
 
 		return bom_list
 
 	def traverse_tree(self, bom_list=None):
-		def _get_children(bom_no):
-			children = frappe.cache().hget('bom_children', bom_no)
-			if children is None:
-				children = frappe.db.sql_list("""SELECT `bom_no` FROM `tabBOM Item`
-					WHERE `parent`=%s AND `bom_no`!='' AND `parenttype`='BOM'""", bom_no)
-				frappe.cache().hset('bom_children', bom_no, children)
-			return children
-
-		count = 0
-		if not bom_list:
-			bom_list = []
-
-		if self.name not in bom_list:
-			bom_list.append(self.name)
-
-		while(count < len(bom_list)):
-			for child_bom in _get_children(bom_list[count]):
-				if child_bom not in bom_list:
-					bom_list.append(child_bom)
-			count += 1
+		"""`bom_list` with this BOM and all the BOMs below it, deepest first"""
+		bom_list = get_bom_descendants(self.name, bom_list)
 		bom_list.reverse()
 		return bom_list
 
@@ -481,6 +452,10 @@ class BOM(WebsiteGenerator):
 	def get_exploded_items(self):
 		""" Get all raw materials including items from child bom"""
 		self.cur_exploded_items = {}
+
+		# exploded items of all the sub-assemblies in one query
+		get_bom_graph().load_explosions([d.bom_no for d in self.get('items')])
+
 		for d in self.get('items'):
 			if d.bom_no:
 				self.get_child_exploded_items(d.bom_no, d.stock_qty)
@@ -509,27 +484,7 @@ class BOM(WebsiteGenerator):
 
 	def get_child_exploded_items(self, bom_no, stock_qty):
 		""" Add all items from Flat BOM of child BOM"""
-		# Did not use qty_consumed_per_unit in the query, as it leads to rounding loss
-		child_fb_items = frappe.db.sql("""
-			SELECT
-				bom_item.item_code,
-				bom_item.item_name,
-				bom_item.description,
-				bom_item.source_warehouse,
-				bom_item.operation,
-				bom_item.stock_uom,
-				bom_item.stock_qty,
-				bom_item.rate,
-				bom_item.include_item_in_manufacturing,
-				bom_item.stock_qty / ifnull(bom.quantity, 1) AS qty_consumed_per_unit
-			FROM `tabBOM Explosion Item` bom_item, tabBOM bom
-			WHERE
-				bom_item.parent = bom.name
-				AND bom.name = %s
-				AND bom.docstatus = 1
-		""", bom_no, as_dict = 1)
-
-		for d in child_fb_items:
+		for d in get_bom_graph().get_exploded_items(bom_no):
 			self.add_to_cur_exploded_items(frappe._dict({
 				'item_code'				: d['item_code'],
 				'item_name'				: d['item_name'],
@@ -556,6 +511,9 @@ class BOM(WebsiteGenerator):
 			ch.docstatus = self.docstatus
 			ch.db_insert()
 
+		get_bom_graph().set_exploded_items(self.name, self.docstatus, self.quantity,
+			self.get('exploded_items'))
+
 	def validate_bom_links(self):
 		if not self.is_active:
 			act_pbom = frappe.db.sql("""select distinct bom_item.parent from `tabBOM Item` bom_item
@@ -778,31 +736,10 @@ def get_children(doctype, parent=None, is_root=False, **filters):
 		return bom_items
 
 def get_boms_in_bottom_up_order(bom_no=None):
-	def _get_parent(bom_no):
-		return frappe.db.sql_list("""
-			select distinct bom_item.parent from `tabBOM Item` bom_item
-			where bom_item.bom_no = %s and bom_item.docstatus=1 and bom_item.parenttype='BOM'
-				and exists(select bom.name from `tabBOM` bom where bom.name=bom_item.parent and bom.is_active=1)
-		""", bom_no)
-
-	count = 0
-	bom_list = []
-	if bom_no:
-		bom_list.append(bom_no)
-	else:
-		# get all leaf BOMs
-		bom_list = frappe.db.sql_list("""select name from `tabBOM` bom
-			where docstatus=1 and is_active=1
-				and not exists(select bom_no from `tabBOM Item`
-					where parent=bom.name and ifnull(bom_no, '')!='')""")
-
-	while(count < len(bom_list)):
-		for child_bom in _get_parent(bom_list[count]):
-			if child_bom not in bom_list:
-				bom_list.append(child_bom)
-		count += 1
-
-	return bom_list
+	"""`bom_no` (or all leaf BOMs) and the active BOMs using them at any level,
+	each BOM after all of its sub-assemblies"""
+	graph = get_bom_graph()
+	return graph.get_bottom_up_order([bom_no] if bom_no else graph.get_leaf_boms())
 
 def add_additional_cost(stock_entry, work_order):
 	# Add non stock items cost in the additional cost
@@ -0,0 +1,246 @@
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and Contributors
+# License: GNU General Public License v3. See license.txt
+
+from __future__ import unicode_literals
+
+from collections import deque
+
+import frappe
+from frappe.utils import flt
+
+class BOMGraph(object):
+	"""BOMs linked by the sub-assembly BOMs (`bom_no`) of their items, loaded in one pass.
+
+	Replaces the per BOM queries of tree traversals with lookups in memory, orders BOMs so
+	that sub-assemblies come before the BOMs using them and keeps the per unit explosion
+	(`BOM Explosion Item`) of each sub-assembly once it has been read or computed.
+
+	The links are only read when first asked for, a single BOM being saved only needs the
+	explosions of its sub-assemblies."""
+	def __init__(self):
+		self.boms = {}
+		self.children = {}
+		self.parents = {}
+		self.explosions = {}
+		self.links_loaded = False
+
+	def load(self):
+		if self.links_loaded:
+			return
+
+		self.links_loaded = True
+		for d in frappe.db.sql("""select name, item, docstatus, is_active, is_default, quantity
+			from `tabBOM`""", as_dict=1):
+				self.boms[d.name] = d
+
+		for parent, bom_no, docstatus in frappe.db.sql("""select parent, bom_no, docstatus
+			from `tabBOM Item`
+			where parenttype='BOM' and ifnull(bom_no, '') != ''
+			order by parent, idx"""):
+				self.children.setdefault(parent, []).append((bom_no, docstatus))
+				self.parents.setdefault(bom_no, []).append((parent, docstatus))
+
+	def get_children(self, bom_no, submitted=False):
+		"""Distinct sub-assembly BOMs of `bom_no`, from submitted rows only if `submitted`"""
+		self.load()
+		return unique(child for child, docstatus in self.children.get(bom_no, [])
+			if not submitted or docstatus == 1)
+
+	def get_parents(self, bom_no, submitted=False, active=False, cancelled=True):
+		"""Distinct BOMs using `bom_no`, from submitted rows, active BOMs or rows not cancelled
+		only if asked"""
+		self.load()
+		return unique(parent for parent, docstatus in self.parents.get(bom_no, [])
+			if (not submitted or docstatus == 1)
+				and (cancelled or docstatus < 2)
+				and (not active or (self.boms.get(parent) or {}).get("is_active")))
+
+	def get_descendants(self, bom_no, bom_list=None):
+		"""`bom_list` (if given) followed by `bom_no` and the BOMs below it, breadth first"""
+		return self.walk([bom_no], self.get_children, bom_list)
+
+	def get_ancestors(self, bom_no, **filters):
+		"""BOMs using `bom_no` directly or through other BOMs, breadth first"""
+		return self.walk([bom_no], lambda d: self.get_parents(d, **filters))[1:]
+
+	def walk(self, start, get_next, bom_list=None):
+		bom_list = list(bom_list or [])
+		seen = set(bom_list)
+		for bom_no in start:
+			if bom_no not in seen:
+				seen.add(bom_no)
+				bom_list.append(bom_no)
+
+		count = 0
+		while count < len(bom_list):
+			for next_bom in get_next(bom_list[count]):
+				if next_bom not in seen:
+					seen.add(next_bom)
+					bom_list.append(next_bom)
+			count += 1
+
+		return bom_list
+
+	def is_recursive(self, bom_no):
+		"""True if `bom_no` is one of its own sub-assemblies, at any level"""
+		return bom_no in self.walk(self.get_children(bom_no), self.get_children)
+
+	def get_bottom_up_order(self, bom_nos, get_next=None):
+		"""`bom_nos` and the BOMs reached from them with `get_next` (the parents of submitted rows
+		in active BOMs by default), each BOM after all of its sub-assemblies among them.
+
+		BOMs in a recursion (which validation does not let in) come last, in the order reached."""
+		if not get_next:
+			get_next = lambda d: self.get_parents(d, submitted=True, active=True)
+
+		bom_list = self.walk(bom_nos, get_next)
+		members = set(bom_list)
+
+		pending = {d: len([child for child in self.get_children(d) if child in members and child != d])
+			for d in bom_list}
+		queue = deque(d for d in bom_list if not pending[d])
+
+		ordered = []
+		while queue:
+			bom_no = queue.popleft()
+			ordered.append(bom_no)
+			for parent in self.get_parents(bom_no):
+				if parent in pending and parent != bom_no:
+					pending[parent] -= 1
+					if not pending[parent]:
+						queue.append(parent)
+
+		if len(ordered) < len(bom_list):
+			ordered.extend(d for d in bom_list if pending[d])
+
+		return ordered
+
+	def get_leaf_boms(self):
+		"""Submitted and active BOMs without sub-assembly BOMs"""
+		self.load()
+		return [d.name for d in self.boms.values()
+			if d.docstatus == 1 and d.is_active and not self.children.get(d.name)]
+
+	def load_explosions(self, bom_nos):
+		"""Read the exploded items of the submitted BOMs in `bom_nos` not read yet, in one query"""
+		bom_nos = [d for d in set(bom_nos) if d and d not in self.explosions]
+		if not bom_nos:
+			return
+
+		for bom_no in bom_nos:
+			self.explosions[bom_no] = []
+
+		# Did not use qty_consumed_per_unit in the query, as it leads to rounding loss
+		for d in frappe.db.sql("""
+			SELECT
+				bom_item.parent,
+				bom_item.item_code,
+				bom_item.item_name,
+				bom_item.description,
+				bom_item.source_warehouse,
+				bom_item.operation,
+				bom_item.stock_uom,
+				bom_item.stock_qty,
+				bom_item.rate,
+				bom_item.include_item_in_manufacturing,
+				bom_item.stock_qty / ifnull(bom.quantity, 1) AS qty_consumed_per_unit
+			FROM `tabBOM Explosion Item` bom_item, tabBOM bom
+			WHERE
+				bom_item.parent = bom.name
+				AND bom.name in %s
+				AND bom.docstatus = 1
+			ORDER BY bom_item.parent, bom_item.idx
+		""", [tuple(bom_nos)], as_dict=1):
+			self.explosions[d.pop("parent")].append(d)
+
+	def get_exploded_items(self, bom_no):
+		"""Exploded items of a submitted BOM with their qty per unit of the BOM"""
+		self.load_explosions([bom_no])
+		return self.explosions[bom_no]
+
+	def set_exploded_items(self, bom_no, docstatus, quantity, exploded_items):
+		"""Keep the exploded items just written for a BOM, instead of reading them again"""
+		self.explosions[bom_no] = [frappe._dict({
+			"item_code": d.item_code,
+			"item_name": d.item_name,
+			"description": d.description,
+			"source_warehouse": d.source_warehouse,
+			"operation": d.operation,
+			"stock_uom": d.stock_uom,
+			"stock_qty": d.stock_qty,
+			"rate": d.rate,
+			"include_item_in_manufacturing": d.include_item_in_manufacturing,
+			"qty_consumed_per_unit": flt(d.stock_qty) / flt(quantity or 1)
+		}) for d in exploded_items] if docstatus == 1 else []
+
+def unique(values):
+	seen, out = set(), []
+	for d in values:
+		if d not in seen:
+			seen.add(d)
+			out.append(d)
+
+	return out
+
+def is_recursive_bom(bom_no):
+	"""True if `bom_no` is one of its own sub-assemblies. Uses the links of the graph if they
+	were read in this request, otherwise reads only the BOMs below `bom_no`, a level at a time"""
+	graph = getattr(frappe.local, "bom_graph", None)
+	if graph and graph.links_loaded:
+		return graph.is_recursive(bom_no)
+
+	seen, level = set(), [bom_no]
+	while level:
+		children = unique(child for rows in read_children(level).values() for child in rows)
+		if bom_no in children:
+			return True
+
+		level = [d for d in children if d not in seen]
+		seen.update(level)
+
+	return False
+
+def get_bom_descendants(bom_no, bom_list=None):
+	"""`BOMGraph.get_descendants` from the graph if its links were read in this request,
+	otherwise reading only the BOMs below `bom_no`, a level at a time"""
+	graph = getattr(frappe.local, "bom_graph", None)
+	if graph and graph.links_loaded:
+		return graph.get_descendants(bom_no, bom_list)
+
+	bom_list = unique(list(bom_list or []) + [bom_no])
+	seen, level = set(bom_list), bom_list
+	while level:
+		children = read_children(level)
+
+		next_level = []
+		for parent in level:
+			for child in children.get(parent, []):
+				if child not in seen:
+					seen.add(child)
+					next_level.append(child)
+
+		bom_list.extend(next_level)
+		level = next_level
+
+	return bom_list
+
+def read_children(boms):
+	"""Sub-assembly BOMs of each of `boms`, in the order of their items"""
+	children = {}
+	for parent, bom_no in frappe.db.sql("""select parent, bom_no from `tabBOM Item`
+		where parenttype='BOM' and parent in %s and ifnull(bom_no, '') != ''
+		order by parent, idx""", [tuple(boms)]):
+			children.setdefault(parent, []).append(bom_no)
+
+	return children
+
+def get_bom_graph():
+	"""Graph of the current request, loaded on first use"""
+	if not getattr(frappe.local, "bom_graph", None):
+		frappe.local.bom_graph = BOMGraph()
+
+	return frappe.local.bom_graph
+
+def clear_bom_graph(doc=None, method=None):
+	"""Load the graph again on next use, after BOMs or their items were changed"""
+	frappe.local.bom_graph = None
@@ -75,6 +75,34 @@ class TestBOM(unittest.TestCase):
 			where item_code='_Test Item 2' and docstatus=1 and parenttype='BOM'""", as_dict=1):
 				self.assertEqual(d.rate, rm_rate + 10)
 
+	def test_bottom_up_order(self):
+		from erpnext.manufacturing.doctype.bom.bom import get_boms_in_bottom_up_order
+
+		bom_list = get_boms_in_bottom_up_order()
+		self.assertEqual(len(bom_list), len(set(bom_list)))
+
+		position = {bom: i for i, bom in enumerate(bom_list)}
+		for parent, bom_no in frappe.db.sql("""select parent, bom_no from `tabBOM Item`
+			where parenttype='BOM' and docstatus=1 and ifnull(bom_no, '') != ''"""):
+				if parent in position:
+					self.assertTrue(position[bom_no] < position[parent])
+
+	def test_recursion_in_graph(self):
+		from erpnext.manufacturing.doctype.bom.bom_graph import BOMGraph
+
+		graph = BOMGraph()
+		graph.children.update({"_Test BOM A": [("_Test BOM B", 1)], "_Test BOM B": [("_Test BOM C", 1)]})
+		graph.parents.update({"_Test BOM B": [("_Test BOM A", 1)], "_Test BOM C": [("_Test BOM B", 1)]})
+		self.assertFalse(graph.is_recursive("_Test BOM A"))
+		self.assertEqual(graph.get_descendants("_Test BOM A"), ["_Test BOM A", "_Test BOM B", "_Test BOM C"])
+		self.assertEqual(graph.get_bottom_up_order(["_Test BOM C"], graph.get_parents),
+			["_Test BOM C", "_Test BOM B", "_Test BOM A"])
+
+		graph.children["_Test BOM C"] = [("_Test BOM A", 1)]
+		graph.parents["_Test BOM A"] = [("_Test BOM C", 1)]
+		self.assertTrue(graph.is_recursive("_Test BOM A"))
+		self.assertTrue(graph.is_recursive("_Test BOM C"))
+
 	def test_bom_cost(self):
 		bom = frappe.copy_doc(test_records[2])
 		bom.insert()
@@ -0,0 +1,265 @@
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and Contributors
+# License: GNU General Public License v3. See license.txt
+
+from __future__ import unicode_literals
+
+from operator import itemgetter
+
+import frappe
+from frappe.utils import flt, now
+
+from erpnext.manufacturing.doctype.bom.bom import get_boms_in_bottom_up_order, get_bom_item_rate
+from erpnext.manufacturing.doctype.bom.bom_graph import get_bom_graph
+from erpnext.utilities.bulk_update import update_in_bulk
+from erpnext.stock.item_details_prefetch import ItemDetailsPrefetch
+
+item_cost_fields = ("rate", "amount", "base_rate", "base_amount")
+
+bom_cost_fields = ("rm_cost_as_per", "operating_cost", "base_operating_cost", "raw_material_cost",
+	"base_raw_material_cost", "scrap_material_cost", "base_scrap_material_cost", "total_cost", "base_total_cost")
+
+exploded_item_fields = ("item_code", "item_name", "source_warehouse", "operation", "description", "image",
+	"stock_uom", "stock_qty", "rate", "include_item_in_manufacturing", "amount", "qty_consumed_per_unit")
+
+class BOMCostRollup(object):
+	"""Costs of BOMs updated with the latest raw material rates, like `BOM.update_cost`,
+	sub-assemblies first.
+
+	Rates of all the raw materials are read once for all the BOMs, and only the BOMs whose
+	costs or exploded items changed are written, in bulk."""
+	def __init__(self, bom_list):
+		self.bom_list = bom_list
+		self.graph = get_bom_graph()
+		self.changed_boms = []
+
+		self.items = {}
+		self.bin_valuation_rates = {}
+		self.sle_valuation_rates = {}
+		self.valuation_rates = {}
+		self.unit_costs = {}
+
+		self.item_updates = []
+		self.bom_updates = []
+		self.exploded_items = {}
+
+	def run(self):
+		self.load_items()
+		self.load_unit_costs()
+
+		previous = frappe.flags.item_details_prefetch
+		frappe.flags.item_details_prefetch = self.get_price_list_prefetch()
+		try:
+			for i, bom in enumerate(self.bom_list, 1):
+				doc = frappe.get_doc("BOM", bom)
+				if doc.docstatus != 2:
+					self.update_cost(doc)
+
+				if not i % 500:
+					self.write()
+		finally:
+			frappe.flags.item_details_prefetch = previous
+
+		self.write()
+		return self.changed_boms
+
+	def get_bom_rows(self, query):
+		rows = []
+		for i in range(0, len(self.bom_list), 1000):
+			rows.extend(frappe.db.sql(query, [tuple(self.bom_list[i:i + 1000])]))
+
+		return rows
+
+	def get_price_list_prefetch(self):
+		"""Price list rates of the raw materials of BOMs costed as per Price List,
+		read once for all of them through `get_item_details`"""
+		rows = self.get_bom_rows("""select bom_item.item_code, bom.buying_price_list
+			from `tabBOM Item` bom_item, `tabBOM` bom
+			where bom_item.parent = bom.name and bom_item.parenttype = 'BOM'
+				and bom.rm_cost_as_per = 'Price List' and bom.name in %s""")
+
+		if rows:
+			return ItemDetailsPrefetch(set(d[0] for d in rows), price_lists=set(d[1] for d in rows))
+
+	def load_items(self):
+		item_codes = tuple(set(d[0] for d in self.get_bom_rows("""select distinct item_code
+			from `tabBOM Item` where parenttype = 'BOM' and parent in %s""")))
+		if not item_codes:
+			return
+
+		for d in frappe.db.sql("""select name, is_customer_provided_item, last_purchase_rate, valuation_rate
+			from `tabItem` where name in %s""", [item_codes], as_dict=1):
+				self.items[d.name] = d
+
+		# weighted average of valuation rate from all warehouses, like `bom.get_valuation_rate`
+		for item_code, total_qty, total_value in frappe.db.sql("""select item_code, sum(actual_qty), sum(stock_value)
+			from `tabBin` where item_code in %s group by item_code""", [item_codes]):
+				if flt(total_qty):
+					self.bin_valuation_rates[item_code] = flt(total_value) / flt(total_qty)
+
+		# last valuation rate from the stock ledger, for items without a positive rate in their bins
+		fallback_items = tuple(d for d in item_codes if flt(self.bin_valuation_rates.get(d)) <= 0)
+		if fallback_items:
+			for item_code, valuation_rate in frappe.db.sql("""select sle.item_code, sle.valuation_rate
+				from `tabStock Ledger Entry` sle, (select item_code, max(timestamp(posting_date, posting_time)) as latest
+					from `tabStock Ledger Entry` where item_code in %s and valuation_rate > 0
+					group by item_code) last_sle
+				where sle.item_code = last_sle.item_code and sle.valuation_rate > 0
+					and timestamp(sle.posting_date, sle.posting_time) = last_sle.latest
+				order by sle.creation""", [fallback_items]):
+					self.sle_valuation_rates[item_code] = flt(valuation_rate)
+
+	def load_unit_costs(self):
+		self.unit_costs = dict(frappe.db.sql("""select name, base_total_cost/quantity from `tabBOM`
+			where is_active = 1"""))
+
+	def get_valuation_rate(self, item_code):
+		"""Valuation rate of a raw material, like `bom.get_valuation_rate`, computed once"""
+		if item_code in self.valuation_rates:
+			return self.valuation_rates[item_code]
+
+		valuation_rate = self.bin_valuation_rates.get(item_code) or 0.0
+
+		if valuation_rate <= 0:
+			valuation_rate = self.sle_valuation_rates.get(item_code) or 0
+
+		if not valuation_rate:
+			valuation_rate = (self.items.get(item_code) or {}).get("valuation_rate")
+
+		self.valuation_rates[item_code] = flt(valuation_rate)
+		return self.valuation_rates[item_code]
+
+	def get_rm_rate(self, doc, d):
+		"""Rate of a raw material as per the BOM's costing method, like `BOM.get_rm_rate`"""
+		rate = 0
+		item = self.items.get(d.item_code) or frappe._dict()
+
+		# Customer Provided parts will have zero rate
+		if not item.is_customer_provided_item:
+			if d.bom_no and doc.set_rate_of_sub_assembly_item_based_on_bom:
+				rate = flt(self.unit_costs.get(d.bom_no)) * (d.conversion_factor or 1)
+			elif doc.rm_cost_as_per == "Valuation Rate":
+				rate = self.get_valuation_rate(d.item_code) * (d.conversion_factor or 1)
+			elif doc.rm_cost_as_per == "Last Purchase Rate":
+				rate = flt(item.last_purchase_rate) * (d.conversion_factor or 1)
+			else:
+				rate = get_bom_item_rate({
+					"item_code": d.item_code,
+					"qty": d.qty,
+					"uom": d.uom,
+					"stock_uom": d.stock_uom,
+					"conversion_factor": d.conversion_factor
+				}, doc)
+
+		return flt(rate) * flt(doc.plc_conversion_rate or 1) / (doc.conversion_rate or 1)
+
+	def update_cost(self, doc):
+		if not doc.rm_cost_as_per:
+			doc.rm_cost_as_per = "Valuation Rate"
+
+		before = {field: doc.get(field) for field in bom_cost_fields}
+
+		items_changed = False
+		for d in doc.get("items"):
+			item_before = [d.get(field) for field in item_cost_fields]
+
+			rate = self.get_rm_rate(doc, d)
+			if rate:
+				d.rate = rate
+			d.amount = flt(d.rate) * flt(d.qty)
+			d.base_rate = flt(d.rate) * flt(doc.conversion_rate)
+			d.base_amount = flt(d.amount) * flt(doc.conversion_rate)
+
+			item_after = [d.get(field) for field in item_cost_fields]
+			if not values_equal(item_before, item_after):
+				self.item_updates.append([d.name] + item_after)
+				items_changed = True
+
+		if doc.docstatus == 1:
+			doc.flags.ignore_validate_update_after_submit = True
+			doc.calculate_cost()
+			self.unit_costs[doc.name] = flt(doc.base_total_cost) / flt(doc.quantity) if doc.is_active else None
+
+		after = {field: doc.get(field) for field in bom_cost_fields}
+		bom_changed = not values_equal(before.values(), after.values())
+		if bom_changed:
+			self.bom_updates.append([doc.name] + [after[field] for field in bom_cost_fields])
+
+		exploded_changed = self.update_exploded_items(doc)
+
+		if items_changed or bom_changed or exploded_changed:
+			self.changed_boms.append(doc.name)
+
+	def update_exploded_items(self, doc):
+		"""Explode the BOM with the exploded items of its sub-assemblies computed before it,
+		and keep the rows to write if they differ from the saved ones"""
+		rows = get_exploded_rows(doc)
+		self.graph.set_exploded_items(doc.name, doc.docstatus, doc.quantity, rows)
+
+		if not exploded_items_changed(doc, rows):
+			return False
+
+		self.exploded_items[doc.name] = (doc.docstatus, rows)
+		return True
+
+	def write(self):
+		"""Write the changes kept so far"""
+		update_in_bulk("BOM Item", item_cost_fields, self.item_updates)
+		update_in_bulk("BOM", bom_cost_fields, self.bom_updates)
+
+		boms = list(self.exploded_items)
+		for i in range(0, len(boms), 500):
+			frappe.db.sql("""delete from `tabBOM Explosion Item` where parent in %s""", [tuple(boms[i:i + 500])])
+
+		fields = ["name", "creation", "modified", "owner", "modified_by", "docstatus",
+			"parent", "parenttype", "parentfield", "idx"] + list(exploded_item_fields)
+
+		timestamp, values = now(), []
+		for bom in boms:
+			docstatus, rows = self.exploded_items[bom]
+			for idx, row in enumerate(rows, 1):
+				values.append([frappe.generate_hash(length=10), timestamp, timestamp, "Administrator",
+					"Administrator", docstatus, bom, "BOM", "exploded_items", idx]
+					+ [row.get(field) for field in exploded_item_fields])
+
+		for i in range(0, len(values), 1000):
+			frappe.db.bulk_insert("BOM Explosion Item", fields, values[i:i + 1000])
+
+		self.item_updates, self.bom_updates, self.exploded_items = [], [], {}
+
+def get_exploded_rows(doc):
+	"""Rows of the BOM Explosion Item table of `doc` as `BOM.add_exploded_items` would set them"""
+	doc.get_exploded_items()
+
+	rows = []
+	for item_code in sorted(doc.cur_exploded_items, key=itemgetter(0)):
+		row = frappe._dict(doc.cur_exploded_items[item_code])
+		row.amount = flt(row.stock_qty) * flt(row.rate)
+		row.qty_consumed_per_unit = flt(row.stock_qty) / flt(doc.quantity)
+		rows.append(row)
+
+	return rows
+
+def exploded_items_changed(doc, rows):
+	saved = [[d.get(field) for field in exploded_item_fields] for d in doc.get("exploded_items")]
+	computed = [[d.get(field) for field in exploded_item_fields] for d in rows]
+
+	return len(saved) != len(computed) or not all(values_equal(a, b) for a, b in zip(saved, computed))
+
+def values_equal(before, after):
+	for a, b in zip(before, after):
+		if isinstance(a, (int, float)) or isinstance(b, (int, float)):
+			if flt(a, 6) != flt(b, 6):
+				return False
+		elif (a or None) != (b or None):
+			return False
+
+	return True
+
+def update_cost_of_all_boms():
+	"""Update the cost of all the active BOMs, sub-assemblies first, and return the ones that changed"""
+	changed_boms = BOMCostRollup(get_boms_in_bottom_up_order()).run()
+
+	frappe.logger("bom_update_tool").info("BOM costs updated, {0} BOMs changed: {1}".format(
+		len(changed_boms), ", ".join(changed_boms)))
+
+	return changed_boms
@@ -3,42 +3,137 @@
 # For license information, please see license.txt
 
 from __future__ import unicode_literals
-import frappe, json
+import frappe, json, hashlib
 from frappe.utils import cstr, flt
 from frappe import _
 from six import string_types
-from erpnext.manufacturing.doctype.bom.bom import get_boms_in_bottom_up_order
+from erpnext.manufacturing.doctype.bom_update_tool.bom_cost_rollup import (update_cost_of_all_boms,
+	get_exploded_rows, exploded_items_changed, values_equal)
+from erpnext.manufacturing.doctype.bom.bom_graph import get_bom_graph, clear_bom_graph
 from frappe.model.document import Document
-import click
 
 class BOMUpdateTool(Document):
 	def replace_bom(self):
-		self.validate_bom()
+		"""Replace the current BOM by the new one in the BOMs using it and update the costs and
+		exploded items of the BOMs above them that change as a result, sub-assemblies first.
 
-		unit_cost = get_new_bom_unit_cost(self.new_bom)
-		self.update_new_bom(unit_cost)
+		Progress is committed with each BOM, so that a replace that was interrupted carries on
+		from the next BOM when it is run again. BOMs that fail are retried at the end, those
+		that still fail are kept in the progress for the next run."""
+		self.validate_bom()
 
-		frappe.cache().delete_key('bom_children')
-		bom_list = self.get_parent_boms(self.new_bom)
+		progress = get_replace_progress(self.current_bom, self.new_bom)
+		if not progress:
+			clear_bom_graph()
+			graph = get_bom_graph()
+			bom_list = self.get_parent_boms(self.current_bom)
+
+			progress = frappe._dict({
+				"unit_cost": get_new_bom_unit_cost(self.new_bom),
+				"bom_list": graph.get_bottom_up_order(bom_list, get_next=lambda d: []),
+				"affected": graph.get_parents(self.current_bom, cancelled=False),
+				"unit_costs": {},
+				"completed": 0,
+				"failed": []
+			})
+
+		self.update_new_bom(progress.unit_cost)
+		set_replace_progress(self.current_bom, self.new_bom, progress)
+		frappe.db.commit()
+
+		self.update_parent_boms(progress)
+		if progress.failed:
+			self.retry_failed_boms(progress)
+
+		if not progress.failed:
+			set_replace_progress(self.current_bom, self.new_bom, None)
+			frappe.db.commit()
+
+		clear_bom_graph()
+
+	def update_parent_boms(self, progress):
+		"""Update the BOMs in `progress.bom_list` that use the new BOM or a BOM whose cost or
+		exploded items changed, and mark their parents as affected in turn"""
+		graph = get_bom_graph()
+		affected = set(progress.affected)
+		total = len(progress.bom_list)
+
+		for count, bom in enumerate(progress.bom_list[progress.completed:], progress.completed + 1):
+			if bom in affected:
+				try:
+					if self.update_parent_bom(bom, progress.unit_costs):
+						affected.update(graph.get_parents(bom, cancelled=False))
+						progress.affected = list(affected)
+				except Exception:
+					frappe.db.rollback()
+					frappe.log_error(frappe.get_traceback(), _("BOM {0} could not be updated").format(bom))
+					progress.failed.append(bom)
+
+			progress.completed = count
+			set_replace_progress(self.current_bom, self.new_bom, progress)
+			frappe.db.commit()
+
+			frappe.publish_progress(count * 100 / total, title=_("Replacing BOM..."), description=bom)
+
+	def retry_failed_boms(self, progress):
+		"""Update the BOMs in `progress.failed` again, sub-assemblies first. The parents of
+		those that change are added to the list, they were updated without the change."""
+		graph = get_bom_graph()
+
+		for bom in progress.bom_list:
+			if bom not in progress.failed:
+				continue
 
-		with click.progressbar(bom_list) as bom_list:
-			pass
-		for bom in bom_list:
 			try:
-				bom_obj = frappe.get_cached_doc('BOM', bom)
-				# this is only used for versioning and we do not want
-				# to make separate db calls by using load_doc_before_save
-				# which proves to be expensive while doing bulk replace
-				bom_obj._doc_before_save = bom_obj
-				bom_obj.update_new_bom(self.current_bom, self.new_bom, unit_cost)
-				bom_obj.update_exploded_items()
-				bom_obj.calculate_cost()
-				bom_obj.update_parent_cost()
-				bom_obj.db_update()
-				if bom_obj.meta.get('track_changes') and not bom_obj.flags.ignore_version:
-					bom_obj.save_version()
+				changed = self.update_parent_bom(bom, progress.unit_costs)
+				progress.failed.remove(bom)
+
+				if changed:
+					progress.failed.extend(d for d in graph.get_parents(bom, cancelled=False)
+						if d not in progress.failed)
 			except Exception:
-				frappe.log_error(frappe.get_traceback())
+				frappe.db.rollback()
+				frappe.log_error(frappe.get_traceback(), _("BOM {0} could not be updated").format(bom))
+
+			set_replace_progress(self.current_bom, self.new_bom, progress)
+			frappe.db.commit()
+
+	def update_parent_bom(self, bom, unit_costs):
+		"""Set the new unit cost of the changed sub-assemblies in `bom` and update its cost and
+		exploded items. Returns True if either of them changed."""
+		bom_obj = frappe.get_doc("BOM", bom)
+		# this is only used for versioning and we do not want
+		# to make separate db calls by using load_doc_before_save
+		# which proves to be expensive while doing bulk replace
+		bom_obj._doc_before_save = bom_obj
+
+		changed_rows = [d for d in bom_obj.get("items") if d.bom_no in unit_costs]
+		for d in changed_rows:
+			d.rate = unit_costs[d.bom_no]
+			d.amount = (d.stock_qty or d.qty) * d.rate
+
+		total_cost = bom_obj.total_cost
+		bom_obj.calculate_cost()
+
+		rows = get_exploded_rows(bom_obj)
+		exploded_changed = exploded_items_changed(bom_obj, rows)
+		if exploded_changed:
+			bom_obj.add_exploded_items()
+		else:
+			get_bom_graph().set_exploded_items(bom, bom_obj.docstatus, bom_obj.quantity, rows)
+
+		for d in changed_rows:
+			d.db_update()
+		bom_obj.db_update()
+
+		if bom_obj.meta.get('track_changes') and not bom_obj.flags.ignore_version:
+			bom_obj.save_version()
+
+		changed = exploded_changed or not values_equal([total_cost], [bom_obj.total_cost])
+		if changed and bom_obj.total_cost:
+			unit_costs[bom] = bom_obj.total_cost / bom_obj.quantity
+
+		return changed
 
 	def validate_bom(self):
 		if cstr(self.current_bom) == cstr(self.new_bom):
@@ -53,18 +148,17 @@ class BOMUpdateTool(Document):
 			rate=%s, amount=stock_qty*%s where bom_no = %s and docstatus < 2 and parenttype='BOM'""",
 			(self.new_bom, unit_cost, unit_cost, self.current_bom))
 
-	def get_parent_boms(self, bom, bom_list=[]):
-		data = frappe.db.sql("""SELECT DISTINCT parent FROM `tabBOM Item`
-			WHERE bom_no = %s AND docstatus < 2 AND parenttype='BOM'""", bom)
+	def get_parent_boms(self, bom):
+		"""BOMs using `bom` directly or through other BOMs, which must not be below the new BOM"""
+		graph = get_bom_graph()
+		bom_list = graph.get_ancestors(bom, cancelled=False)
 
-		for d in data:
-			if self.new_bom == d[0]:
-				frappe.throw(_("BOM recursion: {0} cannot be child of {1}").format(bom, self.new_bom))
+		below_new_bom = set(graph.get_descendants(self.new_bom))
+		for d in bom_list:
+			if d in below_new_bom:
+				frappe.throw(_("BOM recursion: {0} cannot be child of {1}").format(self.new_bom, d))
 
-			bom_list.append(d[0])
-			self.get_parent_boms(d[0], bom_list)
-
-		return list(set(bom_list))
+		return bom_list
 
 def get_new_bom_unit_cost(bom):
 	new_bom_unitcost = frappe.db.sql("""SELECT `total_cost`/`quantity`
@@ -72,6 +166,23 @@ def get_new_bom_unit_cost(bom):
 
 	return flt(new_bom_unitcost[0][0]) if new_bom_unitcost else 0
 
+def get_replace_progress(current_bom, new_bom):
+	"""Progress of an unfinished replace of `current_bom` by `new_bom`, if any"""
+	progress = frappe.db.get_global(get_replace_progress_key(current_bom, new_bom))
+	return frappe._dict(json.loads(progress)) if progress else None
+
+def set_replace_progress(current_bom, new_bom, progress):
+	"""Keep the progress in the database, in the same transaction as the BOMs it covers"""
+	key = get_replace_progress_key(current_bom, new_bom)
+	if progress:
+		frappe.db.set_global(key, json.dumps(progress))
+	else:
+		frappe.defaults.clear_default(key, parent="__global")
+
+def get_replace_progress_key(current_bom, new_bom):
+	return "bom_replace_progress::" + hashlib.md5("{0}::{1}".format(current_bom, new_bom)
+		.encode("utf-8")).hexdigest()
+
 @frappe.whitelist()
 def enqueue_replace_bom(args):
 	if isinstance(args, string_types):
@@ -98,9 +209,9 @@ def replace_bom(args):
 	doc.replace_bom()
 
 def update_cost():
+	"""Update the cost of all the BOMs with the latest rates and return the BOMs that changed"""
 	frappe.db.auto_commit_on_many_writes = 1
-	bom_list = get_boms_in_bottom_up_order()
-	for bom in bom_list:
-		frappe.get_doc("BOM", bom).update_cost(update_parent=False, from_child_bom=True)
+	changed_boms = update_cost_of_all_boms()
+	frappe.db.auto_commit_on_many_writes = 0
 
-	frappe.db.auto_commit_on_many_writes = 0
\ No newline at end of file
+	return changed_boms
\ No newline at end of file
@@ -7,7 +7,7 @@ import unittest
 import frappe
 from erpnext.stock.doctype.item.test_item import create_item
 from erpnext.manufacturing.doctype.production_plan.test_production_plan import make_bom
-from erpnext.manufacturing.doctype.bom_update_tool.bom_update_tool import update_cost
+from erpnext.manufacturing.doctype.bom_update_tool.bom_update_tool import update_cost, get_replace_progress
 
 test_records = frappe.get_test_records('BOM')
 
@@ -22,16 +22,54 @@ class TestBOMUpdateTool(unittest.TestCase):
 		update_tool = frappe.get_doc("BOM Update Tool")
 		update_tool.current_bom = current_bom
 		update_tool.new_bom = bom_doc.name
+
+		parent_boms = update_tool.get_parent_boms(current_bom)
+		self.assertTrue(parent_boms)
+		self.assertEqual(update_tool.get_parent_boms(current_bom), parent_boms)
+
 		update_tool.replace_bom()
 
 		self.assertFalse(frappe.db.sql("select name from `tabBOM Item` where bom_no=%s", current_bom))
 		self.assertTrue(frappe.db.sql("select name from `tabBOM Item` where bom_no=%s", bom_doc.name))
+		self.assertFalse(get_replace_progress(current_bom, bom_doc.name))
 
 		# reverse, as it affects other testcases
 		update_tool.current_bom = bom_doc.name
 		update_tool.new_bom = current_bom
 		update_tool.replace_bom()
 
+	def test_failed_bom_retried(self):
+		current_bom = "BOM-_Test Item Home Desktop Manufactured-001"
+
+		bom_doc = frappe.copy_doc(test_records[0])
+		bom_doc.items[1].item_code = "_Test Item"
+		bom_doc.insert()
+
+		update_tool = frappe.get_doc("BOM Update Tool")
+		update_tool.current_bom = current_bom
+		update_tool.new_bom = bom_doc.name
+
+		# the first BOM fails once
+		updated = []
+		update_parent_bom = update_tool.update_parent_bom
+		def fail_once(bom, unit_costs):
+			updated.append(bom)
+			if len(updated) == 1:
+				frappe.throw("Locked")
+
+			return update_parent_bom(bom, unit_costs)
+
+		update_tool.update_parent_bom = fail_once
+		update_tool.replace_bom()
+
+		self.assertEqual(updated.count(updated[0]), 2)
+		self.assertFalse(get_replace_progress(current_bom, bom_doc.name))
+
+		update_tool.update_parent_bom = update_parent_bom
+		update_tool.current_bom = bom_doc.name
+		update_tool.new_bom = current_bom
+		update_tool.replace_bom()
+
 	def test_bom_cost(self):
 		for item in ["BOM Cost Test Item 1", "BOM Cost Test Item 2", "BOM Cost Test Item 3"]:
 			item_doc = create_item(item, valuation_rate=100)
@@ -48,7 +86,10 @@ class TestBOMUpdateTool(unittest.TestCase):
 		self.assertEquals(doc.total_cost, 200)
 
 		frappe.db.set_value("Item", "BOM Cost Test Item 2", "valuation_rate", 200)
-		update_cost()
+		self.assertTrue(doc.name in update_cost())
+
+		# nothing to write when the rates did not change
+		self.assertFalse(doc.name in update_cost())
 
 		doc.load_from_db()
 		self.assertEquals(doc.total_cost, 300)
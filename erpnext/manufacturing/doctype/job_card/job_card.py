@@ -4,14 +4,14 @@
 
 from __future__ import unicode_literals
 import frappe
-import datetime
 from frappe import _
 from frappe.model.mapper import get_mapped_doc
 from frappe.model.document import Document
-from frappe.utils import (flt, cint, time_diff_in_hours, get_datetime, getdate,
-	get_time, add_to_date, time_diff, add_days, get_datetime_str, get_link_to_form)
+from frappe.utils import (flt, time_diff_in_hours, get_datetime,
+	time_diff, get_datetime_str, get_link_to_form)
 
-from erpnext.manufacturing.doctype.manufacturing_settings.manufacturing_settings import get_mins_between_operations
+from erpnext.manufacturing.doctype.workstation.workstation_timeline import (CapacityScheduler,
+	WorkstationTimeline)
 
 class OverlapError(frappe.ValidationError): pass
 
@@ -25,11 +25,14 @@ class JobCard(Document):
 		self.total_time_in_mins = 0.0
 
 		if self.get('time_logs'):
+			if self.flags.time_logs_scheduled:
+				self.validate_scheduled_time_logs()
+
 			for d in self.get('time_logs'):
 				if get_datetime(d.from_time) > get_datetime(d.to_time):
 					frappe.throw(_("Row {0}: From time must be less than to time").format(d.idx))
 
-				data = self.get_overlap_for(d)
+				data = self.get_overlap_for(d) if not self.flags.time_logs_scheduled else None
 				if data:
 					frappe.throw(_("Row {0}: From Time and To Time of {1} is overlapping with {2}")
 						.format(d.idx, self.name, data.name), OverlapError)
@@ -41,6 +44,36 @@ class JobCard(Document):
 				if d.completed_qty:
 					self.total_completed_qty += d.completed_qty
 
+	def validate_scheduled_time_logs(self):
+		"""The slots booked by the scheduler were free when it read the workstation, check with
+		one query that no other job card took them since"""
+		time_logs = [d for d in self.time_logs if d.from_time and d.to_time]
+		if not time_logs or not self.workstation:
+			return
+
+		from_time = min(get_datetime(d.from_time) for d in time_logs)
+		to_time = max(get_datetime(d.to_time) for d in time_logs)
+
+		existing = frappe.db.sql("""select jc.name, jctl.from_time, jctl.to_time
+			from `tabJob Card Time Log` jctl, `tabJob Card` jc
+			where jctl.parent = jc.name and jc.docstatus < 2 and jc.workstation = %s
+				and jc.name != %s and jctl.to_time > %s and jctl.from_time < %s""",
+			(self.workstation, self.name or "No Name", from_time, to_time), as_dict=1)
+
+		timeline = WorkstationTimeline(self.workstation, frappe.get_cached_value("Workstation",
+			self.workstation, "production_capacity"))
+		for d in existing:
+			timeline.book(get_datetime(d.from_time), get_datetime(d.to_time))
+
+		for d in time_logs:
+			start, end = get_datetime(d.from_time), get_datetime(d.to_time)
+			window_start, window_end = timeline.get_free_window(start, end)
+			if window_start != start or window_end < end:
+				overlapping = [e.name for e in existing
+					if get_datetime(e.from_time) < end and get_datetime(e.to_time) > start]
+				frappe.throw(_("Row {0}: From Time and To Time of {1} is overlapping with {2}")
+					.format(d.idx, self.name, overlapping[0]), OverlapError)
+
 	def get_overlap_for(self, args, check_next_available_slot=False):
 		production_capacity = 1
 
@@ -81,74 +114,24 @@ class JobCard(Document):
 
 		return existing[0] if existing else None
 
-	def schedule_time_logs(self, row):
-		row.remaining_time_in_mins = row.time_in_mins
-		while row.remaining_time_in_mins > 0:
-			args = frappe._dict({
-				"from_time": row.planned_start_time,
-				"to_time": row.planned_end_time
-			})
-
-			self.validate_overlap_for_workstation(args, row)
-			self.check_workstation_time(row)
-
-	def validate_overlap_for_workstation(self, args, row):
-		# get the last record based on the to time from the job card
-		data = self.get_overlap_for(args, check_next_available_slot=True)
-		if data:
-			row.planned_start_time = get_datetime(data.to_time + get_mins_between_operations())
-
-	def check_workstation_time(self, row):
-		workstation_doc = frappe.get_cached_doc("Workstation", self.workstation)
-		if (not workstation_doc.working_hours or
-			cint(frappe.db.get_single_value("Manufacturing Settings", "allow_overtime"))):
-			if get_datetime(row.planned_end_time) < get_datetime(row.planned_start_time):
-				row.planned_end_time = add_to_date(row.planned_start_time, minutes=row.time_in_mins)
-				row.remaining_time_in_mins = 0.0
-			else:
-				row.remaining_time_in_mins -= time_diff_in_minutes(row.planned_end_time, row.planned_start_time)
-
-			self.update_time_logs(row)
-			return
-
-		start_date = getdate(row.planned_start_time)
-		start_time = get_time(row.planned_start_time)
+	def schedule_time_logs(self, row, scheduler=None):
+		"""Add time logs for the operation `row` in the first free slots of the workstation.
+		Returns False if there is no slot within the capacity planning days."""
+		if not scheduler:
+			scheduler = CapacityScheduler(frappe.db.get_single_value("Manufacturing Settings",
+				"capacity_planning_for_days"))
 
-		new_start_date = workstation_doc.validate_workstation_holiday(start_date)
+		time_logs = scheduler.schedule(self.workstation, row.planned_start_time, row.time_in_mins)
+		if not time_logs:
+			return False
 
-		if new_start_date != start_date:
-			row.planned_start_time = datetime.datetime.combine(new_start_date, start_time)
-			start_date = new_start_date
-
-		total_idx = len(workstation_doc.working_hours)
-
-		for i, time_slot in enumerate(workstation_doc.working_hours):
-			workstation_start_time = datetime.datetime.combine(start_date, get_time(time_slot.start_time))
-			workstation_end_time = datetime.datetime.combine(start_date, get_time(time_slot.end_time))
-
-			if (get_datetime(row.planned_start_time) >= workstation_start_time and
-				get_datetime(row.planned_start_time) <= workstation_end_time):
-				time_in_mins = time_diff_in_minutes(workstation_end_time, row.planned_start_time)
-
-				# If remaining time fit in workstation time logs else split hours as per workstation time
-				if time_in_mins > row.remaining_time_in_mins:
-					row.planned_end_time = add_to_date(row.planned_start_time,
-						minutes=row.remaining_time_in_mins)
-					row.remaining_time_in_mins = 0
-				else:
-					row.planned_end_time = add_to_date(row.planned_start_time, minutes=time_in_mins)
-					row.remaining_time_in_mins -= time_in_mins
-
-				self.update_time_logs(row)
-
-				if total_idx != (i+1) and row.remaining_time_in_mins > 0:
-					row.planned_start_time = datetime.datetime.combine(start_date,
-						get_time(workstation_doc.working_hours[i+1].start_time))
+		for from_time, to_time in time_logs:
+			row.planned_start_time, row.planned_end_time = from_time, to_time
+			self.update_time_logs(row)
 
-		if row.remaining_time_in_mins > 0:
-			start_date = add_days(start_date, 1)
-			row.planned_start_time = datetime.datetime.combine(start_date,
-				get_time(workstation_doc.working_hours[0].start_time))
+		# the slots are free, as booked on the workstation
+		self.flags.time_logs_scheduled = True
+		return True
 
 	def update_time_logs(self, row):
 		self.append("time_logs", {
@@ -0,0 +1,396 @@
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and Contributors
+# License: GNU General Public License v3. See license.txt
+
+from __future__ import unicode_literals
+
+import copy
+from collections import OrderedDict
+
+import frappe
+from frappe import _
+from frappe.utils import add_days, ceil, cint, flt, getdate, nowdate
+
+class MRPRun(object):
+	"""Raw materials to request for the rows of a Production Plan (or a Sales Order), netted
+	against the stock of their warehouses.
+
+	The BOMs of all the rows are exploded together, reading the items of a BOM level in one
+	query, and the bins of all the required items are read in one query. Requirements are
+	phased by the date the materials are needed: the planned start date of the row, moved
+	earlier by the lead time of each sub-assembly made from them."""
+	def __init__(self, doc, warehouses=None):
+		self.doc = doc
+		self.company = doc.get("company")
+		self.for_warehouse = doc.get("for_warehouse")
+		self.warehouses = warehouses
+		self.ignore_existing_ordered_qty = doc.get("ignore_existing_ordered_qty")
+
+		self.items = {}
+		self.bom_items = {}
+		self.exploded_items = {}
+		self.bins = {}
+		self.warehouse_bounds = {}
+		self.demand = OrderedDict()
+
+	def run(self):
+		rows = self.get_plan_rows()
+		self.load_boms(rows)
+
+		for row in rows:
+			if row.use_exploded_items:
+				for d in self.exploded_items.get(row.bom_no, []):
+					if self.is_included(d.item_code, row):
+						self.add_demand(row, d, flt(d.qty) * flt(row.qty), row.required_date)
+			elif row.bom_no:
+				self.explode(row, row.bom_no, flt(row.qty), row.required_date, [row.bom_no])
+			else:
+				self.add_demand(row, self.items[row.item_code], flt(row.qty) or 1, row.required_date)
+
+		self.load_bins()
+		mr_items = self.get_material_request_items()
+
+		if not self.ignore_existing_ordered_qty and self.warehouses:
+			mr_items = self.get_materials_from_other_locations(mr_items)
+
+		return mr_items
+
+	def get_plan_rows(self):
+		po_items = self.doc.get('po_items') if self.doc.get('po_items') else self.doc.get('items')
+		# Check for empty table or empty rows
+		if not po_items or not [row.get('item_code') for row in po_items if row.get('item_code')]:
+			frappe.throw(_("Items to Manufacture are required to pull the Raw Materials associated with it."),
+				title=_("Items Required"))
+
+		rows = []
+		for data in po_items:
+			planned_qty = data.get('required_qty') or data.get('planned_qty')
+			self.ignore_existing_ordered_qty = data.get('ignore_existing_ordered_qty') or self.ignore_existing_ordered_qty
+
+			row = frappe._dict({
+				"sales_order": self.doc.get("sales_order"),
+				"qty": planned_qty,
+				"required_date": getdate(data.get("planned_start_date") or data.get("schedule_date") or nowdate()),
+				"include_exploded_items": data.get('include_exploded_items')
+			})
+
+			if data.get("bom") or data.get("bom_no"):
+				if data.get('required_qty'):
+					row.bom_no = data.get('bom')
+					row.include_non_stock_items = 1
+					row.include_subcontracted_items = 1 if data.get('include_exploded_items') else 0
+				else:
+					row.bom_no = data.get('bom_no')
+					row.include_subcontracted_items = self.doc.get('include_subcontracted_items')
+					row.include_non_stock_items = self.doc.get('include_non_stock_items')
+
+				if not planned_qty:
+					frappe.throw(_("For row {0}: Enter Planned Qty").format(data.get('idx')))
+
+				if row.bom_no:
+					row.use_exploded_items = row.include_exploded_items and row.include_subcontracted_items
+					rows.append(row)
+			elif data.get('item_code'):
+				row.item_code = data.get('item_code')
+				rows.append(row)
+
+		return rows
+
+	def load_boms(self, rows):
+		"""Read the exploded items or the items of all the BOMs reached from `rows`,
+		one query per BOM level"""
+		self.load_items([row.item_code for row in rows if row.item_code])
+
+		bom_nos = set(row.bom_no for row in rows if row.use_exploded_items)
+		if bom_nos:
+			for d in frappe.db.sql("""select bei.parent, bei.item_code, bei.stock_uom, bei.description,
+					bei.source_warehouse, ifnull(sum(bei.stock_qty/ifnull(bom.quantity, 1)), 0) as qty
+				from `tabBOM Explosion Item` bei, `tabBOM` bom
+				where bom.name = bei.parent and bei.docstatus < 2 and bom.name in %s
+				group by bei.parent, bei.item_code, bei.stock_uom
+				order by bei.parent, min(bei.idx)""", [tuple(bom_nos)], as_dict=1):
+					self.exploded_items.setdefault(d.pop("parent"), []).append(d)
+
+			self.load_items(d.item_code for items in self.exploded_items.values() for d in items)
+
+		# BOMs to read with the flags of the rows they are exploded for
+		pending = set((row.bom_no, cint(row.include_exploded_items), cint(row.include_subcontracted_items),
+			cint(row.include_non_stock_items)) for row in rows if row.bom_no and not row.use_exploded_items)
+		seen = set(pending)
+
+		while pending:
+			self.load_bom_items(set(d[0] for d in pending))
+
+			next_level = set()
+			for bom_no, include_exploded_items, include_subcontracted_items, include_non_stock_items in pending:
+				if not include_exploded_items:
+					continue
+
+				for d in self.bom_items.get(bom_no, []):
+					item = self.items.get(d.item_code)
+					if (item and item.default_bom and (item.is_stock_item or include_non_stock_items)
+						and self.is_exploded(item, include_subcontracted_items)):
+							next_level.add((item.default_bom, include_exploded_items,
+								include_subcontracted_items, include_non_stock_items))
+
+			pending = next_level - seen
+			seen.update(pending)
+
+	def load_bom_items(self, bom_nos):
+		bom_nos = tuple(d for d in bom_nos if d not in self.bom_items)
+		if not bom_nos:
+			return
+
+		for bom_no in bom_nos:
+			self.bom_items[bom_no] = []
+
+		for d in frappe.db.sql("""select bom_item.parent, bom_item.item_code, bom_item.source_warehouse,
+				bom_item.description, bom_item.stock_uom,
+				ifnull(sum(bom_item.stock_qty/ifnull(bom.quantity, 1)), 0) as qty
+			from `tabBOM Item` bom_item, `tabBOM` bom
+			where bom.name = bom_item.parent and bom.name in %s and bom_item.docstatus < 2
+			group by bom_item.parent, bom_item.item_code
+			order by bom_item.parent, min(bom_item.idx)""", [bom_nos], as_dict=1):
+				self.bom_items[d.pop("parent")].append(d)
+
+		self.load_items(d.item_code for bom_no in bom_nos for d in self.bom_items[bom_no])
+
+	def load_items(self, item_codes):
+		item_codes = tuple(set(d for d in item_codes if d not in self.items))
+		if not item_codes:
+			return
+
+		for d in frappe.db.sql("""
+			select
+				item.name as item_code, item.item_name, item.description, item.stock_uom, item.item_group,
+				item.is_stock_item, item.default_bom, item.min_order_qty, item.lead_time_days,
+				item.default_material_request_type, item.is_sub_contracted_item as is_sub_contracted,
+				item.has_serial_no, item.has_batch_no, item_default.default_warehouse,
+				item.purchase_uom, item_uom.conversion_factor
+			from
+				`tabItem` item
+				LEFT JOIN `tabItem Default` item_default
+					ON item_default.parent = item.name and item_default.company = %s
+				LEFT JOIN `tabUOM Conversion Detail` item_uom
+					ON item.name = item_uom.parent and item_uom.uom = item.purchase_uom
+			where item.name in %s""", (self.company, item_codes), as_dict=1):
+				d.purchase_uom = d.purchase_uom or d.stock_uom
+				self.items.setdefault(d.item_code, d)
+
+	def is_included(self, item_code, row):
+		item = self.items.get(item_code)
+		return item and (item.is_stock_item or row.include_non_stock_items)
+
+	def is_exploded(self, item, include_subcontracted_items):
+		"""True if the requirement of a sub-assembly is replaced by the items of its default BOM"""
+		return ((item.default_material_request_type in ["Manufacture", "Purchase"] and not item.is_sub_contracted)
+			or (item.is_sub_contracted and include_subcontracted_items))
+
+	def explode(self, row, bom_no, qty, required_date, path):
+		for d in self.bom_items.get(bom_no, []):
+			if not self.is_included(d.item_code, row):
+				continue
+
+			item = self.items[d.item_code]
+			item_qty = flt(d.qty) * qty
+
+			if not row.include_exploded_items or not item.default_bom:
+				self.add_demand(row, d, item_qty, required_date)
+
+			elif (self.is_exploded(item, row.include_subcontracted_items) and item_qty > 0
+				and item.default_bom not in path):
+					# the items of a sub-assembly are needed before it can be made
+					self.explode(row, item.default_bom, item_qty,
+						add_days(required_date, -cint(item.lead_time_days)), path + [item.default_bom])
+
+	def add_demand(self, row, d, qty, required_date):
+		key = (row.sales_order, d.item_code)
+		if key not in self.demand:
+			details = frappe._dict(self.items[d.item_code])
+			details.update({
+				"sales_order": row.sales_order,
+				"description": d.description or details.description,
+				"stock_uom": d.stock_uom or details.stock_uom,
+				"source_warehouse": d.get("source_warehouse"),
+				"qty_by_date": {}
+			})
+			self.demand[key] = details
+
+		qty_by_date = self.demand[key].qty_by_date
+		qty_by_date[required_date] = qty_by_date.get(required_date, 0) + qty
+
+	def load_bins(self):
+		"""Stock of all the required items in all the warehouses of the company, in one query"""
+		item_codes = tuple(set(d[1] for d in self.demand))
+		if not item_codes:
+			return
+
+		for d in frappe.db.sql("""select name, lft, rgt from `tabWarehouse` where company = %s""",
+			self.company, as_dict=1):
+				self.warehouse_bounds[d.name] = (d.lft, d.rgt)
+
+		for d in frappe.db.sql("""select bin.item_code, bin.warehouse, bin.projected_qty, bin.actual_qty
+			from `tabBin` bin, `tabWarehouse` warehouse
+			where warehouse.name = bin.warehouse and warehouse.company = %s and bin.item_code in %s
+			order by bin.warehouse""", (self.company, item_codes), as_dict=1):
+				self.bins.setdefault(d.item_code, []).append(d)
+
+	def get_bins(self, item_code):
+		"""Stock of `item_code` by warehouse"""
+		return self.bins.get(item_code, [])
+
+	def get_bin(self, item_code, warehouse=None):
+		"""Stock of `item_code` in `warehouse` and the warehouses below it, or in all the warehouses"""
+		bounds = self.warehouse_bounds.get(warehouse) if warehouse else None
+		if warehouse and not bounds:
+			bounds = frappe.db.get_value("Warehouse", warehouse, ["lft", "rgt"])
+
+		out = frappe._dict(projected_qty=0.0, actual_qty=0.0)
+		for d in self.get_bins(item_code):
+			if bounds:
+				lft, rgt = self.warehouse_bounds[d.warehouse]
+				if lft < bounds[0] or rgt > bounds[1]:
+					continue
+
+			out.projected_qty += flt(d.projected_qty)
+			out.actual_qty += flt(d.actual_qty)
+
+		return out
+
+	def get_material_request_items(self):
+		"""Net the requirements of each item against its projected qty, earliest first"""
+		uom_whole_number = {}
+		uoms = tuple(set(d.purchase_uom for d in self.demand.values()))
+		if uoms:
+			uom_whole_number = dict(frappe.db.sql("""select name, must_be_whole_number
+				from `tabUOM` where name in %s""", [uoms]))
+
+		item_group_warehouses = dict(frappe.db.sql("""select parent, default_warehouse
+			from `tabItem Default` where parenttype = 'Item Group' and company = %s""", self.company))
+
+		mr_items = []
+		for details in self.demand.values():
+			if sum(details.qty_by_date.values()) <= 0:
+				continue
+
+			warehouse = self.for_warehouse
+			bin_dict = self.get_bin(details.item_code,
+				warehouse or details.source_warehouse or details.default_warehouse)
+			available = bin_dict.projected_qty
+
+			for required_date in sorted(details.qty_by_date):
+				total_qty = details.qty_by_date[required_date]
+
+				required_qty = 0
+				if self.ignore_existing_ordered_qty or available < 0:
+					required_qty = total_qty
+				elif total_qty > available:
+					required_qty = total_qty - available
+
+				if required_qty > 0 and required_qty < flt(details.min_order_qty):
+					required_qty = flt(details.min_order_qty)
+
+				if not self.ignore_existing_ordered_qty and available >= 0:
+					# a minimum order bigger than the shortage covers the next requirements
+					available += required_qty - total_qty
+
+				if details.purchase_uom != details.stock_uom:
+					if not details.conversion_factor:
+						frappe.throw(_("UOM Conversion factor ({0} -> {1}) not found for item: {2}")
+							.format(details.purchase_uom, details.stock_uom, details.item_code))
+					required_qty = required_qty / details.conversion_factor
+
+				if uom_whole_number.get(details.purchase_uom):
+					required_qty = ceil(required_qty)
+
+				if required_qty > 0:
+					mr_items.append(self.get_material_request_item(details, required_qty, required_date,
+						bin_dict, warehouse or details.source_warehouse or details.default_warehouse
+							or item_group_warehouses.get(details.item_group)))
+
+		return mr_items
+
+	def get_material_request_item(self, details, required_qty, required_date, bin_dict, warehouse):
+		# not before the lead time of the item from today
+		schedule_date = max(required_date, getdate(add_days(nowdate(), cint(details.lead_time_days))))
+
+		return {
+			'item_code': details.item_code,
+			'item_name': details.item_name,
+			'quantity': required_qty,
+			'description': details.description,
+			'stock_uom': details.stock_uom,
+			'warehouse': warehouse,
+			'actual_qty': bin_dict.actual_qty,
+			'projected_qty': bin_dict.projected_qty,
+			'min_order_qty': details.min_order_qty,
+			'material_request_type': details.default_material_request_type,
+			'sales_order': details.sales_order,
+			'uom': details.purchase_uom or details.stock_uom,
+			'schedule_date': schedule_date,
+			'release_date': add_days(schedule_date, -cint(details.lead_time_days))
+		}
+
+	def get_materials_from_other_locations(self, mr_items):
+		"""Split the requirements into transfers from the stock in `warehouses`, earliest first,
+		and purchases of the rest"""
+		locations = self.get_item_locations(mr_items)
+
+		new_mr_items = []
+		for item in mr_items:
+			item_locations = locations.get(item.get("item_code"))
+			if not item_locations:
+				new_mr_items.append(item)
+				continue
+
+			required_qty = item.get("quantity")
+			for d in item_locations:
+				if required_qty <= 0:
+					break
+
+				quantity = min(required_qty, d.get("qty"))
+				if quantity <= 0:
+					continue
+
+				new_dict = copy.deepcopy(item)
+				new_dict.update({
+					"quantity": quantity,
+					"material_request_type": "Material Transfer",
+					"from_warehouse": d.get("warehouse")
+				})
+
+				d["qty"] -= quantity
+				required_qty -= quantity
+				new_mr_items.append(new_dict)
+
+			if required_qty > 0:
+				item["quantity"] = required_qty
+				new_mr_items.append(item)
+
+		return new_mr_items
+
+	def get_item_locations(self, mr_items):
+		"""Available stock of the items in `warehouses`, read in one query except for serialized
+		and batched items"""
+		from erpnext.stock.doctype.pick_list.pick_list import get_available_item_locations
+
+		required_qty = OrderedDict()
+		for item in mr_items:
+			required_qty[item.get("item_code")] = required_qty.get(item.get("item_code"), 0) + item.get("quantity")
+
+		locations = {}
+		other_items = []
+		for item_code, qty in required_qty.items():
+			item = self.items[item_code]
+			if item.has_serial_no or item.has_batch_no:
+				locations[item_code] = get_available_item_locations(item_code, self.warehouses, qty,
+					self.company, ignore_validation=True)
+			else:
+				other_items.append(item_code)
+
+		if other_items:
+			for d in frappe.db.sql("""select item_code, warehouse, actual_qty as qty from `tabBin`
+				where item_code in %s and warehouse in %s and actual_qty > 0
+				order by creation""", (tuple(other_items), tuple(self.warehouses)), as_dict=1):
+					locations.setdefault(d.pop("item_code"), []).append(d)
+
+		return locations
@@ -5,7 +5,7 @@ from __future__ import unicode_literals
 
 import frappe
 import unittest
-from frappe.utils import nowdate, now_datetime, flt
+from frappe.utils import nowdate, now_datetime, flt, add_days, getdate
 from erpnext.stock.doctype.item.test_item import create_item
 from erpnext.manufacturing.doctype.production_plan.production_plan import get_sales_orders
 from erpnext.stock.doctype.stock_reconciliation.test_stock_reconciliation import create_stock_reconciliation
@@ -158,6 +158,24 @@ class TestProductionPlan(unittest.TestCase):
 		self.assertTrue(mr.material_request_type, 'Customer Provided')
 		self.assertTrue(mr.customer, '_Test Customer')
 
+	def test_time_phased_requirements(self):
+		bom_no = frappe.db.get_value('Item', 'Test Production Item 1', 'default_bom')
+		doc = frappe._dict({
+			'company': '_Test Company',
+			'ignore_existing_ordered_qty': 1,
+			'include_non_stock_items': 1,
+			'po_items': [{
+				'item_code': 'Test Production Item 1',
+				'bom_no': bom_no,
+				'planned_qty': qty,
+				'planned_start_date': add_days(nowdate(), days)
+			} for qty, days in [(2, 20), (1, 10)]]
+		})
+
+		mr_items = [d for d in get_items_for_material_requests(doc) if d['item_code'] == 'Raw Material Item 1']
+		self.assertEqual([(flt(d['quantity']), d['schedule_date']) for d in mr_items],
+			[(1.0, getdate(add_days(nowdate(), 10))), (2.0, getdate(add_days(nowdate(), 20)))])
+
 def create_production_plan(**args):
 	args = frappe._dict(args)
 
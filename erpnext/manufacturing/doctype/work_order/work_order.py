@@ -14,9 +14,11 @@ from erpnext.stock.doctype.item.item import validate_end_of_life, get_item_defau
 from erpnext.manufacturing.doctype.workstation.workstation import WorkstationHolidayError
 from erpnext.projects.doctype.timesheet.timesheet import OverlapError
 from erpnext.manufacturing.doctype.manufacturing_settings.manufacturing_settings import get_mins_between_operations
-from erpnext.stock.stock_balance import get_planned_qty, update_bin_qty
+from erpnext.manufacturing.doctype.workstation.workstation_timeline import CapacityScheduler
+from erpnext.utilities.bulk_update import update_in_bulk
+from erpnext.stock.doctype.bin_reservation.bin_reservation import update_bin_reservations
 from frappe.utils.csvutils import getlink
-from erpnext.stock.utils import get_bin, validate_warehouse_company, get_latest_stock_qty
+from erpnext.stock.utils import validate_warehouse_company, get_latest_stock_qty
 from erpnext.utilities.transaction_base import validate_uom_is_integer
 from frappe.model.mapper import get_mapped_doc
 
@@ -265,6 +267,12 @@ class WorkOrder(Document):
 		enable_capacity_planning = not cint(manufacturing_settings_doc.disable_capacity_planning)
 		plan_days = cint(manufacturing_settings_doc.capacity_planning_for_days) or 30
 
+		scheduler = None
+		if enable_capacity_planning:
+			scheduler = CapacityScheduler(plan_days)
+			scheduler.load([row.workstation for row in self.operations], self.planned_start_date)
+
+		scheduled_operations = []
 		for i, row in enumerate(self.operations):
 			self.set_operation_start_end_time(i, row)
 
@@ -274,7 +282,7 @@ class WorkOrder(Document):
 
 			original_start_time = row.planned_start_time
 			job_card_doc = create_job_card(self, row,
-				enable_capacity_planning=enable_capacity_planning, auto_create=True)
+				enable_capacity_planning=enable_capacity_planning, auto_create=True, scheduler=scheduler)
 
 			if enable_capacity_planning and job_card_doc:
 				row.planned_start_time = job_card_doc.time_logs[-1].from_time
@@ -285,7 +293,9 @@ class WorkOrder(Document):
 					frappe.throw(_("Unable to find the time slot in the next {0} days for the operation {1}.")
 						.format(plan_days, row.operation), CapacityError)
 
-				row.db_update()
+				scheduled_operations.append([row.name, row.planned_start_time, row.planned_end_time])
+
+		update_in_bulk("Work Order Operation", ("planned_start_time", "planned_end_time"), scheduled_operations)
 
 		planned_end_date = self.operations and self.operations[-1].planned_end_time
 		if planned_end_date:
@@ -317,9 +327,7 @@ class WorkOrder(Document):
 			frappe.throw(_("Cannot cancel because submitted Stock Entry {0} exists").format(frappe.utils.get_link_to_form('Stock Entry', stock_entry[0][0])))
 
 	def update_planned_qty(self):
-		update_bin_qty(self.production_item, self.fg_warehouse, {
-			"planned_qty": get_planned_qty(self.production_item, self.fg_warehouse)
-		})
+		update_bin_reservations(self.doctype, self.name, ["planned_qty"])
 
 		if self.material_request:
 			mr_obj = frappe.get_doc("Material Request", self.material_request)
@@ -504,10 +512,7 @@ class WorkOrder(Document):
 
 	def update_reserved_qty_for_production(self, items=None):
 		'''update reserved_qty_for_production in bins'''
-		for d in self.required_items:
-			if d.source_warehouse:
-				stock_bin = get_bin(d.item_code, d.source_warehouse)
-				stock_bin.update_reserved_qty_for_production()
+		update_bin_reservations(self.doctype, self.name, ["reserved_qty_for_production"])
 
 	def get_items_and_operations_from_bom(self):
 		self.set_required_items()
@@ -851,7 +856,7 @@ def validate_operation_data(row):
 			)
 		)
 
-def create_job_card(work_order, row, qty=0, enable_capacity_planning=False, auto_create=False):
+def create_job_card(work_order, row, qty=0, enable_capacity_planning=False, auto_create=False, scheduler=None):
 	doc = frappe.new_doc("Job Card")
 	doc.update({
 		'work_order': work_order.name,
@@ -871,8 +876,9 @@ def create_job_card(work_order, row, qty=0, enable_capacity_planning=False, auto
 
 	if auto_create:
 		doc.flags.ignore_mandatory = True
-		if enable_capacity_planning:
-			doc.schedule_time_logs(row)
+		if enable_capacity_planning and not doc.schedule_time_logs(row, scheduler):
+			frappe.throw(_("Unable to find the time slot in the next {0} days for the operation {1}.")
+				.format(scheduler.plan_days if scheduler else 30, row.operation), CapacityError)
 
 		doc.insert()
 		frappe.msgprint(_("Job card {0} created").format(get_link_to_form("Job Card", doc.name)))
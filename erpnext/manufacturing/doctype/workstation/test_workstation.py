@@ -4,7 +4,11 @@ from __future__ import unicode_literals
 
 import frappe
 import unittest
+import datetime
+from frappe.utils import get_datetime, getdate, to_timedelta
 from erpnext.manufacturing.doctype.workstation.workstation import check_if_within_operating_hours, NotInWorkingHoursError, WorkstationHolidayError
+from erpnext.manufacturing.doctype.workstation.workstation_timeline import WorkstationTimeline, CapacityScheduler
+from erpnext.manufacturing.doctype.work_order.work_order import create_job_card, CapacityError
 
 test_dependencies = ["Warehouse"]
 test_records = frappe.get_test_records('Workstation')
@@ -20,3 +24,71 @@ class TestWorkstation(unittest.TestCase):
 			"_Test Workstation 1", "Operation 1", "2013-02-02 05:00:00", "2013-02-02 20:00:00")
 		self.assertRaises(WorkstationHolidayError, check_if_within_operating_hours,
 			"_Test Workstation 1", "Operation 1", "2013-02-01 10:00:00", "2013-02-02 20:00:00")
+
+	def test_free_window_in_timeline(self):
+		timeline = WorkstationTimeline("_Test Workstation 1", production_capacity=2)
+		timeline.book(get_datetime("2013-02-02 11:00:00"), get_datetime("2013-02-02 12:00:00"))
+		timeline.book(get_datetime("2013-02-02 11:30:00"), get_datetime("2013-02-02 13:00:00"))
+		timeline.book(get_datetime("2013-02-02 11:45:00"), get_datetime("2013-02-02 12:30:00"))
+
+		end_of_day = get_datetime("2013-02-02 20:00:00")
+		self.assertEqual(timeline.get_free_window(get_datetime("2013-02-02 10:00:00"), end_of_day),
+			(get_datetime("2013-02-02 10:00:00"), get_datetime("2013-02-02 11:30:00")))
+		self.assertEqual(timeline.get_free_window(get_datetime("2013-02-02 11:50:00"), end_of_day),
+			(get_datetime("2013-02-02 12:30:00"), end_of_day))
+		self.assertEqual(timeline.get_free_window(get_datetime("2013-02-02 11:50:00"),
+			get_datetime("2013-02-02 11:55:00")), (None, None))
+
+	def test_schedule_split_over_working_hours(self):
+		scheduler = get_scheduler(WorkstationTimeline("_Test Workstation 1",
+			working_hours=[(to_timedelta("09:00:00"), to_timedelta("12:00:00")),
+				(to_timedelta("13:00:00"), to_timedelta("17:00:00"))]))
+
+		self.assertEqual(scheduler.schedule("_Test Workstation 1", "2013-02-04 11:00:00", 180), [
+			(get_datetime("2013-02-04 11:00:00"), get_datetime("2013-02-04 12:00:00")),
+			(get_datetime("2013-02-04 13:00:00"), get_datetime("2013-02-04 15:00:00"))
+		])
+
+		# the next job starts after the one booked
+		self.assertEqual(scheduler.schedule("_Test Workstation 1", "2013-02-04 11:00:00", 60),
+			[(get_datetime("2013-02-04 15:00:00"), get_datetime("2013-02-04 16:00:00"))])
+
+	def test_schedule_skips_holidays(self):
+		scheduler = get_scheduler(WorkstationTimeline("_Test Workstation 1",
+			working_hours=[(to_timedelta("09:00:00"), to_timedelta("17:00:00"))],
+			holidays=set([getdate("2013-02-05")])))
+
+		self.assertEqual(scheduler.schedule("_Test Workstation 1", "2013-02-04 16:00:00", 120), [
+			(get_datetime("2013-02-04 16:00:00"), get_datetime("2013-02-04 17:00:00")),
+			(get_datetime("2013-02-06 09:00:00"), get_datetime("2013-02-06 10:00:00"))
+		])
+
+	def test_schedule_within_production_capacity(self):
+		timeline = WorkstationTimeline("_Test Workstation 1", production_capacity=2)
+		timeline.book(get_datetime("2013-02-04 10:00:00"), get_datetime("2013-02-04 12:00:00"))
+		scheduler = get_scheduler(timeline)
+
+		self.assertEqual(scheduler.schedule("_Test Workstation 1", "2013-02-04 10:00:00", 60),
+			[(get_datetime("2013-02-04 10:00:00"), get_datetime("2013-02-04 11:00:00"))])
+		self.assertEqual(scheduler.schedule("_Test Workstation 1", "2013-02-04 10:00:00", 60),
+			[(get_datetime("2013-02-04 11:00:00"), get_datetime("2013-02-04 12:00:00"))])
+
+	def test_no_slot_within_capacity_planning_days(self):
+		timeline = WorkstationTimeline("_Test Workstation 1")
+		timeline.book(get_datetime("2013-02-04 00:00:00"), get_datetime("2013-02-10 00:00:00"))
+		scheduler = get_scheduler(timeline, plan_days=2)
+
+		self.assertEqual(scheduler.schedule("_Test Workstation 1", "2013-02-04 10:00:00", 60), None)
+
+		work_order = frappe._dict(name="_Test Work Order", qty=1, transfer_material_against="Work Order")
+		row = frappe._dict(operation="_Test Operation 1", workstation="_Test Workstation 1",
+			planned_start_time=get_datetime("2013-02-04 10:00:00"), time_in_mins=60)
+		self.assertRaises(CapacityError, create_job_card, work_order, row,
+			enable_capacity_planning=True, auto_create=True, scheduler=scheduler)
+
+def get_scheduler(timeline, plan_days=30):
+	"""A scheduler planning on `timeline` only, without gaps between operations"""
+	scheduler = CapacityScheduler(plan_days)
+	scheduler.mins_between_operations = datetime.timedelta(0)
+	scheduler.timelines[timeline.workstation] = timeline
+	return scheduler
@@ -0,0 +1,183 @@
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and Contributors
+# License: GNU General Public License v3. See license.txt
+
+from __future__ import unicode_literals
+
+import datetime
+from bisect import bisect_left, insort
+
+import frappe
+from frappe.utils import add_days, cint, get_datetime, getdate, to_timedelta
+
+from erpnext.manufacturing.doctype.manufacturing_settings.manufacturing_settings import get_mins_between_operations
+
+class WorkstationTimeline(object):
+	"""Jobs booked on a workstation, as (from time, to time) intervals sorted by from time.
+
+	The to time of each job is extended by the minutes between operations, so that the next
+	job on the workstation starts after the gap. Up to `production_capacity` jobs can run at
+	the same time."""
+	def __init__(self, workstation, production_capacity=1, working_hours=None, holidays=None):
+		self.workstation = workstation
+		self.production_capacity = cint(production_capacity) or 1
+		self.working_hours = working_hours or []
+		self.holidays = holidays or set()
+		self.jobs = []
+		self.max_length = datetime.timedelta(0)
+
+	def book(self, from_time, to_time):
+		insort(self.jobs, (from_time, to_time))
+		self.max_length = max(self.max_length, to_time - from_time)
+
+	def get_jobs_between(self, from_time, to_time=None):
+		"""Jobs running at some point after `from_time` (and before `to_time`)"""
+		# no job starting before this can still be running at from_time
+		start = bisect_left(self.jobs, (from_time - self.max_length,))
+		end = bisect_left(self.jobs, (to_time,)) if to_time else len(self.jobs)
+
+		return [d for d in self.jobs[start:end] if d[1] > from_time]
+
+	def get_free_window(self, from_time, to_time=None):
+		"""The first time after `from_time` when fewer jobs than the capacity are running, and
+		the time until which that stays so (None if for ever), before `to_time` if given"""
+		jobs = self.get_jobs_between(from_time, to_time)
+
+		points = sorted(set([from_time] + [t for d in jobs for t in d
+			if t > from_time and (not to_time or t < to_time)]))
+
+		window_start = None
+		for point in points:
+			running = len([d for d in jobs if d[0] <= point < d[1]])
+			if running < self.production_capacity:
+				if window_start is None:
+					window_start = point
+			elif window_start is not None:
+				return window_start, point
+
+		if window_start is None:
+			return None, None
+
+		return window_start, to_time
+
+	def get_working_hours(self, date):
+		return [(datetime.datetime.combine(date, datetime.time()) + start,
+			datetime.datetime.combine(date, datetime.time()) + end)
+			for start, end in self.working_hours if end > start]
+
+class CapacityScheduler(object):
+	"""Time slots for the operations of work orders on their workstations, found in memory.
+
+	The jobs already planned on the workstations, their working hours and holidays are read
+	once, and each slot booked is seen by the operations scheduled after it, so that all the
+	operations of one or many work orders can be planned in one pass."""
+	def __init__(self, plan_days=30):
+		settings = frappe.get_doc("Manufacturing Settings")
+
+		self.plan_days = cint(plan_days) or 30
+		self.mins_between_operations = get_mins_between_operations()
+		self.allow_overtime = cint(settings.allow_overtime)
+		self.allow_production_on_holidays = cint(settings.allow_production_on_holidays)
+		self.timelines = {}
+
+	def load(self, workstations, from_time):
+		"""Read the workstations not read yet and the jobs planned on them after `from_time`"""
+		workstations = tuple(set(d for d in workstations if d and d not in self.timelines))
+		if not workstations:
+			return
+
+		working_hours = {}
+		for parent, start_time, end_time in frappe.db.sql("""select parent, start_time, end_time
+			from `tabWorkstation Working Hour` where parent in %s order by parent, start_time""", [workstations]):
+				if start_time and end_time:
+					working_hours.setdefault(parent, []).append((to_timedelta(start_time), to_timedelta(end_time)))
+
+		details = frappe.db.sql("""select name, production_capacity, holiday_list
+			from `tabWorkstation` where name in %s""", [workstations], as_dict=1)
+
+		holidays = {}
+		holiday_lists = tuple(set(d.holiday_list for d in details if d.holiday_list))
+		if holiday_lists and not self.allow_production_on_holidays:
+			for parent, holiday_date in frappe.db.sql("""select parent, holiday_date from `tabHoliday`
+				where parent in %s and holiday_date >= %s""", (holiday_lists, getdate(from_time))):
+					holidays.setdefault(parent, set()).add(getdate(holiday_date))
+
+		for d in details:
+			self.timelines[d.name] = WorkstationTimeline(d.name, d.production_capacity,
+				[] if self.allow_overtime else working_hours.get(d.name), holidays.get(d.holiday_list))
+
+		for workstation, from_time, to_time in frappe.db.sql("""select jc.workstation, jctl.from_time, jctl.to_time
+			from `tabJob Card Time Log` jctl, `tabJob Card` jc
+			where jctl.parent = jc.name and jc.docstatus < 2 and jc.workstation in %s
+				and jctl.to_time > %s""", (workstations, get_datetime(from_time) - self.mins_between_operations)):
+				if from_time and to_time:
+					self.timelines[workstation].book(get_datetime(from_time),
+						get_datetime(to_time) + self.mins_between_operations)
+
+	def get_timeline(self, workstation, from_time):
+		self.load([workstation], from_time)
+		return self.timelines[workstation]
+
+	def schedule(self, workstation, from_time, time_in_mins):
+		"""Book the earliest time after `from_time` for a job of `time_in_mins` on the workstation
+		and return its time logs as (from time, to time), or None if there is no slot within the
+		capacity planning days"""
+		from_time = get_datetime(from_time)
+		timeline = self.get_timeline(workstation, from_time)
+
+		if timeline.working_hours:
+			time_logs = self.schedule_in_working_hours(timeline, from_time, time_in_mins)
+		else:
+			time_logs = self.schedule_continuously(timeline, from_time, time_in_mins)
+
+		for start, end in time_logs or []:
+			timeline.book(start, end + self.mins_between_operations)
+
+		return time_logs
+
+	def schedule_continuously(self, timeline, from_time, time_in_mins):
+		length = datetime.timedelta(minutes=time_in_mins)
+		limit = from_time + datetime.timedelta(days=self.plan_days + 1)
+
+		start = from_time
+		while start < limit:
+			window_start, window_end = timeline.get_free_window(start)
+			if window_start >= limit:
+				return
+
+			if window_end is None or window_end - window_start >= length:
+				return [(window_start, window_start + length)]
+
+			start = window_end
+
+	def schedule_in_working_hours(self, timeline, from_time, time_in_mins):
+		"""Split the job over the free time in the working hours of the days after `from_time`,
+		skipping holidays"""
+		remaining = datetime.timedelta(minutes=time_in_mins)
+		last_date = add_days(getdate(from_time), self.plan_days + 1)
+
+		time_logs = []
+		start = from_time
+		while remaining > datetime.timedelta(0):
+			date = getdate(start)
+			if date > last_date:
+				return
+
+			if date not in timeline.holidays:
+				for slot_start, slot_end in timeline.get_working_hours(date):
+					start = max(start, slot_start)
+					while start < slot_end and remaining > datetime.timedelta(0):
+						window_start, window_end = timeline.get_free_window(start, slot_end)
+						if window_start is None:
+							break
+
+						end = min(window_end, window_start + remaining)
+						time_logs.append((window_start, end))
+						remaining -= end - window_start
+						start = window_end
+
+					if remaining <= datetime.timedelta(0):
+						break
+
+			start = datetime.datetime.combine(add_days(date, 1), datetime.time())
+
+		return time_logs
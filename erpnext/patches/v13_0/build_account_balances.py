@@ -0,0 +1,13 @@
+# Copyright (c) 2020, Frappe and Contributors
+# License: GNU General Public License v3. See license.txt
+
+from __future__ import unicode_literals
+
+import frappe
+from erpnext.accounts.doctype.account_balance.account_balance import rebuild_account_balances
+
+def execute():
+	frappe.reload_doc("accounts", "doctype", "account_balance")
+
+	for company in frappe.db.sql_list("select name from `tabCompany`"):
+		rebuild_account_balances(company)
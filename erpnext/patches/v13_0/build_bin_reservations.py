@@ -0,0 +1,12 @@
+# Copyright (c) 2020, Frappe and Contributors
+# License: GNU General Public License v3. See license.txt
+
+from __future__ import unicode_literals
+
+import frappe
+from erpnext.stock.doctype.bin_reservation.bin_reservation import rebuild_bin_reservations
+
+def execute():
+	frappe.reload_doc("stock", "doctype", "bin_reservation")
+
+	rebuild_bin_reservations()
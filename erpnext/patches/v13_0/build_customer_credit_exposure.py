@@ -0,0 +1,13 @@
+# Copyright (c) 2020, Frappe and Contributors
+# License: GNU General Public License v3. See license.txt
+
+from __future__ import unicode_literals
+
+import frappe
+from erpnext.selling.doctype.customer_credit_exposure.customer_credit_exposure import rebuild_credit_exposure
+
+def execute():
+	frappe.reload_doc("selling", "doctype", "customer_credit_exposure_voucher")
+	frappe.reload_doc("selling", "doctype", "customer_credit_exposure")
+
+	rebuild_credit_exposure()
@@ -0,0 +1,12 @@
+# Copyright (c) 2020, Frappe and Contributors
+# License: GNU General Public License v3. See license.txt
+
+from __future__ import unicode_literals
+
+import frappe
+from erpnext.stock.doctype.stock_age_lot.stock_age_lot import rebuild_age_lots
+
+def execute():
+	frappe.reload_doc("stock", "doctype", "stock_age_lot")
+
+	rebuild_age_lots()
@@ -0,0 +1,12 @@
+# Copyright (c) 2020, Frappe and Contributors
+# License: GNU General Public License v3. See license.txt
+
+from __future__ import unicode_literals
+
+import frappe
+from erpnext.stock.doctype.stock_movement_summary.stock_movement_summary import rebuild_movement_summary
+
+def execute():
+	frappe.reload_doc("stock", "doctype", "stock_movement_summary")
+
+	rebuild_movement_summary()
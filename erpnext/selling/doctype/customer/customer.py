@@ -15,6 +15,7 @@ from frappe.contacts.address_and_contact import load_address_and_contact, delete
 from frappe.model.rename_doc import update_linked_doctypes
 from frappe.model.mapper import get_mapped_doc
 from frappe.utils.user import get_users_with_role
+from erpnext.selling.doctype.customer_credit_exposure.customer_credit_exposure import get_credit_exposure
 
 
 class Customer(TransactionBase):
@@ -421,6 +422,12 @@ def send_emails(args):
 	frappe.sendmail(recipients=[args.get('credit_controller_users_list')], subject=subject, message=message)
 
 def get_customer_outstanding(customer, company, ignore_outstanding_sales_order=False, cost_center=None):
+	if not cost_center and not frappe.flags.ignore_credit_exposure:
+		# maintained from GL Entries, Sales Orders and Delivery Notes as they are posted
+		exposure = get_credit_exposure(customer, company)
+		return flt(exposure.gl_balance) + flt(exposure.delivery_note_amount) \
+			+ (0.0 if ignore_outstanding_sales_order else flt(exposure.sales_order_amount))
+
 	# Outstanding based on GL Entries
 
 	cond = ""
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+from __future__ import unicode_literals
+import frappe
+from frappe import _
+from frappe.utils import flt, now
+from frappe.model.document import Document
+
+AMOUNT_FIELDS = ("gl_balance", "sales_order_amount", "delivery_note_amount")
+
+# amount field of the vouchers kept in the exposure
+VOUCHER_FIELDS = {
+	"Sales Order": "sales_order_amount",
+	"Delivery Note": "delivery_note_amount"
+}
+
+class CustomerCreditExposure(Document):
+	pass
+
+def get_credit_exposure(customer, company):
+	"""Amounts of `AMOUNT_FIELDS` owed and committed by the customer in the company"""
+	exposure = frappe.db.get_value("Customer Credit Exposure", {"customer": customer, "company": company},
+		list(AMOUNT_FIELDS), as_dict=1)
+
+	return exposure or frappe._dict({field: 0.0 for field in AMOUNT_FIELDS})
+
+def get_exposure_name(customer, company):
+	"""Name of the exposure of the customer, locked for the transaction, created if missing"""
+	name = frappe.db.sql("""select name from `tabCustomer Credit Exposure`
+		where customer=%s and company=%s for update""", (customer, company))
+
+	if name:
+		return name[0][0]
+
+	return insert_exposures([(customer, company, 0.0, 0.0, 0.0)])[0]
+
+def insert_exposures(values):
+	"""`values` are rows of customer, company and amount fields"""
+	fields = ["name", "creation", "modified", "owner", "modified_by", "docstatus",
+		"customer", "company"] + list(AMOUNT_FIELDS)
+
+	timestamp, names = now(), []
+	for i in range(0, len(values), 1000):
+		rows = []
+		for d in values[i:i + 1000]:
+			names.append(frappe.generate_hash(length=10))
+			rows.append([names[-1], timestamp, timestamp, "Administrator", "Administrator", 0] + list(d))
+
+		frappe.db.bulk_insert("Customer Credit Exposure", fields, rows)
+
+	return names
+
+def add_to_exposure(name, field, amount):
+	frappe.db.sql("""update `tabCustomer Credit Exposure`
+		set `{0}` = ifnull(`{0}`, 0) + %s where name = %s""".format(field), (amount, name))
+
+def update_gl_exposure(gl_entries, reverse=False):
+	"""Add the debit less credit of posted `gl_entries` of customers to their exposure,
+	or subtract it if `reverse`"""
+	amounts = {}
+	for gle in gl_entries:
+		if gle.get("party_type") == "Customer" and gle.get("party"):
+			key = (gle.get("party"), gle.get("company"))
+			amounts[key] = amounts.get(key, 0.0) \
+				+ (flt(gle.get("debit")) - flt(gle.get("credit"))) * (-1 if reverse else 1)
+
+	for key in sorted(amounts):
+		if amounts[key]:
+			add_to_exposure(get_exposure_name(*key), "gl_balance", amounts[key])
+
+def update_voucher_exposure(voucher_type, voucher_no):
+	"""Recompute what a Sales Order or Delivery Note adds to the exposure of its customer
+	and apply the difference with the amount recorded last time"""
+	field = VOUCHER_FIELDS[voucher_type]
+
+	amount = 0.0
+	customer, company = frappe.db.get_value(voucher_type, voucher_no, ["customer", "company"])
+	for d in voucher_queries[voucher_type](frappe._dict(voucher_no=voucher_no)):
+		amount = flt(d[3])
+
+	previous = frappe.db.sql("""select name, parent, amount from `tabCustomer Credit Exposure Voucher`
+		where voucher_type=%s and voucher_no=%s for update""", (voucher_type, voucher_no), as_dict=1)
+	previous = previous[0] if previous else None
+
+	if previous and flt(previous.amount) == amount:
+		return
+
+	if previous:
+		add_to_exposure(previous.parent, field, -flt(previous.amount))
+		frappe.db.sql("""delete from `tabCustomer Credit Exposure Voucher` where name=%s""", previous.name)
+
+	if amount:
+		name = get_exposure_name(customer, company)
+		add_to_exposure(name, field, amount)
+		insert_exposure_vouchers([(name, voucher_type, voucher_no, amount)])
+
+def insert_exposure_vouchers(values):
+	"""`values` are rows of exposure name, voucher type, voucher no and amount"""
+	fields = ["name", "creation", "modified", "owner", "modified_by", "docstatus",
+		"parent", "parenttype", "parentfield", "voucher_type", "voucher_no", "amount"]
+
+	timestamp = now()
+	for i in range(0, len(values), 1000):
+		frappe.db.bulk_insert("Customer Credit Exposure Voucher", fields, [
+			[frappe.generate_hash(length=10), timestamp, timestamp, "Administrator", "Administrator", 0,
+				parent, "Customer Credit Exposure", "vouchers", voucher_type, voucher_no, amount]
+			for parent, voucher_type, voucher_no, amount in values[i:i + 1000]])
+
+def get_conditions(filters, table):
+	conditions = ""
+	for field, column in (("voucher_no", "name"), ("customer", "customer"), ("company", "company")):
+		if filters.get(field):
+			conditions += " and {0}.{1} = %({2})s".format(table, column, field)
+
+	return conditions
+
+def get_sales_order_amounts(filters):
+	return frappe.db.sql("""
+		select so.name, so.customer, so.company, so.base_grand_total * (100 - so.per_billed) / 100
+		from `tabSales Order` so
+		where so.docstatus = 1 and so.per_billed < 100 and so.status != 'Closed' {0}
+		""".format(get_conditions(filters, "so")), filters)
+
+def get_delivery_note_amounts(filters):
+	# items billed in part count for the part of their amount not billed yet
+	return frappe.db.sql("""
+		select name, customer, company, sum((amount - billed_amount) / base_net_total * base_grand_total)
+		from (
+			select dn.name, dn.customer, dn.company, dn.base_net_total, dn.base_grand_total, dn_item.amount,
+				ifnull((select sum(si_item.amount) from `tabSales Invoice Item` si_item
+					where si_item.dn_detail = dn_item.name and si_item.docstatus = 1), 0) as billed_amount
+			from `tabDelivery Note` dn, `tabDelivery Note Item` dn_item
+			where dn.name = dn_item.parent and dn.docstatus = 1 and dn.status not in ('Closed', 'Stopped')
+				and ifnull(dn_item.against_sales_order, '') = ''
+				and ifnull(dn_item.against_sales_invoice, '') = ''
+				and ifnull(dn.base_net_total, 0) != 0 {0}
+		) dn_items
+		where amount > billed_amount
+		group by name, customer, company""".format(get_conditions(filters, "dn")), filters)
+
+voucher_queries = {
+	"Sales Order": get_sales_order_amounts,
+	"Delivery Note": get_delivery_note_amounts
+}
+
+def get_gl_balances(filters):
+	conditions = ""
+	if filters.get("customer"):
+		conditions += " and party = %(customer)s"
+	if filters.get("company"):
+		conditions += " and company = %(company)s"
+
+	return frappe.db.sql("""
+		select party, company, sum(debit) - sum(credit)
+		from `tabGL Entry`
+		where party_type = 'Customer' and ifnull(party, '') != '' {0}
+		group by party, company""".format(conditions), filters)
+
+def get_exposures_from_vouchers(customer=None, company=None):
+	"""Exposure of customers computed from GL Entries and open vouchers,
+	as a dict of (customer, company) to amounts and a list of voucher amounts"""
+	filters = frappe._dict(customer=customer, company=company)
+
+	exposures = {}
+	def get_exposure(key):
+		return exposures.setdefault(key, frappe._dict(vouchers=[],
+			**{field: 0.0 for field in AMOUNT_FIELDS}))
+
+	for party, party_company, amount in get_gl_balances(filters):
+		get_exposure((party, party_company)).gl_balance = flt(amount)
+
+	for voucher_type, field in VOUCHER_FIELDS.items():
+		for voucher_no, voucher_customer, voucher_company, amount in voucher_queries[voucher_type](filters):
+			if flt(amount):
+				exposure = get_exposure((voucher_customer, voucher_company))
+				exposure[field] += flt(amount)
+				exposure.vouchers.append((voucher_type, voucher_no, flt(amount)))
+
+	return exposures
+
+def rebuild_credit_exposure(customer=None, company=None):
+	"""Recompute the exposure of a customer and / or company (or of all customers)
+	from GL Entries and open Sales Orders and Delivery Notes"""
+	filters = frappe._dict(customer=customer, company=company)
+	conditions = get_conditions(filters, "`tabCustomer Credit Exposure`")
+
+	frappe.db.sql("""delete from `tabCustomer Credit Exposure Voucher` where parent in (
+		select name from `tabCustomer Credit Exposure` where 1=1 {0})""".format(conditions), filters)
+	frappe.db.sql("""delete from `tabCustomer Credit Exposure` where 1=1 {0}""".format(conditions), filters)
+
+	exposures = get_exposures_from_vouchers(customer, company)
+	keys = sorted(exposures)
+	names = insert_exposures([list(key) + [exposures[key].get(field) for field in AMOUNT_FIELDS]
+		for key in keys])
+
+	insert_exposure_vouchers([(name,) + voucher
+		for name, key in zip(names, keys) for voucher in exposures[key].vouchers])
+
+def get_exposure_drift(customer=None, company=None):
+	"""Customers whose maintained exposure differs from their GL Entries and open vouchers,
+	as a list of ((customer, company), maintained amounts, expected amounts)"""
+	expected = {key: [d.get(field) for field in AMOUNT_FIELDS]
+		for key, d in get_exposures_from_vouchers(customer, company).items()}
+
+	filters = {}
+	if customer: filters["customer"] = customer
+	if company: filters["company"] = company
+
+	maintained = {}
+	for d in frappe.get_all("Customer Credit Exposure", fields=["customer", "company"] + list(AMOUNT_FIELDS),
+		filters=filters):
+			maintained[(d.customer, d.company)] = [d.get(field) for field in AMOUNT_FIELDS]
+
+	drift = []
+	for key in sorted(set(expected) | set(maintained)):
+		expected_amounts = [flt(d, 6) for d in expected.get(key) or [0] * len(AMOUNT_FIELDS)]
+		maintained_amounts = [flt(d, 6) for d in maintained.get(key) or [0] * len(AMOUNT_FIELDS)]
+		if expected_amounts != maintained_amounts:
+			drift.append((key, maintained_amounts, expected_amounts))
+
+	return drift
+
+def verify_credit_exposure():
+	"""Daily check that the maintained exposure still matches GL Entries and open vouchers"""
+	drift = get_exposure_drift()
+	if drift:
+		frappe.log_error(title=_("Customer Credit Exposure Drift"), message="\n".join(
+			"{0}: {1} != {2}".format(", ".join(key), maintained, expected)
+			for key, maintained, expected in drift))
+
+def merge_credit_exposures(doc, method=None, old=None, new=None, merge=False):
+	"""`before_rename` of Customer. Merging rewrites the customer of the exposures with a plain
+	update, which would give `new` two exposures in a company. The exposures of `old` are added
+	to those of `new` in the companies where it has one, and its vouchers moved over, first."""
+	if not merge:
+		return
+
+	exposures = frappe.db.sql("""select old.name as old_name, new.name as new_name, {0}
+		from `tabCustomer Credit Exposure` old, `tabCustomer Credit Exposure` new
+		where old.customer = %s and new.customer = %s and new.company = old.company
+		for update""".format(", ".join("old.{0}".format(field) for field in AMOUNT_FIELDS)),
+		(old, new), as_dict=1)
+
+	for d in exposures:
+		frappe.db.sql("""update `tabCustomer Credit Exposure` set {0} where name = %s""".format(
+			", ".join("`{0}` = ifnull(`{0}`, 0) + %s".format(field) for field in AMOUNT_FIELDS)),
+			tuple(flt(d.get(field)) for field in AMOUNT_FIELDS) + (d.new_name,))
+
+		frappe.db.sql("""update `tabCustomer Credit Exposure Voucher` set parent = %s
+			where parent = %s""", (d.new_name, d.old_name))
+		frappe.db.sql("""delete from `tabCustomer Credit Exposure` where name = %s""", d.old_name)
+
+def on_doctype_update():
+	frappe.db.add_unique("Customer Credit Exposure", ["customer", "company"],
+		constraint_name="unique_customer_credit_exposure")
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and Contributors
+# See license.txt
+from __future__ import unicode_literals
+
+import frappe
+import unittest
+from erpnext.selling.doctype.customer.customer import get_customer_outstanding
+from erpnext.selling.doctype.sales_order.test_sales_order import make_sales_order
+from erpnext.selling.doctype.sales_order.sales_order import make_sales_invoice
+from erpnext.stock.doctype.delivery_note.test_delivery_note import create_delivery_note
+from erpnext.stock.doctype.delivery_note.delivery_note import make_sales_invoice as make_sales_invoice_from_dn
+from erpnext.selling.doctype.customer_credit_exposure.customer_credit_exposure import (rebuild_credit_exposure,
+	get_exposure_drift)
+
+class TestCustomerCreditExposure(unittest.TestCase):
+	def setUp(self):
+		self.customer, self.company = "_Test Customer 2", "_Test Company"
+		rebuild_credit_exposure(self.customer, self.company)
+
+	def test_exposure_matches_vouchers(self):
+		so = make_sales_order(customer=self.customer, qty=5)
+		si = make_sales_invoice(so.name)
+		si.get("items")[0].qty = 2
+		si.insert()
+		si.submit()
+
+		make_sales_order(customer=self.customer, qty=3).update_status("Closed")
+
+		dn = create_delivery_note(customer=self.customer, qty=4)
+		si = make_sales_invoice_from_dn(dn.name)
+		si.get("items")[0].qty = 1
+		si.insert()
+		si.submit()
+		si.cancel()
+
+		self.assertEqual(get_exposure_drift(self.customer, self.company), [])
+
+		for ignore_outstanding_sales_order in (False, True):
+			self.assertAlmostEqual(
+				get_customer_outstanding(self.customer, self.company, ignore_outstanding_sales_order),
+				get_outstanding_from_vouchers(self.customer, self.company, ignore_outstanding_sales_order), 6)
+
+	def test_drift_is_reported(self):
+		make_sales_order(customer=self.customer, qty=1)
+		frappe.db.sql("""update `tabCustomer Credit Exposure` set sales_order_amount = sales_order_amount + 1
+			where customer = %s and company = %s""", (self.customer, self.company))
+
+		self.assertTrue(get_exposure_drift(self.customer, self.company))
+
+		rebuild_credit_exposure(self.customer, self.company)
+		self.assertEqual(get_exposure_drift(self.customer, self.company), [])
+
+	def test_exposures_folded_on_merge(self):
+		customers = []
+		for customer_name in ("_Test Merged Exposure Customer", "_Test Merge Into Exposure Customer"):
+			if not frappe.db.exists("Customer", customer_name):
+				frappe.get_doc({
+					"doctype": "Customer",
+					"customer_name": customer_name,
+					"customer_group": "_Test Customer Group",
+					"territory": "_Test Territory"
+				}).insert()
+
+			customers.append(customer_name)
+			make_sales_order(customer=customer_name, qty=1)
+
+		frappe.rename_doc("Customer", customers[0], customers[1], merge=True)
+
+		self.assertFalse(frappe.db.exists("Customer Credit Exposure", {"customer": customers[0]}))
+		self.assertEqual(get_exposure_drift(customers[1], self.company), [])
+
+def get_outstanding_from_vouchers(customer, company, ignore_outstanding_sales_order):
+	frappe.flags.ignore_credit_exposure = True
+	try:
+		return get_customer_outstanding(customer, company, ignore_outstanding_sales_order)
+	finally:
+		frappe.flags.ignore_credit_exposure = False
@@ -10,7 +10,7 @@ from frappe import _
 from six import string_types
 from frappe.model.utils import get_fetch_values
 from frappe.model.mapper import get_mapped_doc
-from erpnext.stock.stock_balance import update_bin_qty, get_reserved_qty
+from erpnext.stock.doctype.bin_reservation.bin_reservation import update_bin_reservations
 from frappe.desk.notifications import clear_doctype_notifications
 from frappe.contacts.doctype.address.address import get_company_address
 from erpnext.controllers.selling_controller import SellingController
@@ -167,6 +167,7 @@ class SalesOrder(SellingController):
 				frappe.throw(_("Row #{0}: Set Supplier for item {1}").format(d.idx, d.item_code))
 
 	def on_submit(self):
+		self.update_credit_exposure()
 		self.check_credit_limit()
 		self.update_reserved_qty()
 
@@ -194,6 +195,7 @@ class SalesOrder(SellingController):
 		self.update_prevdoc_status('cancel')
 
 		frappe.db.set(self, 'status', 'Cancelled')
+		self.update_credit_exposure()
 
 		self.update_blanket_order()
 
@@ -290,26 +292,9 @@ class SalesOrder(SellingController):
 		clear_doctype_notifications(self)
 
 	def update_reserved_qty(self, so_item_rows=None):
-		"""update requested qty (before ordered_qty is updated)"""
-		item_wh_list = []
-		def _valid_for_reserve(item_code, warehouse):
-			if item_code and warehouse and [item_code, warehouse] not in item_wh_list \
-				and frappe.get_cached_value("Item", item_code, "is_stock_item"):
-					item_wh_list.append([item_code, warehouse])
-
-		for d in self.get("items"):
-			if (not so_item_rows or d.name in so_item_rows) and not d.delivered_by_supplier:
-				if self.has_product_bundle(d.item_code):
-					for p in self.get("packed_items"):
-						if p.parent_detail_docname == d.name and p.parent_item == d.item_code:
-							_valid_for_reserve(p.item_code, p.warehouse)
-				else:
-					_valid_for_reserve(d.item_code, d.warehouse)
-
-		for item_code, warehouse in item_wh_list:
-			update_bin_qty(item_code, warehouse, {
-				"reserved_qty": get_reserved_qty(item_code, warehouse)
-			})
+		"""update reserved qty in bins by the change in what this order reserves,
+		all its rows are compared so `so_item_rows` is not needed anymore"""
+		update_bin_reservations(self.doctype, self.name, ["reserved_qty"])
 
 	def on_update(self):
 		pass
@@ -993,7 +978,7 @@ def make_raw_material_request(items, company, sales_order, project=None):
 	))
 	for item in raw_materials:
 		item_doc = frappe.get_cached_doc('Item', item.get('item_code'))
-		schedule_date = add_days(nowdate(), cint(item_doc.lead_time_days))
+		schedule_date = item.get('schedule_date') or add_days(nowdate(), cint(item_doc.lead_time_days))
 		material_request.append('items', {
 		'item_code': item.get('item_code'),
 		'qty': item.get('quantity'),
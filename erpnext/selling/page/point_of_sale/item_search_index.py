@@ -0,0 +1,258 @@
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and Contributors
+# License: GNU General Public License v3. See license.txt
+
+from __future__ import unicode_literals
+
+import json
+import re
+import time
+
+import frappe
+from frappe.utils import add_to_date, cint, flt, now
+
+# indexes loaded by this process, by site
+_indexes = {}
+
+# seconds between two checks for changes made since the index was loaded
+REFRESH_INTERVAL = 5
+
+# changes are read again for this many seconds before the last check, to see the rows of
+# transactions that were still running then
+REFRESH_OVERLAP = 60
+
+# items are found by the first characters of the words of their code and name
+PREFIX_LENGTH = 3
+
+class ItemSearchIndex(object):
+	"""Items sold in the Point of Sale with their barcodes, prices and stock, searched in
+	memory instead of with LIKE queries. Items are looked up by the prefixes of the words of
+	their code and name, serial nos and batches are read from the database when searched.
+
+	Loaded once per process, then kept up to date with the rows modified since the last
+	refresh, read on the index of `modified`. Bins are saved with each stock ledger posting."""
+	def __init__(self):
+		self.items = {}
+		self.search_text = {}
+		self.prefixes = {}
+		self.item_barcodes = {}
+		self.barcodes = {}
+		self.prices = {}
+		self.bins = {}
+		self.group_ancestors = {}
+		self.group_key = None
+		self.refreshed_on = None
+		self.checked_at = 0
+
+		self.load()
+
+	def load(self):
+		self.refreshed_on = now()
+		self.checked_at = time.time()
+
+		self.load_item_groups()
+		self.load_items()
+		self.load_prices()
+		self.load_bins()
+
+	def refresh(self):
+		"""Apply the changes made since the last refresh, at most every `REFRESH_INTERVAL` seconds"""
+		if time.time() - self.checked_at < REFRESH_INTERVAL and not frappe.flags.in_test:
+			return
+
+		since = add_to_date(self.refreshed_on, seconds=-REFRESH_OVERLAP, as_string=True, as_datetime=True)
+		self.refreshed_on = now()
+		self.checked_at = time.time()
+
+		self.load_item_groups()
+
+		for d in get_deleted_documents(["Item", "Item Price"], since):
+			if d.doctype == "Item":
+				self.remove_item(d.name)
+			else:
+				self.prices.pop((d.price_list, d.item_code), None)
+
+		item_codes = get_modified("Item", "name", since)
+		if item_codes:
+			self.load_items(item_codes)
+
+		prices = get_modified("Item Price", "name", since)
+		if prices:
+			self.load_prices(prices)
+
+		stock_items = list(set(get_modified("Bin", "item_code", since)))
+		if stock_items:
+			self.load_bins(stock_items)
+
+	def load_item_groups(self):
+		key = tuple(frappe.db.sql("""select count(*), max(modified) from `tabItem Group`""")[0])
+		if key == self.group_key:
+			return
+
+		groups = frappe.db.sql("""select name, lft, rgt from `tabItem Group`""", as_dict=1)
+		self.group_ancestors = {d.name: set(g.name for g in groups if g.lft <= d.lft and g.rgt >= d.rgt)
+			for d in groups}
+		self.group_key = key
+
+	def load_items(self, item_codes=None):
+		for item_code in item_codes or []:
+			self.remove_item(item_code)
+
+		condition, values = get_name_condition("name", item_codes)
+		for d in frappe.db.sql("""
+			select
+				name as item_code, item_name, stock_uom, image as item_image, idx, is_stock_item, item_group
+			from `tabItem`
+			where disabled = 0 and has_variants = 0 and is_sales_item = 1 {0}""".format(condition),
+			values, as_dict=1):
+				self.add_item(d)
+
+		condition, values = get_name_condition("parent", item_codes)
+		for d in frappe.db.sql("""select parent, barcode from `tabItem Barcode`
+			where parenttype = 'Item' {0}""".format(condition), values, as_dict=1):
+				self.barcodes[d.barcode] = d.parent
+				self.item_barcodes.setdefault(d.parent, []).append(d.barcode)
+
+	def add_item(self, item):
+		self.items[item.item_code] = item
+		self.search_text[item.item_code] = text = (item.item_code.lower(), (item.item_name or "").lower())
+
+		for prefix in get_prefixes(" ".join(text)):
+			self.prefixes.setdefault(prefix, set()).add(item.item_code)
+
+	def remove_item(self, item_code):
+		self.items.pop(item_code, None)
+		text = self.search_text.pop(item_code, None)
+		for barcode in self.item_barcodes.pop(item_code, []):
+			self.barcodes.pop(barcode, None)
+
+		for prefix in get_prefixes(" ".join(text)) if text else []:
+			item_codes = self.prefixes.get(prefix)
+			if item_codes is not None:
+				item_codes.discard(item_code)
+				if not item_codes:
+					del self.prefixes[prefix]
+
+	def get_candidates(self, search_value):
+		"""Items with a word starting like each word of `search_value`, all items if it has no words"""
+		candidates = None
+		for word in get_words(search_value.lower()):
+			item_codes = self.prefixes.get(word[:PREFIX_LENGTH]) or set()
+			candidates = item_codes if candidates is None else candidates & item_codes
+			if not candidates:
+				return set()
+
+		return self.items if candidates is None else candidates
+
+	def load_prices(self, names=None):
+		condition, values = get_name_condition("name", names)
+		for d in frappe.db.sql("""select price_list, item_code, price_list_rate, currency from `tabItem Price`
+			where 1=1 {0}""".format(condition), values, as_dict=1):
+				self.prices[(d.price_list, d.item_code)] = d
+
+	def load_bins(self, item_codes=None):
+		for item_code in item_codes or []:
+			self.bins.pop(item_code, None)
+
+		condition, values = get_name_condition("item_code", item_codes)
+		for d in frappe.db.sql("""select item_code, warehouse, actual_qty from `tabBin`
+			where 1=1 {0}""".format(condition), values, as_dict=1):
+				self.bins.setdefault(d.item_code, {})[d.warehouse] = flt(d.actual_qty)
+
+	def search_number(self, search_value):
+		"""Barcode, serial no or batch no `search_value` is, like `search_serial_or_batch_or_barcode_number`"""
+		if search_value in self.barcodes:
+			return {"barcode": search_value, "item_code": self.barcodes[search_value]}
+
+		item_code = frappe.db.get_value("Serial No", search_value, "item_code")
+		if item_code:
+			return {"serial_no": search_value, "item_code": item_code}
+
+		item_code = frappe.db.get_value("Batch", search_value, "item")
+		if item_code:
+			return {"batch_no": search_value, "item_code": item_code}
+
+		return {}
+
+	def get_actual_qty(self, item_code, warehouse, in_stock_only):
+		qty = [qty for wh, qty in (self.bins.get(item_code) or {}).items()
+			if (not warehouse or wh == warehouse) and (not in_stock_only or qty > 0)]
+
+		return sum(qty) if qty else None
+
+	def search(self, search_value, item_group, item_groups=None, exact=False):
+		"""Items in `item_group` (and in one of `item_groups`, if given) matching `search_value`,
+		best matches first: same code, code starting with it, name starting with it, then
+		code or name containing it, from a word of it on"""
+		search_value = search_value or ""
+		if exact:
+			item_codes = [search_value] if search_value in self.items else []
+		else:
+			item_codes = self.get_candidates(search_value)
+
+		search_value = search_value.lower()
+
+		results = []
+		for item_code in item_codes:
+			item = self.items[item_code]
+			ancestors = self.group_ancestors.get(item.item_group) or ()
+			if item_group not in ancestors or (item_groups and not ancestors & item_groups):
+				continue
+
+			code, name = self.search_text[item_code]
+			if exact:
+				rank = 0 if code == search_value else None
+			elif not search_value or code == search_value:
+				rank = 0
+			elif code.startswith(search_value):
+				rank = 1
+			elif name.startswith(search_value):
+				rank = 2
+			elif search_value in code or search_value in name:
+				rank = 3
+			else:
+				rank = None
+
+			if rank is not None:
+				results.append((rank, -cint(item.idx), item_code))
+
+		results.sort()
+		return [self.items[d[2]] for d in results]
+
+def get_name_condition(fieldname, names):
+	if names is None:
+		return "", ()
+
+	return "and {0} in %s".format(fieldname), [tuple(names)]
+
+def get_words(text):
+	return [d for d in re.split(r"[\W_]+", text or "", flags=re.UNICODE) if d]
+
+def get_prefixes(text):
+	"""Prefixes of the words of `text`, up to `PREFIX_LENGTH` characters"""
+	return set(word[:i] for word in get_words(text) for i in range(1, min(len(word), PREFIX_LENGTH) + 1))
+
+def get_modified(doctype, fieldname, since):
+	return frappe.db.sql_list("""select {0} from `tab{1}` where modified >= %s""".format(fieldname, doctype), since)
+
+def get_deleted_documents(doctypes, since):
+	deleted = []
+	for d in frappe.db.sql("""select deleted_doctype, data from `tabDeleted Document`
+		where deleted_doctype in %s and modified >= %s""", (tuple(doctypes), since), as_dict=1):
+			doc = frappe._dict(json.loads(d.data))
+			doc.doctype = d.deleted_doctype
+			deleted.append(doc)
+
+	return deleted
+
+def get_item_search_index():
+	"""Index of the current site, loaded on first use and then refreshed with recent changes"""
+	index = _indexes.get(frappe.local.site)
+	if not index:
+		index = _indexes[frappe.local.site] = ItemSearchIndex()
+	else:
+		index.refresh()
+
+	return index
+
+def clear_item_search_index():
+	_indexes.pop(frappe.local.site, None)
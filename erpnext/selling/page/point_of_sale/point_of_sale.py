@@ -6,6 +6,8 @@ import frappe, json
 from frappe.utils.nestedset import get_root_of
 from frappe.utils import cint
 from erpnext.accounts.doctype.pos_profile.pos_profile import get_item_groups
+from erpnext.accounts.doctype.sales_invoice.pos import get_child_nodes
+from erpnext.selling.page.point_of_sale.item_search_index import get_item_search_index
 
 from six import string_types
 
@@ -21,6 +23,10 @@ def get_items(start, page_length, price_list, item_group, search_value="", pos_p
 	if not frappe.db.exists('Item Group', item_group):
 		item_group = get_root_of('Item Group')
 
+	if not frappe.flags.disable_item_search_index:
+		return get_items_from_index(cint(start), cint(page_length), price_list, item_group, search_value,
+			pos_profile, warehouse, display_items_in_stock)
+
 	if search_value:
 		data = search_serial_or_batch_or_barcode_number(search_value)
 
@@ -133,6 +139,45 @@ def get_items(start, page_length, price_list, item_group, search_value="", pos_p
 
 	return res
 
+def get_items_from_index(start, page_length, price_list, item_group, search_value, pos_profile,
+	warehouse, display_items_in_stock):
+	"""Same as the queries of `get_items`, looked up in the item search index and ranked by closest match"""
+	index = get_item_search_index()
+
+	data = index.search_number(search_value) if search_value else {}
+
+	item_groups = None
+	if pos_profile:
+		item_groups = set()
+		for d in frappe.get_cached_doc('POS Profile', pos_profile).get('item_groups'):
+			item_groups.update(g.name for g in get_child_nodes('Item Group', d.item_group))
+
+	result = []
+	for item in index.search(data.get("item_code") or search_value, item_group, item_groups, exact=bool(data)):
+		item_stock_qty = index.get_actual_qty(item.item_code, warehouse, display_items_in_stock)
+		if display_items_in_stock and not item_stock_qty:
+			continue
+
+		item_price = index.prices.get((price_list, item.item_code)) or {}
+
+		row = {}
+		row.update(item)
+		row.pop('item_group')
+		row.update({
+			'price_list_rate': item_price.get('price_list_rate'),
+			'currency': item_price.get('currency'),
+			'actual_qty': item_stock_qty,
+		})
+		result.append(row)
+
+	res = {
+		'items': result[start:start + page_length]
+	}
+	res.update(data)
+	res.pop('item_code', None)
+
+	return res
+
 @frappe.whitelist()
 def search_serial_or_batch_or_barcode_number(search_value):
 	# search barcode no
@@ -65,69 +65,18 @@ class Bin(Document):
 	def update_reserved_qty_for_production(self):
 		'''Update qty reserved for production from Production Item tables
 			in open work orders'''
-		self.reserved_qty_for_production = frappe.db.sql('''
-			SELECT
-				CASE WHEN ifnull(skip_transfer, 0) = 0 THEN
-					SUM(item.required_qty - item.transferred_qty)
-				ELSE
-					SUM(item.required_qty - item.consumed_qty)
-				END
-			FROM `tabWork Order` pro, `tabWork Order Item` item
-			WHERE
-				item.item_code = %s
-				and item.parent = pro.name
-				and pro.docstatus = 1
-				and item.source_warehouse = %s
-				and pro.status not in ("Stopped", "Completed")
-				and (item.required_qty > item.transferred_qty or item.required_qty > item.consumed_qty)
-		''', (self.item_code, self.warehouse))[0][0]
-
-		self.set_projected_qty()
-
-		self.db_set('reserved_qty_for_production', flt(self.reserved_qty_for_production))
-		self.db_set('projected_qty', self.projected_qty)
+		self.rebuild_reservations(["reserved_qty_for_production"])
 
 	def update_reserved_qty_for_sub_contracting(self):
-		#reserved qty
-		reserved_qty_for_sub_contract = frappe.db.sql('''
-			select ifnull(sum(itemsup.required_qty),0)
-			from `tabPurchase Order` po, `tabPurchase Order Item Supplied` itemsup
-			where
-				itemsup.rm_item_code = %s
-				and itemsup.parent = po.name
-				and po.docstatus = 1
-				and po.is_subcontracted = 'Yes'
-				and po.status != 'Closed'
-				and po.per_received < 100
-				and itemsup.reserve_warehouse = %s''', (self.item_code, self.warehouse))[0][0]
-
-		#Get Transferred Entries
-		materials_transferred = frappe.db.sql("""
-			select
-				ifnull(sum(transfer_qty),0)
-			from
-				`tabStock Entry` se, `tabStock Entry Detail` sed, `tabPurchase Order` po
-			where
-				se.docstatus=1
-				and se.purpose='Send to Subcontractor'
-				and ifnull(se.purchase_order, '') !=''
-				and (sed.item_code = %(item)s or sed.original_item = %(item)s)
-				and se.name = sed.parent
-				and se.purchase_order = po.name
-				and po.docstatus = 1
-				and po.is_subcontracted = 'Yes'
-				and po.status != 'Closed'
-				and po.per_received < 100
-		""", {'item': self.item_code})[0][0]
-
-		if reserved_qty_for_sub_contract > materials_transferred:
-			reserved_qty_for_sub_contract = reserved_qty_for_sub_contract - materials_transferred
-		else:
-			reserved_qty_for_sub_contract = 0
+		'''Update qty reserved for raw materials of open subcontracted purchase orders,
+			less what has been sent to the subcontractor'''
+		self.rebuild_reservations(["reserved_qty_for_sub_contract"])
 
-		self.db_set('reserved_qty_for_sub_contract', reserved_qty_for_sub_contract)
-		self.set_projected_qty()
-		self.db_set('projected_qty', self.projected_qty)
+	def rebuild_reservations(self, qty_fields):
+		from erpnext.stock.doctype.bin_reservation.bin_reservation import rebuild_bin_reservations
+
+		rebuild_bin_reservations(self.item_code, self.warehouse, qty_fields)
+		self.reload()
 
 def on_doctype_update():
 	frappe.db.add_index("Bin", ["item_code", "warehouse"])
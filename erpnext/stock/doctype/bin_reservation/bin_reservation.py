@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+from __future__ import unicode_literals
+import frappe
+from frappe import _
+from frappe.utils import flt, now
+from frappe.model.document import Document
+
+# Bin qty fields maintained from vouchers: voucher type, sign in projected qty
+RESERVATION_FIELDS = {
+	"reserved_qty": ("Sales Order", -1),
+	"ordered_qty": ("Purchase Order", 1),
+	"indented_qty": ("Material Request", 1),
+	"planned_qty": ("Work Order", 1),
+	"reserved_qty_for_production": ("Work Order", -1),
+	"reserved_qty_for_sub_contract": ("Purchase Order", -1)
+}
+
+class BinReservation(Document):
+	pass
+
+def update_bin_reservations(voucher_type, voucher_no, qty_fields):
+	"""Recompute what `voucher_no` adds to the Bin `qty_fields` and apply the
+	difference with the last recorded rows to the Bins, instead of summing up
+	all open vouchers of each item and warehouse again"""
+	for qty_field in qty_fields:
+		new_rows = {}
+		for d in get_reservations(qty_field, voucher_no=voucher_no):
+			if flt(d[3]):
+				new_rows[(d[1], d[2])] = flt(d[3])
+
+		old_rows = {(d[0], d[1]): flt(d[2]) for d in frappe.db.sql("""
+			select item_code, warehouse, qty from `tabBin Reservation`
+			where voucher_type=%s and voucher_no=%s and qty_field=%s
+			for update""", (voucher_type, voucher_no, qty_field))}
+
+		if new_rows == old_rows:
+			continue
+
+		for item_code, warehouse in sorted(set(new_rows) | set(old_rows)):
+			delta = new_rows.get((item_code, warehouse), 0.0) - old_rows.get((item_code, warehouse), 0.0)
+			if delta:
+				add_to_bin(item_code, warehouse, qty_field, delta)
+
+		frappe.db.sql("""delete from `tabBin Reservation`
+			where voucher_type=%s and voucher_no=%s and qty_field=%s""", (voucher_type, voucher_no, qty_field))
+
+		insert_reservations(qty_field, [(voucher_no, item_code, warehouse, qty)
+			for (item_code, warehouse), qty in new_rows.items()])
+
+def add_to_bin(item_code, warehouse, qty_field, delta):
+	from erpnext.stock.utils import get_bin
+
+	sign = RESERVATION_FIELDS[qty_field][1]
+	bin_name = get_bin(item_code, warehouse).name
+
+	frappe.db.sql("""update `tabBin`
+		set `{0}` = ifnull(`{0}`, 0) + %s, projected_qty = ifnull(projected_qty, 0) + %s
+		where name = %s""".format(qty_field), (delta, sign * delta, bin_name))
+
+	frappe.clear_document_cache("Bin", bin_name)
+
+def insert_reservations(qty_field, values):
+	"""`values` are rows of voucher no, item code, warehouse and qty"""
+	fields = ["name", "creation", "modified", "owner", "modified_by", "docstatus",
+		"voucher_type", "voucher_no", "item_code", "warehouse", "qty_field", "qty"]
+
+	voucher_type = RESERVATION_FIELDS[qty_field][0]
+	timestamp = now()
+
+	values = [d for d in values if flt(d[3])]
+	for i in range(0, len(values), 1000):
+		frappe.db.bulk_insert("Bin Reservation", fields, [
+			[frappe.generate_hash(length=10), timestamp, timestamp, "Administrator", "Administrator", 0,
+				voucher_type, voucher_no, item_code, warehouse, qty_field, qty]
+			for voucher_no, item_code, warehouse, qty in values[i:i + 1000]])
+
+def get_reservations(qty_field, voucher_no=None, item_code=None, warehouse=None):
+	"""What open vouchers add to `qty_field` of Bins, as rows of
+	(voucher no, item code, warehouse, qty), computed from the vouchers themselves"""
+	filters = frappe._dict(voucher_no=voucher_no, item_code=item_code, warehouse=warehouse)
+	return reservation_queries[qty_field](filters)
+
+def get_conditions(filters, voucher_field, item_field, warehouse_field):
+	conditions = ["ifnull({0}, '') != ''".format(warehouse_field),
+		"{0} in (select name from `tabItem` where is_stock_item = 1)".format(item_field)]
+
+	for field, column in (("voucher_no", voucher_field), ("item_code", item_field),
+		("warehouse", warehouse_field)):
+			if filters.get(field):
+				conditions.append("{0} = %({1})s".format(column, field))
+
+	return " and " + " and ".join(conditions)
+
+def get_reserved_qty(filters):
+	return frappe.db.sql("""
+		select parent, item_code, warehouse, sum(qty)
+		from (
+			select so_item.parent, so_item.item_code, so_item.warehouse,
+				so_item.stock_qty * ((so_item.qty - so_item.delivered_qty) / so_item.qty) as qty
+			from `tabSales Order Item` so_item, `tabSales Order` so
+			where so_item.parent = so.name and so.docstatus = 1 and so.status != 'Closed'
+				and ifnull(so_item.delivered_by_supplier, 0) = 0
+				and so_item.qty >= so_item.delivered_qty {so_item_conditions}
+			union all
+			select dnpi.parent, dnpi.item_code, dnpi.warehouse,
+				dnpi.qty * ((so_item.qty - so_item.delivered_qty) / so_item.qty) as qty
+			from `tabPacked Item` dnpi, `tabSales Order Item` so_item, `tabSales Order` so
+			where dnpi.parenttype = 'Sales Order' and dnpi.item_code != dnpi.parent_item
+				and dnpi.parent_detail_docname = so_item.name and dnpi.parent = so.name
+				and so.docstatus = 1 and so.status != 'Closed'
+				and ifnull(so_item.delivered_by_supplier, 0) = 0
+				and so_item.qty >= so_item.delivered_qty {dnpi_conditions}
+		) tab
+		group by parent, item_code, warehouse""".format(
+			so_item_conditions=get_conditions(filters, "so.name", "so_item.item_code", "so_item.warehouse"),
+			dnpi_conditions=get_conditions(filters, "so.name", "dnpi.item_code", "dnpi.warehouse")),
+		filters)
+
+def get_ordered_qty(filters):
+	return frappe.db.sql("""
+		select po.name, po_item.item_code, po_item.warehouse,
+			sum((po_item.qty - po_item.received_qty) * po_item.conversion_factor)
+		from `tabPurchase Order Item` po_item, `tabPurchase Order` po
+		where po_item.parent = po.name and po.docstatus = 1
+			and po.status not in ('Closed', 'Delivered')
+			and po_item.qty > po_item.received_qty and po_item.delivered_by_supplier = 0 {0}
+		group by po.name, po_item.item_code, po_item.warehouse""".format(
+			get_conditions(filters, "po.name", "po_item.item_code", "po_item.warehouse")), filters)
+
+def get_indented_qty(filters):
+	# Material Issue requests take stock out of the warehouse
+	return frappe.db.sql("""
+		select mr.name, mr_item.item_code, mr_item.warehouse,
+			sum(case when mr.material_request_type = 'Material Issue' then -1 else 1 end
+				* (mr_item.stock_qty - mr_item.ordered_qty))
+		from `tabMaterial Request Item` mr_item, `tabMaterial Request` mr
+		where mr_item.parent = mr.name and mr.docstatus = 1 and mr.status != 'Stopped'
+			and mr.material_request_type in ('Purchase', 'Manufacture', 'Customer Provided',
+				'Material Transfer', 'Material Issue')
+			and mr_item.stock_qty > mr_item.ordered_qty {0}
+		group by mr.name, mr_item.item_code, mr_item.warehouse""".format(
+			get_conditions(filters, "mr.name", "mr_item.item_code", "mr_item.warehouse")), filters)
+
+def get_planned_qty(filters):
+	return frappe.db.sql("""
+		select name, production_item, fg_warehouse, qty - produced_qty
+		from `tabWork Order`
+		where docstatus = 1 and status not in ('Stopped', 'Completed') and qty > produced_qty {0}
+		""".format(get_conditions(filters, "name", "production_item", "fg_warehouse")), filters)
+
+def get_reserved_qty_for_production(filters):
+	return frappe.db.sql("""
+		select wo.name, item.item_code, item.source_warehouse,
+			sum(case when ifnull(wo.skip_transfer, 0) = 0 then item.required_qty - item.transferred_qty
+				else item.required_qty - item.consumed_qty end)
+		from `tabWork Order` wo, `tabWork Order Item` item
+		where item.parent = wo.name and wo.docstatus = 1 and wo.status not in ('Stopped', 'Completed')
+			and (item.required_qty > item.transferred_qty or item.required_qty > item.consumed_qty) {0}
+		group by wo.name, item.item_code, item.source_warehouse""".format(
+			get_conditions(filters, "wo.name", "item.item_code", "item.source_warehouse")), filters)
+
+def get_reserved_qty_for_sub_contract(filters):
+	# raw materials sent to the subcontractor against the order are no longer reserved
+	return frappe.db.sql("""
+		select po.name, sup.rm_item_code, sup.reserve_warehouse,
+			greatest(sum(sup.required_qty) - ifnull((
+				select sum(sed.transfer_qty)
+				from `tabStock Entry` se, `tabStock Entry Detail` sed
+				where sed.parent = se.name and se.docstatus = 1
+					and se.purpose = 'Send to Subcontractor' and se.purchase_order = po.name
+					and (sed.item_code = sup.rm_item_code or sed.original_item = sup.rm_item_code)
+			), 0), 0)
+		from `tabPurchase Order Item Supplied` sup, `tabPurchase Order` po
+		where sup.parent = po.name and po.docstatus = 1 and po.is_subcontracted = 'Yes'
+			and po.status != 'Closed' and po.per_received < 100 {0}
+		group by po.name, sup.rm_item_code, sup.reserve_warehouse""".format(
+			get_conditions(filters, "po.name", "sup.rm_item_code", "sup.reserve_warehouse")), filters)
+
+reservation_queries = {
+	"reserved_qty": get_reserved_qty,
+	"ordered_qty": get_ordered_qty,
+	"indented_qty": get_indented_qty,
+	"planned_qty": get_planned_qty,
+	"reserved_qty_for_production": get_reserved_qty_for_production,
+	"reserved_qty_for_sub_contract": get_reserved_qty_for_sub_contract
+}
+
+def rebuild_bin_reservations(item_code=None, warehouse=None, qty_fields=None):
+	"""Recompute the rows of all open vouchers (of an item and / or warehouse)
+	and set the Bin qty fields to their totals"""
+	from erpnext.stock.utils import get_bin
+
+	qty_fields = qty_fields or list(RESERVATION_FIELDS)
+	filters = frappe._dict(item_code=item_code, warehouse=warehouse)
+	conditions = "".join(" and {0} = %({0})s".format(d) for d in ("item_code", "warehouse") if filters.get(d))
+
+	for qty_field in qty_fields:
+		frappe.db.sql("""delete from `tabBin Reservation` where qty_field = %(qty_field)s {0}"""
+			.format(conditions), dict(filters, qty_field=qty_field))
+
+		values = get_reservations(qty_field, item_code=item_code, warehouse=warehouse)
+		insert_reservations(qty_field, values)
+
+		bins = set(frappe.db.sql("""select item_code, warehouse from `tabBin` where 1=1 {0}"""
+			.format(conditions), filters))
+		for d in set((d[1], d[2]) for d in values if flt(d[3])) - bins:
+			get_bin(d[0], d[1])
+
+		frappe.db.sql("""update `tabBin` bin
+			set bin.`{0}` = ifnull((select sum(res.qty) from `tabBin Reservation` res
+				where res.item_code = bin.item_code and res.warehouse = bin.warehouse
+					and res.qty_field = %(qty_field)s), 0)
+			where 1=1 {1}""".format(qty_field, conditions), dict(filters, qty_field=qty_field))
+
+	frappe.db.sql("""update `tabBin`
+		set projected_qty = ifnull(actual_qty, 0) + ifnull(ordered_qty, 0) + ifnull(indented_qty, 0)
+			+ ifnull(planned_qty, 0) - ifnull(reserved_qty, 0) - ifnull(reserved_qty_for_production, 0)
+			- ifnull(reserved_qty_for_sub_contract, 0)
+		where 1=1 {0}""".format(conditions), filters)
+
+	for name in frappe.db.sql_list("""select name from `tabBin` where 1=1 {0}""".format(conditions), filters):
+		frappe.clear_document_cache("Bin", name)
+
+def get_reservation_drift(item_code=None, warehouse=None):
+	"""Bin qty fields that differ from the totals of the open vouchers,
+	as a list of ((item code, warehouse, qty field), maintained qty, expected qty)"""
+	expected = {}
+	for qty_field in RESERVATION_FIELDS:
+		for voucher_no, item, wh, qty in get_reservations(qty_field, item_code=item_code, warehouse=warehouse):
+			key = (item, wh, qty_field)
+			expected[key] = expected.get(key, 0.0) + flt(qty)
+
+	filters = {}
+	if item_code: filters["item_code"] = item_code
+	if warehouse: filters["warehouse"] = warehouse
+
+	maintained = {}
+	for d in frappe.get_all("Bin", fields=["item_code", "warehouse"] + list(RESERVATION_FIELDS),
+		filters=filters):
+			for qty_field in RESERVATION_FIELDS:
+				maintained[(d.item_code, d.warehouse, qty_field)] = d.get(qty_field)
+
+	drift = []
+	for key in sorted(set(expected) | set(maintained)):
+		maintained_qty, expected_qty = flt(maintained.get(key), 6), flt(expected.get(key), 6)
+		if maintained_qty != expected_qty:
+			drift.append((key, maintained_qty, expected_qty))
+
+	return drift
+
+def verify_bin_reservations():
+	"""Daily check that the Bin qty fields still match the open vouchers"""
+	drift = get_reservation_drift()
+	if drift:
+		frappe.log_error(title=_("Bin Reservation Drift"), message="\n".join(
+			"{0}: {1} != {2}".format(", ".join(key), maintained, expected)
+			for key, maintained, expected in drift))
+
+def on_doctype_update():
+	frappe.db.add_index("Bin Reservation", ["voucher_type", "voucher_no"])
+	frappe.db.add_index("Bin Reservation", ["item_code", "warehouse"])
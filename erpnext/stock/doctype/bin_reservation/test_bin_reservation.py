@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and Contributors
+# See license.txt
+from __future__ import unicode_literals
+
+import frappe
+import unittest
+from frappe.utils import flt
+from erpnext.stock.doctype.item.test_item import make_item
+from erpnext.selling.doctype.sales_order.test_sales_order import make_sales_order, create_dn_against_so
+from erpnext.buying.doctype.purchase_order.test_purchase_order import create_purchase_order, create_pr_against_po
+from erpnext.stock.doctype.material_request.test_material_request import make_material_request
+from erpnext.stock.doctype.bin_reservation.bin_reservation import (rebuild_bin_reservations,
+	get_reservation_drift)
+from erpnext.stock import stock_balance
+
+class TestBinReservation(unittest.TestCase):
+	def setUp(self):
+		self.item_code = make_item("_Test Bin Reservation Item", {"is_stock_item": 1}).name
+		self.warehouse = "_Test Warehouse - _TC"
+		rebuild_bin_reservations(self.item_code)
+
+	def test_bin_updated_by_deltas(self):
+		existing_qty = {d: get_bin_qty(self.item_code, self.warehouse, d)
+			for d in ("reserved_qty", "ordered_qty", "indented_qty")}
+
+		delivered_so = make_sales_order(item_code=self.item_code, qty=10)
+		create_dn_against_so(delivered_so.name, delivered_qty=4)
+		so = make_sales_order(item_code=self.item_code, qty=3)
+
+		po = create_purchase_order(item_code=self.item_code, qty=8)
+		create_pr_against_po(po.name, received_qty=5)
+
+		mr = make_material_request(item_code=self.item_code, qty=6)
+		mr.cancel()
+		make_material_request(item_code=self.item_code, qty=2)
+
+		for qty_field, qty in (("reserved_qty", 9), ("ordered_qty", 3), ("indented_qty", 2)):
+			self.assertEqual(get_bin_qty(self.item_code, self.warehouse, qty_field), existing_qty[qty_field] + qty)
+
+		# same totals as summing up the open vouchers
+		self.assertEqual(get_bin_qty(self.item_code, self.warehouse, "reserved_qty"),
+			stock_balance.get_reserved_qty(self.item_code, self.warehouse))
+		self.assertEqual(get_bin_qty(self.item_code, self.warehouse, "ordered_qty"),
+			stock_balance.get_ordered_qty(self.item_code, self.warehouse))
+		self.assertEqual(get_bin_qty(self.item_code, self.warehouse, "indented_qty"),
+			stock_balance.get_indented_qty(self.item_code, self.warehouse))
+
+		so.cancel()
+		self.assertEqual(get_bin_qty(self.item_code, self.warehouse, "reserved_qty"),
+			existing_qty["reserved_qty"] + 6)
+		self.assertEqual(get_reservation_drift(self.item_code), [])
+
+	def test_drift_is_reported(self):
+		make_sales_order(item_code=self.item_code, qty=5)
+		reserved_qty = get_bin_qty(self.item_code, self.warehouse, "reserved_qty")
+
+		frappe.db.sql("""update `tabBin` set reserved_qty = reserved_qty + 1
+			where item_code = %s and warehouse = %s""", (self.item_code, self.warehouse))
+
+		self.assertEqual(get_reservation_drift(self.item_code),
+			[((self.item_code, self.warehouse, "reserved_qty"), reserved_qty + 1, reserved_qty)])
+
+		rebuild_bin_reservations(self.item_code, self.warehouse)
+		self.assertEqual(get_reservation_drift(self.item_code), [])
+
+def get_bin_qty(item_code, warehouse, qty_field):
+	return flt(frappe.db.get_value("Bin", {"item_code": item_code, "warehouse": warehouse}, qty_field))
@@ -196,6 +196,7 @@ class DeliveryNote(SellingController):
 		# update delivered qty in sales order
 		self.update_prevdoc_status()
 		self.update_billing_status()
+		self.update_credit_exposure()
 
 		if not self.is_return:
 			self.check_credit_limit()
@@ -214,6 +215,7 @@ class DeliveryNote(SellingController):
 
 		self.update_prevdoc_status()
 		self.update_billing_status()
+		self.update_credit_exposure()
 
 		# Updating stock ledger should always be called after updating prevdoc status,
 		# because updating reserved qty in bin depends upon updated delivered qty in SO
@@ -11,7 +11,7 @@ import json
 from frappe.utils import cstr, flt, getdate, new_line_sep, nowdate, add_days, get_link_to_form
 from frappe import msgprint, _
 from frappe.model.mapper import get_mapped_doc
-from erpnext.stock.stock_balance import update_bin_qty, get_indented_qty
+from erpnext.stock.doctype.bin_reservation.bin_reservation import update_bin_reservations
 from erpnext.controllers.buying_controller import BuyingController
 from erpnext.manufacturing.doctype.work_order.work_order import get_item_details
 from erpnext.buying.utils import check_on_hold_or_closed_status, validate_for_items
@@ -185,17 +185,9 @@ class MaterialRequest(BuyingController):
 		}, update_modified)
 
 	def update_requested_qty(self, mr_item_rows=None):
-		"""update requested qty (before ordered_qty is updated)"""
-		item_wh_list = []
-		for d in self.get("items"):
-			if (not mr_item_rows or d.name in mr_item_rows) and [d.item_code, d.warehouse] not in item_wh_list \
-					and frappe.db.get_value("Item", d.item_code, "is_stock_item") == 1 and d.warehouse:
-				item_wh_list.append([d.item_code, d.warehouse])
-
-		for item_code, warehouse in item_wh_list:
-			update_bin_qty(item_code, warehouse, {
-				"indented_qty": get_indented_qty(item_code, warehouse)
-			})
+		"""update requested qty in bins by the change in what this request has yet to order
+		(before ordered_qty is updated), all its rows are compared so `mr_item_rows` is not needed anymore"""
+		update_bin_reservations(self.doctype, self.name, ["indented_qty"])
 
 	def update_requested_qty_in_production_plan(self):
 		production_plans = []
@@ -0,0 +1,20 @@
+// Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and contributors
+// For license information, please see license.txt
+
+frappe.ui.form.on('Repost Item Valuation', {
+	refresh: function(frm) {
+		if (!frm.is_new() && in_list(["Failed", "Completed"], frm.doc.status)) {
+			frm.add_custom_button(__("Restart"), () => {
+				frappe.call({
+					method: "erpnext.stock.doctype.repost_item_valuation.repost_item_valuation.restart_reposting",
+					args: {
+						name: frm.doc.name
+					},
+					callback: function() {
+						frm.reload_doc();
+					}
+				});
+			});
+		}
+	}
+});
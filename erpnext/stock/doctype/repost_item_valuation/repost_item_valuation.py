@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+from __future__ import unicode_literals
+import frappe, erpnext
+from frappe import _
+from frappe.utils import cint, add_to_date, now_datetime
+from frappe.model.document import Document
+from erpnext.stock.stock_ledger import update_entries_after
+from erpnext.accounts.utils import update_gl_entries_after
+
+# failed reposts are picked up again by the scheduler until they have failed this many times
+MAX_RETRIES = 3
+
+# timeout of the repost job, an entry still in progress after this was left by a dead worker
+REPOST_TIMEOUT = 3600
+
+class RepostItemValuation(Document):
+	def validate(self):
+		if not self.status:
+			self.status = "Queued"
+
+		if not self.company:
+			self.company = frappe.get_cached_value("Warehouse", self.warehouse, "company")
+
+	def db_set_status(self, status, error_log=None):
+		values = {"status": status}
+		if status == "Failed":
+			values.update({
+				"retry_count": cint(self.retry_count) + 1,
+				"error_log": error_log
+			})
+
+		self.db_set(values)
+
+def create_repost_item_valuation_entry(args):
+	"""Queue a repost of the ledger of `args.item_code` in `args.warehouse` from the
+	given posting datetime onwards, to be processed by `repost_entries`"""
+	args = frappe._dict(args)
+
+	repost_entry = frappe.new_doc("Repost Item Valuation")
+	repost_entry.update({
+		"item_code": args.item_code,
+		"warehouse": args.warehouse,
+		"posting_date": args.posting_date,
+		"posting_time": args.posting_time,
+		"voucher_type": args.voucher_type,
+		"voucher_no": args.voucher_no,
+		"allow_negative_stock": cint(args.allow_negative_stock),
+		"via_landed_cost_voucher": cint(args.via_landed_cost_voucher),
+		"allow_zero_rate": cint(args.allow_zero_rate)
+	})
+	repost_entry.flags.ignore_permissions = True
+	repost_entry.insert()
+
+	return repost_entry
+
+def enqueue_reposting():
+	"""Scheduled every few minutes, hands pending reposts to the long worker"""
+	requeue_stale_entries()
+
+	if frappe.db.exists("Repost Item Valuation", {"status": "In Progress"}):
+		return
+
+	if get_pending_entries():
+		frappe.enqueue("erpnext.stock.doctype.repost_item_valuation.repost_item_valuation.repost_entries",
+			queue="long", timeout=REPOST_TIMEOUT)
+
+def requeue_stale_entries():
+	"""Queue again the entries left in progress by a worker that died, the job would have
+	timed out by now if it was still running"""
+	frappe.db.sql("""update `tabRepost Item Valuation` set status = 'Queued'
+		where status = 'In Progress' and modified < %s""",
+		add_to_date(now_datetime(), seconds=-REPOST_TIMEOUT))
+
+def repost_entries():
+	"""Repost every pending (item, warehouse) once, from the earliest queued posting datetime.
+
+	Overlapping requests for the same key are coalesced, the ones covered by the
+	earliest request are closed along with it."""
+	reposted = {}
+	for (item_code, warehouse), entries in get_pending_entries().items():
+		if repost(entries):
+			reposted.setdefault(item_code, []).append(warehouse)
+
+	enqueue_age_lot_rebuild(reposted)
+
+def enqueue_age_lot_rebuild(reposted):
+	"""Lots follow the order of the entries, which changed. Rebuild them once per item for
+	the warehouses reposted, in a job of their own as they replay the whole ledger of the item"""
+	for item_code, warehouses in reposted.items():
+		frappe.enqueue("erpnext.stock.doctype.stock_age_lot.stock_age_lot.rebuild_age_lots",
+			queue="long", item_code=item_code, warehouses=warehouses, now=frappe.flags.in_test)
+
+def get_pending_entries():
+	entries = frappe.get_all("Repost Item Valuation",
+		fields=["name", "item_code", "warehouse", "posting_date", "posting_time",
+			"status", "retry_count"],
+		filters={"status": ("in", ["Queued", "Failed"])},
+		order_by="posting_date asc, posting_time asc, creation asc")
+
+	pending_entries = {}
+	for d in entries:
+		if d.status == "Failed" and cint(d.retry_count) >= MAX_RETRIES:
+			continue
+
+		pending_entries.setdefault((d.item_code, d.warehouse), []).append(d)
+
+	return pending_entries
+
+def repost(entries):
+	"""Repost from the earliest of the coalesced `entries`, they are ordered by posting datetime"""
+	doc = frappe.get_doc("Repost Item Valuation", entries[0].name)
+
+	try:
+		doc.db_set_status("In Progress")
+		frappe.db.commit()
+
+		repost_sl_entries(doc)
+		repost_gl_entries(doc)
+
+		for d in entries:
+			frappe.db.set_value("Repost Item Valuation", d.name, "status", "Completed")
+
+		frappe.db.commit()
+		return True
+	except Exception:
+		frappe.db.rollback()
+		doc.db_set_status("Failed", error_log=frappe.get_traceback())
+		frappe.db.commit()
+
+def repost_sl_entries(doc):
+	update_entries_after({
+		"item_code": doc.item_code,
+		"warehouse": doc.warehouse,
+		"posting_date": doc.posting_date,
+		"posting_time": doc.posting_time
+	}, allow_negative_stock=doc.allow_negative_stock, allow_zero_rate=doc.allow_zero_rate,
+		via_landed_cost_voucher=doc.via_landed_cost_voucher, verbose=0)
+
+def repost_gl_entries(doc):
+	if not cint(erpnext.is_perpetual_inventory_enabled(doc.company)):
+		return
+
+	update_gl_entries_after(doc.posting_date, doc.posting_time,
+		for_warehouses=[doc.warehouse], for_items=[doc.item_code], company=doc.company)
+
+@frappe.whitelist()
+def restart_reposting(name):
+	doc = frappe.get_doc("Repost Item Valuation", name)
+	if doc.status not in ("Failed", "Completed"):
+		frappe.throw(_("Only failed or completed reposts can be restarted"))
+
+	doc.db_set({"status": "Queued", "retry_count": 0, "error_log": None})
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and Contributors
+# See license.txt
+from __future__ import unicode_literals
+
+import frappe
+import unittest
+from frappe.utils import nowdate, add_days, add_to_date, now_datetime
+from erpnext.stock.doctype.repost_item_valuation.repost_item_valuation import (
+	create_repost_item_valuation_entry, repost_entries, get_pending_entries,
+	requeue_stale_entries, REPOST_TIMEOUT)
+from erpnext.stock.stock_ledger import is_future_sle_exists
+from erpnext.stock.doctype.stock_entry.stock_entry_utils import make_stock_entry
+from erpnext.stock.doctype.item.test_item import make_item
+
+class TestRepostItemValuation(unittest.TestCase):
+	def test_overlapping_reposts_are_coalesced(self):
+		args = {
+			"item_code": "_Test Item",
+			"warehouse": "_Test Warehouse - _TC",
+			"posting_time": "00:00:00",
+			"allow_negative_stock": 1
+		}
+
+		later = create_repost_item_valuation_entry(dict(args, posting_date=nowdate()))
+		earlier = create_repost_item_valuation_entry(dict(args, posting_date=add_days(nowdate(), -5)))
+
+		pending = get_pending_entries()[("_Test Item", "_Test Warehouse - _TC")]
+		self.assertEqual(pending[0].name, earlier.name)
+
+		repost_entries()
+
+		for name in (earlier.name, later.name):
+			self.assertEqual(frappe.db.get_value("Repost Item Valuation", name, "status"), "Completed")
+
+	def test_stale_entry_is_requeued(self):
+		entry = create_repost_item_valuation_entry({
+			"item_code": "_Test Item",
+			"warehouse": "_Test Warehouse - _TC",
+			"posting_date": nowdate(),
+			"posting_time": "00:00:00"
+		})
+
+		# the worker running it died after marking it in progress
+		entry.db_set("status", "In Progress", update_modified=False)
+		requeue_stale_entries()
+		self.assertEqual(frappe.db.get_value("Repost Item Valuation", entry.name, "status"), "In Progress")
+
+		frappe.db.set_value("Repost Item Valuation", entry.name, "modified",
+			add_to_date(now_datetime(), seconds=-(REPOST_TIMEOUT + 60)), update_modified=False)
+		requeue_stale_entries()
+		self.assertEqual(frappe.db.get_value("Repost Item Valuation", entry.name, "status"), "Queued")
+
+	def test_cancelled_future_entries_are_reposted(self):
+		item_code = make_item("_Test Item Cancelled Future Entry", {"is_stock_item": 1}).name
+		se = make_stock_entry(item_code=item_code, target="_Test Warehouse - _TC", qty=5,
+			basic_rate=100, posting_date=add_days(nowdate(), -5))
+		se.cancel()
+
+		# the cancelled entry and its reversal still carry balances to repost
+		self.assertTrue(is_future_sle_exists({
+			"item_code": item_code,
+			"warehouse": "_Test Warehouse - _TC",
+			"posting_date": add_days(nowdate(), -6),
+			"posting_time": "00:00:00"
+		}))
+
+	def test_future_gl_entries_reposted_by_job(self):
+		from erpnext.stock import get_warehouse_account_map
+
+		item_code = make_item("_Test Item Back Dated GL Repost", {"is_stock_item": 1}).name
+		company = frappe.db.get_value("Warehouse", "Stores - TCP1", "company")
+		stock_account = get_warehouse_account_map(company)["Stores - TCP1"].account
+
+		make_stock_entry(item_code=item_code, target="Stores - TCP1", company=company,
+			qty=10, basic_rate=100, expense_account="Stock Adjustment - TCP1")
+		issue = make_stock_entry(item_code=item_code, source="Stores - TCP1", company=company,
+			qty=10, expense_account="Stock Adjustment - TCP1")
+
+		# the back-dated receipt changes the rate of the issue, submit only queues its repost
+		make_stock_entry(item_code=item_code, target="Stores - TCP1", company=company,
+			qty=10, basic_rate=200, expense_account="Stock Adjustment - TCP1",
+			posting_date=add_days(nowdate(), -2))
+
+		def get_issue_credit():
+			return frappe.db.get_value("GL Entry", {"voucher_type": "Stock Entry",
+				"voucher_no": issue.name, "account": stock_account}, "credit")
+
+		self.assertEqual(get_issue_credit(), 1000)
+
+		repost_entries()
+
+		stock_value_difference = frappe.db.get_value("Stock Ledger Entry", {"voucher_type": "Stock Entry",
+			"voucher_no": issue.name}, "stock_value_difference")
+		self.assertNotEqual(stock_value_difference, -1000)
+		self.assertEqual(get_issue_credit(), abs(stock_value_difference))
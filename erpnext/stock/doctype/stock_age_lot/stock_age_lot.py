@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+from __future__ import unicode_literals
+import frappe
+from collections import deque
+from frappe.utils import flt, now
+from frappe.model.document import Document
+from erpnext.stock.doctype.serial_no.serial_no import get_serial_nos
+
+class StockAgeLot(Document):
+	pass
+
+class AgeLotQueue(object):
+	"""Stock of an item in a warehouse as `[qty, posting_date]` lots in the order they came in,
+	serialized stock as a map of serial no to the date it first came in"""
+	def __init__(self, lots=None, serial_nos=None):
+		self.lots = deque([list(d) for d in lots or []])
+		self.popped = 0
+		self.serial_nos = dict(serial_nos or {})
+		self.added_serial_nos = {}
+		self.removed_serial_nos = set()
+
+	def get_qty(self):
+		return sum(d[0] for d in self.lots)
+
+	def add(self, qty, posting_date):
+		self.lots.append([flt(qty), posting_date])
+
+	def consume(self, qty):
+		"""Consume `qty` from the oldest lots and return the consumed `[qty, posting_date]`,
+		stock consumed beyond the lots is not kept"""
+		consumed, qty_to_pop = [], flt(qty)
+		while qty_to_pop > 0 and self.lots:
+			lot = self.lots[0]
+			if lot[0] <= qty_to_pop:
+				qty_to_pop -= lot[0]
+				consumed.append(self.lots.popleft())
+				self.popped += 1
+			else:
+				lot[0] -= qty_to_pop
+				consumed.append([qty_to_pop, lot[1]])
+				qty_to_pop = 0
+
+		return consumed
+
+	def add_serial_nos(self, serial_nos, serial_no_dates, posting_date):
+		for serial_no in serial_nos:
+			self.serial_nos[serial_no] = self.added_serial_nos[serial_no] = \
+				serial_no_dates.setdefault(serial_no, posting_date)
+			self.removed_serial_nos.discard(serial_no)
+
+	def remove_serial_nos(self, serial_nos):
+		for serial_no in serial_nos:
+			self.serial_nos.pop(serial_no, None)
+			self.added_serial_nos.pop(serial_no, None)
+			self.removed_serial_nos.add(serial_no)
+
+def apply_sle(queue, sle, transferred, serial_no_dates):
+	"""Update `queue` for the Stock Ledger Entry `sle`.
+
+	Lots consumed by an outgoing entry are kept in `transferred` by voucher and item,
+	the incoming entry of the same voucher (a transfer) takes them over with their dates.
+	`serial_no_dates` gives the date a serial no first came in."""
+	actual_qty = flt(sle.actual_qty)
+	serial_nos = get_serial_nos(sle.serial_no) if sle.serial_no else []
+
+	if sle.voucher_type == "Stock Reconciliation" and not actual_qty:
+		actual_qty = flt(sle.qty_after_transaction) - queue.get_qty()
+		serial_nos = []
+
+	key = (sle.voucher_no, sle.item_code)
+	if actual_qty > 0:
+		if serial_nos:
+			queue.add_serial_nos(serial_nos, serial_no_dates, sle.posting_date)
+			return
+
+		qty_to_add, lots = actual_qty, transferred.get(key) or []
+		while qty_to_add > 0 and lots:
+			lot = lots[0]
+			if lot[0] <= qty_to_add:
+				queue.add(*lots.pop(0))
+				qty_to_add -= lot[0]
+			else:
+				queue.add(qty_to_add, lot[1])
+				lot[0] -= qty_to_add
+				qty_to_add = 0
+
+		if qty_to_add > 0:
+			queue.add(qty_to_add, sle.posting_date)
+
+	elif actual_qty < 0:
+		if serial_nos:
+			queue.remove_serial_nos(serial_nos)
+		else:
+			transferred.setdefault(key, []).extend(queue.consume(abs(actual_qty)))
+
+def update_age_lots(sle, transferred):
+	"""Update the lots of the item and warehouse of a posted Stock Ledger Entry.
+
+	Only the lots the entry consumes or brings in are written. A back-dated entry is applied
+	as if it came last, the repost it queues rebuilds the lots of its item and warehouse in
+	their posting order (see `repost_item_valuation.enqueue_age_lot_rebuild`)."""
+	sle = frappe._dict(sle)
+
+	lots = frappe.db.sql("""select name, idx, qty, posting_date from `tabStock Age Lot`
+		where item_code=%s and warehouse=%s and ifnull(serial_no, '')=''
+		order by idx""", (sle.item_code, sle.warehouse), as_dict=1)
+
+	queue = AgeLotQueue([(d.qty, d.posting_date) for d in lots])
+
+	serial_no_dates = {}
+	if sle.serial_no and flt(sle.actual_qty) > 0:
+		serial_no_dates = get_serial_no_dates(get_serial_nos(sle.serial_no))
+
+	apply_sle(queue, sle, transferred, serial_no_dates)
+
+	# lots are only consumed from the front and brought in at the end
+	consumed, kept = lots[:queue.popped], lots[queue.popped:]
+	if consumed:
+		frappe.db.sql("""delete from `tabStock Age Lot` where name in ({0})"""
+			.format(", ".join(["%s"] * len(consumed))), tuple(d.name for d in consumed))
+
+	if kept and flt(kept[0].qty) != flt(queue.lots[0][0]):
+		frappe.db.set_value("Stock Age Lot", kept[0].name, "qty", queue.lots[0][0], update_modified=False)
+
+	insert_age_lots(sle.item_code, sle.warehouse, sle.company, list(queue.lots)[len(kept):],
+		from_idx=lots[-1].idx if lots else 0)
+
+	if queue.removed_serial_nos:
+		frappe.db.sql("""delete from `tabStock Age Lot`
+			where item_code=%s and warehouse=%s and serial_no in ({0})"""
+			.format(", ".join(["%s"] * len(queue.removed_serial_nos))),
+			tuple([sle.item_code, sle.warehouse] + list(queue.removed_serial_nos)))
+
+	insert_age_lots(sle.item_code, sle.warehouse, sle.company,
+		serial_nos=queue.added_serial_nos)
+
+def get_serial_no_dates(serial_nos):
+	if not serial_nos:
+		return {}
+
+	return dict(frappe.db.sql("""select name, purchase_date from `tabSerial No`
+		where name in ({0}) and purchase_date is not null"""
+		.format(", ".join(["%s"] * len(serial_nos))), tuple(serial_nos)))
+
+def insert_age_lots(item_code, warehouse, company, lots=None, serial_nos=None, from_idx=0):
+	if not company:
+		company = frappe.get_cached_value("Warehouse", warehouse, "company")
+
+	fields = ["name", "creation", "modified", "owner", "modified_by", "docstatus", "idx",
+		"item_code", "warehouse", "company", "posting_date", "qty", "serial_no"]
+
+	timestamp, values = now(), []
+	for i, (qty, posting_date) in enumerate(lots or []):
+		values.append([frappe.generate_hash(length=10), timestamp, timestamp, "Administrator",
+			"Administrator", 0, from_idx + i + 1, item_code, warehouse, company, posting_date, qty, None])
+
+	for serial_no, posting_date in (serial_nos or {}).items():
+		values.append([frappe.generate_hash(length=10), timestamp, timestamp, "Administrator",
+			"Administrator", 0, 0, item_code, warehouse, company, posting_date, 1, serial_no])
+
+	if values:
+		frappe.db.bulk_insert("Stock Age Lot", fields, values)
+
+def rebuild_age_lots(item_code=None, transferred=None, warehouses=None):
+	"""Rebuild the lots of an item (or of all items) by replaying its Stock Ledger Entries,
+	only in `warehouses` if given. Entries of the other warehouses are still replayed, lots
+	transferred from them keep the dates they came in with.
+
+	The lots taken out by outgoing entries and not brought in again are left in `transferred`"""
+	transferred = {} if transferred is None else transferred
+	items = [item_code] if item_code else frappe.db.sql_list("""select distinct item_code
+		from `tabStock Ledger Entry`""")
+
+	for item_code in items:
+		if warehouses:
+			frappe.db.sql("""delete from `tabStock Age Lot` where item_code=%s and warehouse in ({0})"""
+				.format(", ".join(["%s"] * len(warehouses))), tuple([item_code] + list(warehouses)))
+		else:
+			frappe.db.sql("""delete from `tabStock Age Lot` where item_code=%s""", item_code)
+
+		queues, companies, serial_no_dates = {}, {}, {}
+		for sle in frappe.db.sql("""select item_code, warehouse, company, posting_date, actual_qty,
+				qty_after_transaction, serial_no, voucher_type, voucher_no
+			from `tabStock Ledger Entry`
+			where item_code=%s
+			order by posting_date, posting_time, creation, actual_qty""", item_code, as_dict=1):
+				queue = queues.setdefault(sle.warehouse, AgeLotQueue())
+				companies[sle.warehouse] = sle.company
+				apply_sle(queue, sle, transferred, serial_no_dates)
+
+		for warehouse, queue in queues.items():
+			if warehouses and warehouse not in warehouses:
+				continue
+
+			insert_age_lots(item_code, warehouse, companies[warehouse], queue.lots, queue.serial_nos)
+
+def on_doctype_update():
+	frappe.db.add_index("Stock Age Lot", ["item_code", "warehouse"])
+	frappe.db.add_index("Stock Age Lot", ["serial_no"])
@@ -5,8 +5,48 @@ from __future__ import unicode_literals
 
 import frappe
 import unittest
+from erpnext.stock.stock_ledger import update_entries_after, SLE_COMPUTED_FIELDS
+from erpnext.stock.doctype.stock_entry.stock_entry_utils import make_stock_entry
+from erpnext.stock.doctype.stock_reconciliation.test_stock_reconciliation import set_valuation_method
 
 # test_records = frappe.get_test_records('Stock Ledger Entry')
 
 class TestStockLedgerEntry(unittest.TestCase):
-	pass
+	def test_bulk_repost_matches_row_wise_repost(self):
+		item_code, warehouse = "_Test Item", "_Test Warehouse - _TC"
+		frappe.db.set_value("Stock Settings", None, "allow_negative_stock", 1)
+
+		for valuation_method in ("FIFO", "Moving Average"):
+			set_valuation_method(item_code, valuation_method)
+
+			for qty, rate in ((10, 100), (5, 120), (-12, 0), (20, 90), (-3, 0), (-30, 0), (40, 110)):
+				if qty > 0:
+					make_stock_entry(item_code=item_code, target=warehouse, qty=qty, basic_rate=rate)
+				else:
+					make_stock_entry(item_code=item_code, source=warehouse, qty=abs(qty))
+
+			args = {"item_code": item_code, "warehouse": warehouse}
+
+			update_entries_after(args, allow_negative_stock=1, bulk_update=False)
+			row_wise = get_computed_values(item_code, warehouse)
+
+			reset_computed_values(item_code, warehouse)
+
+			update_entries_after(args, allow_negative_stock=1)
+			bulk = get_computed_values(item_code, warehouse)
+
+			self.assertEqual(row_wise, bulk)
+
+		set_valuation_method(item_code, "FIFO")
+		frappe.db.set_value("Stock Settings", None, "allow_negative_stock", 0)
+
+def get_computed_values(item_code, warehouse):
+	return frappe.db.sql("""select name, {0} from `tabStock Ledger Entry`
+		where item_code=%s and warehouse=%s
+		order by timestamp(posting_date, posting_time), creation""".format(", ".join(SLE_COMPUTED_FIELDS)),
+		(item_code, warehouse), as_dict=1)
+
+def reset_computed_values(item_code, warehouse):
+	frappe.db.sql("""update `tabStock Ledger Entry`
+		set qty_after_transaction=0, valuation_rate=0, stock_value=0, stock_queue='[]', stock_value_difference=0
+		where item_code=%s and warehouse=%s""", (item_code, warehouse))
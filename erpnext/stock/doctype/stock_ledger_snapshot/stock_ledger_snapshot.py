@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+from __future__ import unicode_literals
+import frappe
+from frappe.utils import flt, getdate, nowdate, add_months, get_last_day, now
+from frappe.model.document import Document
+
+SNAPSHOT_FIELDS = ("qty_after_transaction", "valuation_rate", "stock_value", "stock_queue")
+
+# items whose entries of the period are read at a time
+SNAPSHOT_BATCH_SIZE = 100
+
+class StockLedgerSnapshot(Document):
+	pass
+
+def make_snapshots(posting_date=None):
+	"""Snapshot the balance of every item and warehouse at the end of the last closed month.
+
+	Starts from the latest earlier snapshot, so only the entries of the new
+	period are read, a batch of items at a time. Snapshots are kept valid by
+	`update_snapshots` when entries before them are posted or reposted."""
+	posting_date = getdate(posting_date or get_last_day(add_months(nowdate(), -1)))
+	if frappe.db.exists("Stock Ledger Snapshot", {"posting_date": posting_date}):
+		return
+
+	previous_date = frappe.db.sql("""select max(posting_date) from `tabStock Ledger Snapshot`
+		where posting_date < %s""", posting_date)[0][0]
+
+	item_codes = frappe.db.sql_list("""
+		select distinct item_code from `tabStock Ledger Entry`
+		where posting_date > %(from_date)s and posting_date <= %(to_date)s
+		union
+		select distinct item_code from `tabStock Ledger Snapshot`
+		where posting_date = %(from_date)s""",
+		{"from_date": previous_date or "1900-01-01", "to_date": posting_date})
+
+	item_codes.sort()
+	for i in range(0, len(item_codes), SNAPSHOT_BATCH_SIZE):
+		make_snapshots_for(item_codes[i:i + SNAPSHOT_BATCH_SIZE], posting_date, previous_date)
+
+def make_snapshots_for(item_codes, posting_date, previous_date=None):
+	balances = {}
+	if previous_date:
+		for d in frappe.get_all("Stock Ledger Snapshot",
+			fields=["item_code", "warehouse", "company"] + list(SNAPSHOT_FIELDS),
+			filters={"posting_date": previous_date, "item_code": ("in", item_codes)}):
+				balances[(d.item_code, d.warehouse)] = d
+
+	# the last entry of each item and warehouse in the period holds its closing balance
+	for d in frappe.db.sql("""
+		select item_code, warehouse, company, qty_after_transaction, valuation_rate, stock_value, stock_queue
+		from `tabStock Ledger Entry`
+		where docstatus < 2 and item_code in %s and posting_date > %s and posting_date <= %s
+		order by posting_date, posting_time, creation""",
+		(tuple(item_codes), previous_date or "1900-01-01", posting_date), as_dict=1):
+			balances[(d.item_code, d.warehouse)] = d
+
+	for d in balances.values():
+		d.posting_date = posting_date
+
+	insert_snapshots(balances.values())
+
+def update_snapshots(item_code, warehouse, company, balances):
+	"""Replace the snapshots of an item and warehouse by `balances`, a list of
+	(posting_date, balance) recomputed while reposting"""
+	if not balances:
+		return
+
+	frappe.db.sql("""delete from `tabStock Ledger Snapshot`
+		where item_code = %s and warehouse = %s and posting_date in ({0})"""
+		.format(", ".join(["%s"] * len(balances))),
+		tuple([item_code, warehouse] + [d[0] for d in balances]))
+
+	insert_snapshots([frappe._dict(balance, posting_date=posting_date, item_code=item_code,
+		warehouse=warehouse, company=company) for posting_date, balance in balances])
+
+def insert_snapshots(balances):
+	fields = ["name", "creation", "modified", "owner", "modified_by", "docstatus",
+		"item_code", "warehouse", "company", "posting_date"] + list(SNAPSHOT_FIELDS)
+
+	timestamp, values = now(), []
+	for d in balances:
+		# no stock, no snapshot
+		if not (flt(d.qty_after_transaction) or flt(d.stock_value)):
+			continue
+
+		values.append([frappe.generate_hash(length=10), timestamp, timestamp, "Administrator",
+			"Administrator", 0, d.item_code, d.warehouse, d.company, d.posting_date]
+			+ [d.get(field) for field in SNAPSHOT_FIELDS])
+
+	if values:
+		frappe.db.bulk_insert("Stock Ledger Snapshot", fields, values)
+
+def get_snapshot_dates(from_date=None):
+	"""Dates on or after `from_date` for which snapshots have been made"""
+	return frappe.db.sql_list("""select distinct posting_date from `tabStock Ledger Snapshot`
+		where posting_date >= %s order by posting_date""", getdate(from_date or "1900-01-01"))
+
+def get_snapshot_before(item_code, warehouse, posting_date):
+	"""Latest snapshot of the item and warehouse strictly before `posting_date`"""
+	snapshot = frappe.db.sql("""select * from `tabStock Ledger Snapshot`
+		where item_code = %s and warehouse = %s and posting_date < %s
+		order by posting_date desc limit 1""", (item_code, warehouse, posting_date), as_dict=1)
+
+	return snapshot[0] if snapshot else None
+
+def on_doctype_update():
+	frappe.db.add_index("Stock Ledger Snapshot", ["item_code", "warehouse", "posting_date"])
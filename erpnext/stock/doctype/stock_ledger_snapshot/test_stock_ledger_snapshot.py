@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and Contributors
+# See license.txt
+from __future__ import unicode_literals
+
+import frappe
+import unittest
+from frappe.utils import nowdate, add_days
+from erpnext.stock.utils import get_stock_balance
+from erpnext.stock.doctype.stock_entry.stock_entry_utils import make_stock_entry
+from erpnext.stock.doctype.stock_ledger_snapshot import stock_ledger_snapshot
+from erpnext.stock.doctype.stock_ledger_snapshot.stock_ledger_snapshot import make_snapshots
+
+class TestStockLedgerSnapshot(unittest.TestCase):
+	def tearDown(self):
+		frappe.db.sql("delete from `tabStock Ledger Snapshot`")
+
+	def test_snapshot_kept_valid_and_used_for_balance(self):
+		item_code, warehouse = "_Test Item", "_Test Warehouse - _TC"
+		frappe.db.sql("delete from `tabStock Ledger Snapshot`")
+
+		make_stock_entry(item_code=item_code, target=warehouse, qty=10, basic_rate=100)
+		make_snapshots(nowdate())
+		self.assertEqual(get_snapshot_qty(item_code, warehouse), get_bin_qty(item_code, warehouse))
+
+		# entry on the snapshot date refreshes it
+		make_stock_entry(item_code=item_code, target=warehouse, qty=5, basic_rate=100)
+		self.assertEqual(get_snapshot_qty(item_code, warehouse), get_bin_qty(item_code, warehouse))
+
+		self.assertEqual(get_stock_balance(item_code, warehouse, add_days(nowdate(), 1)),
+			get_bin_qty(item_code, warehouse))
+
+	def test_snapshot_in_batches_of_items(self):
+		warehouse = "_Test Warehouse - _TC"
+		item_codes = ["_Test Item", "_Test Item 2"]
+		frappe.db.sql("delete from `tabStock Ledger Snapshot`")
+
+		for item_code in item_codes:
+			make_stock_entry(item_code=item_code, target=warehouse, qty=10, basic_rate=100)
+
+		batch_size = stock_ledger_snapshot.SNAPSHOT_BATCH_SIZE
+		stock_ledger_snapshot.SNAPSHOT_BATCH_SIZE = 1
+		try:
+			make_snapshots(nowdate())
+		finally:
+			stock_ledger_snapshot.SNAPSHOT_BATCH_SIZE = batch_size
+
+		for item_code in item_codes:
+			self.assertEqual(get_snapshot_qty(item_code, warehouse), get_bin_qty(item_code, warehouse))
+
+def get_snapshot_qty(item_code, warehouse):
+	return frappe.db.get_value("Stock Ledger Snapshot",
+		{"item_code": item_code, "warehouse": warehouse, "posting_date": nowdate()}, "qty_after_transaction")
+
+def get_bin_qty(item_code, warehouse):
+	return frappe.db.get_value("Bin", {"item_code": item_code, "warehouse": warehouse}, "actual_qty")
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+from __future__ import unicode_literals
+import frappe
+from collections import OrderedDict
+from frappe.utils import cint, flt, getdate, now
+from frappe.model.document import Document
+
+MOVEMENT_FIELDS = ("in_qty", "in_val", "out_qty", "out_val", "qty_change", "value_change")
+CLOSING_FIELDS = ("qty_after_transaction", "valuation_rate", "stock_value")
+
+class StockMovementSummary(Document):
+	pass
+
+def update_movement_summary(item_code, warehouse, company, from_date, to_date=None):
+	"""Recompute the daily totals of an item and warehouse from `from_date` (up to `to_date`)
+	from its Stock Ledger Entries.
+
+	Entries are classified as in or out one by one like Stock Balance does, so the
+	report gets the same totals by adding up the days of a period."""
+	from_date = getdate(from_date)
+
+	previous_qty = frappe.db.sql("""select qty_after_transaction from `tabStock Ledger Entry`
+		where item_code=%s and warehouse=%s and docstatus < 2 and posting_date < %s
+		order by posting_date desc, posting_time desc, creation desc limit 1""",
+		(item_code, warehouse, from_date))
+	bal_qty = flt(previous_qty[0][0]) if previous_qty else 0.0
+
+	condition = "and posting_date <= %(to_date)s" if to_date else ""
+	values = {"item_code": item_code, "warehouse": warehouse, "from_date": from_date, "to_date": to_date}
+
+	entries = frappe.db.sql("""
+		select posting_date, voucher_type, actual_qty, qty_after_transaction,
+			stock_value_difference, valuation_rate, stock_value
+		from `tabStock Ledger Entry`
+		where item_code=%(item_code)s and warehouse=%(warehouse)s and docstatus < 2
+			and posting_date >= %(from_date)s {0}
+		order by posting_date, posting_time, creation, actual_qty""".format(condition), values, as_dict=1)
+
+	float_precision = cint(frappe.db.get_default("float_precision")) or 3
+
+	days = OrderedDict()
+	for sle in entries:
+		if sle.voucher_type == "Stock Reconciliation":
+			qty_diff = flt(sle.qty_after_transaction) - bal_qty
+		else:
+			qty_diff = flt(sle.actual_qty)
+
+		value_diff = flt(sle.stock_value_difference)
+
+		day = days.setdefault(sle.posting_date, frappe._dict({field: 0.0 for field in MOVEMENT_FIELDS}))
+		if flt(qty_diff, float_precision) >= 0:
+			day.in_qty += qty_diff
+			day.in_val += value_diff
+		else:
+			day.out_qty += abs(qty_diff)
+			day.out_val += abs(value_diff)
+
+		day.qty_change += qty_diff
+		day.value_change += value_diff
+		day.update({field: sle.get(field) for field in CLOSING_FIELDS})
+
+		bal_qty += qty_diff
+
+	frappe.db.sql("""delete from `tabStock Movement Summary`
+		where item_code=%(item_code)s and warehouse=%(warehouse)s
+			and posting_date >= %(from_date)s {0}""".format(condition), values)
+
+	insert_movement_summary(item_code, warehouse, company, days)
+
+def insert_movement_summary(item_code, warehouse, company, days):
+	if not company:
+		company = frappe.get_cached_value("Warehouse", warehouse, "company")
+
+	fields = ["name", "creation", "modified", "owner", "modified_by", "docstatus",
+		"item_code", "warehouse", "company", "posting_date"] + list(MOVEMENT_FIELDS + CLOSING_FIELDS)
+
+	timestamp, values = now(), []
+	for posting_date, day in days.items():
+		values.append([frappe.generate_hash(length=10), timestamp, timestamp, "Administrator",
+			"Administrator", 0, item_code, warehouse, company, posting_date]
+			+ [day.get(field) for field in MOVEMENT_FIELDS + CLOSING_FIELDS])
+
+	if values:
+		frappe.db.bulk_insert("Stock Movement Summary", fields, values)
+
+def rebuild_movement_summary(item_code=None):
+	"""Recompute the whole summary of an item (or of all items) from the stock ledger"""
+	condition = "where item_code=%s" if item_code else ""
+	for d in frappe.db.sql("""select distinct item_code, warehouse, company
+		from `tabStock Ledger Entry` {0}""".format(condition), item_code, as_dict=1):
+			update_movement_summary(d.item_code, d.warehouse, d.company, "1900-01-01")
+
+def on_doctype_update():
+	frappe.db.add_index("Stock Movement Summary", ["item_code", "warehouse", "posting_date"])
+	frappe.db.add_index("Stock Movement Summary", ["posting_date", "company"])
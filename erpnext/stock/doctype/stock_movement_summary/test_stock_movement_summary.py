@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and Contributors
+# See license.txt
+from __future__ import unicode_literals
+
+import frappe
+import unittest
+from frappe.utils import add_days, nowdate
+from erpnext.stock.doctype.item.test_item import make_item
+from erpnext.stock.doctype.stock_entry.stock_entry_utils import make_stock_entry
+from erpnext.stock.doctype.stock_reconciliation.test_stock_reconciliation import create_stock_reconciliation
+from erpnext.stock.doctype.stock_movement_summary.stock_movement_summary import rebuild_movement_summary
+from erpnext.stock.report.stock_balance import stock_balance
+from erpnext.stock.stock_balance import repost_actual_qty
+from erpnext.stock.report.stock_analytics import stock_analytics
+
+class TestStockMovementSummary(unittest.TestCase):
+	def setUp(self):
+		self.item_code = make_item("_Test Stock Movement Summary Item", {"is_stock_item": 1}).name
+		self.warehouse = "_Test Warehouse - _TC"
+
+		make_stock_entry(item_code=self.item_code, target=self.warehouse, qty=10, basic_rate=100,
+			posting_date=add_days(nowdate(), -20))
+		make_stock_entry(item_code=self.item_code, source=self.warehouse, qty=4,
+			posting_date=add_days(nowdate(), -10))
+		create_stock_reconciliation(item_code=self.item_code, warehouse=self.warehouse, qty=8, rate=120,
+			posting_date=add_days(nowdate(), -5))
+		make_stock_entry(item_code=self.item_code, target=self.warehouse, qty=3, basic_rate=110)
+
+	def test_summary_updated_on_posting(self):
+		summary = get_summary(self.item_code)
+		self.assertEqual(summary[-1][1], frappe.db.get_value("Bin",
+			{"item_code": self.item_code, "warehouse": self.warehouse}, "actual_qty"))
+
+		# back-dated entry, the days after it are refreshed by the repost
+		make_stock_entry(item_code=self.item_code, source=self.warehouse, qty=1,
+			posting_date=add_days(nowdate(), -15))
+
+		summary = get_summary(self.item_code)
+		rebuild_movement_summary(self.item_code)
+		self.assertEqual(get_summary(self.item_code), summary)
+
+	def test_summary_rebuilt_on_full_repost(self):
+		summary = get_summary(self.item_code)
+
+		frappe.db.sql("""update `tabStock Movement Summary` set in_qty = 0, qty_after_transaction = 0
+			where item_code=%s""", self.item_code)
+
+		# no posting date, like `stock_balance.repost_actual_qty`
+		repost_actual_qty(self.item_code, self.warehouse)
+		self.assertEqual(get_summary(self.item_code), summary)
+
+	def test_reports_read_summary(self):
+		filters = frappe._dict({
+			"company": "_Test Company",
+			"from_date": add_days(nowdate(), -12),
+			"to_date": nowdate(),
+			"item_code": self.item_code,
+			"value_quantity": "Quantity",
+			"range": "Weekly"
+		})
+
+		for report in (stock_balance, stock_analytics):
+			from_summary = report.execute(filters.copy())[1]
+
+			frappe.flags.ignore_stock_movement_summary = True
+			try:
+				from_ledger = report.execute(filters.copy())[1]
+			finally:
+				frappe.flags.ignore_stock_movement_summary = False
+
+			self.assertEqual(from_summary, from_ledger)
+
+def get_summary(item_code):
+	return [list(d) for d in frappe.db.sql("""select posting_date, qty_after_transaction, in_qty, out_qty,
+		qty_change, value_change from `tabStock Movement Summary`
+		where item_code=%s order by posting_date""", item_code)]
@@ -16,6 +16,7 @@ from erpnext.stock.doctype.price_list.price_list import get_price_list_details
 from erpnext.setup.doctype.item_group.item_group import get_item_group_defaults
 from erpnext.setup.doctype.brand.brand import get_brand_defaults
 from erpnext.stock.doctype.item_manufacturer.item_manufacturer import get_item_manufacturer_part_no
+from erpnext.stock.item_details_prefetch import ItemDetailsPrefetch, get_item_details_prefetch
 
 from six import string_types, iteritems
 
@@ -110,6 +111,48 @@ def get_item_details(args, doc=None, for_validate=False, overwrite_warehouse=Tru
 
 	return out
 
+@frappe.whitelist()
+def get_bulk_item_details(args, items, doc=None, for_validate=False, overwrite_warehouse=True):
+	"""Details of all the `items` rows of a document, the same as `get_item_details` of `args`
+	updated with each row, with the prices, conversion factors, bins and pricing rules
+	of all the items fetched once for the document
+
+		args = see `get_item_details`
+		items = [{"item_code": "", "qty": 1.0, "uom": "", "warehouse": "", ...}, ...]
+	"""
+	if isinstance(args, string_types):
+		args = json.loads(args)
+
+	if isinstance(items, string_types):
+		items = json.loads(items)
+
+	if isinstance(doc, string_types):
+		doc = json.loads(doc)
+
+	rows = []
+	for item in items:
+		row = copy.deepcopy(args)
+		row.update(item)
+		rows.append(process_args(row))
+
+	item_codes = set(row.item_code for row in rows if row.item_code)
+	if not item_codes:
+		return [get_item_details(row, doc, for_validate, overwrite_warehouse) for row in rows]
+
+	from erpnext.accounts.doctype.pricing_rule.pricing_rule_index import get_pricing_rule_index
+
+	previous = (frappe.flags.item_details_prefetch, frappe.flags.pricing_rule_index)
+	frappe.flags.item_details_prefetch = ItemDetailsPrefetch(item_codes,
+		price_lists=set(row.price_list for row in rows),
+		default_boms=any(row.get("is_subcontracted") == "Yes" for row in rows))
+
+	# price all the items against the same index, like `apply_pricing_rule`
+	frappe.flags.pricing_rule_index = get_pricing_rule_index()
+	try:
+		return [get_item_details(row, doc, for_validate, overwrite_warehouse) for row in rows]
+	finally:
+		frappe.flags.item_details_prefetch, frappe.flags.pricing_rule_index = previous
+
 def update_stock(args, out):
 	if (args.get("doctype") == "Delivery Note" or
 		(args.get("doctype") == "Sales Invoice" and args.get('update_stock'))) \
@@ -347,7 +390,8 @@ def get_basic_details(args, item, overwrite_warehouse=True):
 			out["manufacturer_part_no"] = None
 			out["manufacturer"] = None
 	else:
-		data = frappe.get_value("Item", item.name,
+		prefetch = get_item_details_prefetch(item.name)
+		data = prefetch.get_item(item.name) if prefetch else frappe.get_value("Item", item.name,
 			["default_item_manufacturer", "default_manufacturer_part_no"] , as_dict=1)
 
 		if data:
@@ -610,6 +654,10 @@ def insert_item_price(args):
 				frappe.msgprint(_("Item Price added for {0} in Price List {1}").format(args.item_code,
 					args.price_list), alert=True)
 
+			prefetch = get_item_details_prefetch(args.item_code)
+			if prefetch:
+				prefetch.add_item_price(args.item_code)
+
 def get_item_price(args, item_code, ignore_party=False):
 	"""
 		Get name, price_list_rate from Item Price based on conditions
@@ -621,6 +669,10 @@ def get_item_price(args, item_code, ignore_party=False):
 
 	args['item_code'] = item_code
 
+	prefetch = get_item_details_prefetch()
+	if prefetch and prefetch.has_prices(args, item_code):
+		return prefetch.get_item_price(args, item_code, ignore_party=ignore_party)
+
 	conditions = """where item_code=%(item_code)s
 		and price_list=%(price_list)s
 		and ifnull(uom, '') in ('', %(uom)s)"""
@@ -697,9 +749,14 @@ def check_packing_list(price_list_rate_name, desired_qty, item_code):
 	"""
 
 	flag = True
-	item_price = frappe.get_doc("Item Price", price_list_rate_name)
-	if item_price.packing_unit:
-		packing_increment = desired_qty % item_price.packing_unit
+	prefetch = get_item_details_prefetch()
+	if prefetch and price_list_rate_name in prefetch.price_packing_units:
+		packing_unit = prefetch.price_packing_units[price_list_rate_name]
+	else:
+		packing_unit = frappe.get_doc("Item Price", price_list_rate_name).packing_unit
+
+	if packing_unit:
+		packing_increment = desired_qty % packing_unit
 
 		if packing_increment != 0:
 			flag = False
@@ -843,6 +900,10 @@ def get_serial_no_batchwise(args, sales_order=None):
 
 @frappe.whitelist()
 def get_conversion_factor(item_code, uom):
+	prefetch = get_item_details_prefetch(item_code)
+	if prefetch:
+		return prefetch.get_conversion_factor(item_code, uom)
+
 	variant_of = frappe.db.get_value("Item", item_code, "variant_of", cache=True)
 	filters = {"parent": item_code, "uom": uom}
 	if variant_of:
@@ -861,6 +922,13 @@ def get_projected_qty(item_code, warehouse):
 
 @frappe.whitelist()
 def get_bin_details(item_code, warehouse):
+	prefetch = get_item_details_prefetch(item_code)
+	if prefetch:
+		bin_details = prefetch.get_bin(item_code, warehouse)
+		return frappe._dict({fieldname: bin_details[fieldname]
+			for fieldname in ("projected_qty", "actual_qty", "reserved_qty")}) if bin_details \
+				else {"projected_qty": 0, "actual_qty": 0, "reserved_qty": 0}
+
 	return frappe.db.get_value("Bin", {"item_code": item_code, "warehouse": warehouse},
 		["projected_qty", "actual_qty", "reserved_qty"], as_dict=True, cache=True) \
 			or {"projected_qty": 0, "actual_qty": 0, "reserved_qty": 0}
@@ -1001,6 +1069,10 @@ def get_price_list_currency_and_exchange_rate(args):
 @frappe.whitelist()
 def get_default_bom(item_code=None):
 	if item_code:
+		prefetch = get_item_details_prefetch(item_code)
+		if prefetch and prefetch.default_boms is not None:
+			return prefetch.get_default_bom(item_code)
+
 		bom = frappe.db.get_value("BOM", {"docstatus": 1, "is_default": 1, "is_active": 1, "item": item_code})
 		if bom:
 			return bom
@@ -1011,14 +1083,23 @@ def get_valuation_rate(item_code, company, warehouse=None):
 	item_group = get_item_group_defaults(item_code, company)
 	brand = get_brand_defaults(item_code, company)
 	# item = frappe.get_doc("Item", item_code)
+	prefetch = get_item_details_prefetch(item_code)
 	if item.get("is_stock_item"):
 		if not warehouse:
 			warehouse = item.get("default_warehouse") or item_group.get("default_warehouse") or brand.get("default_warehouse")
 
+		if prefetch:
+			bin_details = prefetch.get_bin(item_code, warehouse)
+			return frappe._dict({"valuation_rate": bin_details.valuation_rate}) if bin_details \
+				else {"valuation_rate": 0}
+
 		return frappe.db.get_value("Bin", {"item_code": item_code, "warehouse": warehouse},
 			["valuation_rate"], as_dict=True) or {"valuation_rate": 0}
 
 	elif not item.get("is_stock_item"):
+		if prefetch:
+			return {"valuation_rate": prefetch.get_purchase_valuation_rate(item_code)}
+
 		valuation_rate =frappe.db.sql("""select sum(base_net_amount) / sum(qty*conversion_factor)
 			from `tabPurchase Invoice Item`
 			where item_code = %s and docstatus=1""", item_code)
@@ -0,0 +1,157 @@
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and Contributors
+# License: GNU General Public License v3. See license.txt
+
+from __future__ import unicode_literals
+
+import datetime
+
+import frappe
+from frappe.utils import cstr, getdate
+
+class ItemDetailsPrefetch(object):
+	"""Item Prices, UOM conversion factors, Bins and other per item data of all the
+	items of a document, fetched with one query each.
+
+	Consulted by the helpers of `get_item_details` while `get_bulk_item_details` resolves
+	the rows of a document, and answers the same as their per item queries."""
+	def __init__(self, item_codes, price_lists=None, default_boms=False):
+		self.items = {}
+		self.prices = {}
+		self.price_packing_units = {}
+		self.conversion_factors = {}
+		self.uom_conversion_factors = {}
+		self.bins = {}
+		self.purchase_valuation_rates = {}
+		self.default_boms = None
+
+		self.load_items(item_codes)
+
+		# prices and conversion factors of templates are read for their variants
+		self.price_item_codes = set(self.items) | set(d.variant_of for d in self.items.values() if d.variant_of)
+		self.price_lists = set(d for d in price_lists or [] if d)
+
+		self.load_prices(self.price_item_codes)
+		self.load_conversion_factors()
+		self.load_bins()
+		self.load_purchase_valuation_rates()
+		if default_boms:
+			self.load_default_boms()
+
+	def load_items(self, item_codes):
+		for d in frappe.db.sql("""select name, variant_of, stock_uom, is_stock_item,
+				default_item_manufacturer, default_manufacturer_part_no
+			from `tabItem` where name in %s""", [tuple(item_codes)], as_dict=1):
+				self.items[d.name] = d
+
+	def load_prices(self, item_codes):
+		for item_code in item_codes:
+			self.prices[item_code] = []
+
+		if not item_codes or not self.price_lists:
+			return
+
+		for d in frappe.db.sql("""select name, item_code, price_list, uom, customer, supplier,
+				valid_from, valid_upto, price_list_rate, packing_unit
+			from `tabItem Price` where item_code in %s and price_list in %s""",
+			[tuple(item_codes), tuple(self.price_lists)], as_dict=1):
+				self.prices[d.item_code].append(d)
+				self.price_packing_units[d.name] = d.packing_unit
+
+	def load_conversion_factors(self):
+		# latest modified first, like `frappe.db.get_value`
+		for d in frappe.db.sql("""select parent, uom, conversion_factor from `tabUOM Conversion Detail`
+			where parent in %s order by modified desc""", [tuple(self.price_item_codes)], as_dict=1):
+				self.conversion_factors.setdefault(d.uom, []).append(d)
+
+	def load_bins(self):
+		for d in frappe.db.sql("""select item_code, warehouse, projected_qty, actual_qty, reserved_qty,
+				valuation_rate
+			from `tabBin` where item_code in %s""", [tuple(self.items)], as_dict=1):
+				self.bins[(d.item_code, d.warehouse)] = d
+
+	def load_purchase_valuation_rates(self):
+		item_codes = [d.name for d in self.items.values() if not d.is_stock_item]
+		if item_codes:
+			self.purchase_valuation_rates = dict(frappe.db.sql("""
+				select item_code, sum(base_net_amount) / sum(qty*conversion_factor)
+				from `tabPurchase Invoice Item`
+				where item_code in %s and docstatus=1
+				group by item_code""", [tuple(item_codes)]))
+
+	def load_default_boms(self):
+		self.default_boms = {}
+		for item, bom in frappe.db.sql("""select item, name from `tabBOM`
+			where docstatus=1 and is_default=1 and is_active=1 and item in %s
+			order by modified""", [tuple(self.items)]):
+				self.default_boms[item] = bom
+
+	def has_prices(self, args, item_code):
+		return item_code in self.prices and args.get("price_list") in self.price_lists
+
+	def get_item_price(self, args, item_code, ignore_party=False):
+		"""Rows of `get_item_price` as (name, price_list_rate, uom), latest valid first"""
+		transaction_date = getdate(args.get("transaction_date")) if args.get("transaction_date") else None
+
+		rows = []
+		for d in self.prices[item_code]:
+			if d.price_list != args.get("price_list") or (d.uom and d.uom != args.get("uom")):
+				continue
+
+			if not ignore_party:
+				if args.get("customer"):
+					if d.customer != args.get("customer"): continue
+				elif args.get("supplier"):
+					if d.supplier != args.get("supplier"): continue
+				elif d.customer or d.supplier:
+					continue
+
+			if transaction_date and not (getdate(d.valid_from or "2000-01-01")
+				<= transaction_date <= getdate(d.valid_upto or "2500-12-31")):
+					continue
+
+			rows.append(d)
+
+		# nulls last, like `order by valid_from desc, uom desc`
+		rows.sort(key=lambda d: (d.valid_from or datetime.date.min, cstr(d.uom)), reverse=True)
+		return tuple((d.name, d.price_list_rate, d.uom) for d in rows)
+
+	def add_item_price(self, item_code):
+		"""Read the prices of an item again after one was added or changed"""
+		if item_code in self.prices:
+			self.load_prices([item_code])
+
+	def get_conversion_factor(self, item_code, uom):
+		item = self.items[item_code]
+		conversion_factor = None
+		for d in self.conversion_factors.get(uom, []):
+			if d.parent in (item_code, item.variant_of):
+				conversion_factor = d.conversion_factor
+				break
+
+		if not conversion_factor:
+			from erpnext.stock.doctype.item.item import get_uom_conv_factor
+
+			key = (uom, item.stock_uom)
+			if key not in self.uom_conversion_factors:
+				self.uom_conversion_factors[key] = get_uom_conv_factor(uom, item.stock_uom)
+			conversion_factor = self.uom_conversion_factors[key]
+
+		return {"conversion_factor": conversion_factor or 1.0}
+
+	def get_bin(self, item_code, warehouse):
+		return self.bins.get((item_code, warehouse))
+
+	def get_purchase_valuation_rate(self, item_code):
+		return self.purchase_valuation_rates.get(item_code) or 0.0
+
+	def get_item(self, item_code):
+		return self.items[item_code]
+
+	def get_default_bom(self, item_code):
+		return self.default_boms.get(item_code)
+
+def get_item_details_prefetch(item_code=None):
+	"""Prefetch of the document being resolved by `get_bulk_item_details`, if it has the item"""
+	prefetch = frappe.flags.item_details_prefetch
+	if prefetch and (item_code is None or item_code in prefetch.items):
+		return prefetch
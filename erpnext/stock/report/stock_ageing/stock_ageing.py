@@ -4,14 +4,14 @@
 from __future__ import unicode_literals
 import frappe
 from frappe import _
-from frappe.utils import date_diff, flt
+from frappe.utils import date_diff, flt, getdate, nowdate
 from six import iteritems
 from erpnext.stock.doctype.serial_no.serial_no import get_serial_nos
 
 def execute(filters=None):
 
 	columns = get_columns(filters)
-	item_details = get_fifo_queue(filters)
+	item_details = get_item_ageing(filters)
 	to_date = filters["to_date"]
 	_func = lambda x: x[1]
 
@@ -136,6 +136,57 @@ def get_columns(filters):
 
 	return columns
 
+def get_item_ageing(filters):
+	"""FIFO queues with the age of the stock, read from the Stock Age Lots kept up to date
+	on posting if the report is for today's stock, else replayed from the ledger"""
+	if use_age_lots(filters):
+		return get_fifo_queue_from_age_lots(filters)
+
+	return get_fifo_queue(filters)
+
+def use_age_lots(filters):
+	if frappe.flags.ignore_age_lots or getdate(filters.get("to_date")) < getdate(nowdate()):
+		return False
+
+	return not frappe.db.sql("""select name from `tabStock Ledger Entry`
+		where posting_date > %s limit 1""", filters.get("to_date"))
+
+def get_fifo_queue_from_age_lots(filters):
+	item_details = {}
+
+	def get_key(d):
+		return (d.name, d.warehouse) if filters.get('show_warehouse_wise_stock') else d.name
+
+	# every item and warehouse that has stock entries gets a queue, as when replaying
+	for d in frappe.db.sql("""select
+			item.name, item.item_name, item_group, brand, description, item.stock_uom,
+			bin.warehouse, bin.actual_qty
+		from `tabBin` bin,
+			(select name, item_name, description, stock_uom, brand, item_group
+				from `tabItem` {item_conditions}) item
+		where bin.item_code = item.name
+			and bin.warehouse in (select name from `tabWarehouse` where company = %(company)s)
+			{sle_conditions}""" #nosec
+		.format(item_conditions=get_item_conditions(filters),
+			sle_conditions=get_sle_conditions(filters)), filters, as_dict=True):
+		key = get_key(d)
+		item_details.setdefault(key, {"details": d, "fifo_queue": [], "total_qty": 0})
+		item_details[key]["total_qty"] += flt(d.actual_qty)
+
+	for d in frappe.db.sql("""select
+			lot.item_code as name, lot.warehouse, lot.qty, lot.serial_no, lot.posting_date
+		from `tabStock Age Lot` lot,
+			(select name from `tabItem` {item_conditions}) item
+		where lot.item_code = item.name and lot.company = %(company)s
+			{sle_conditions}
+		order by lot.posting_date, lot.idx""" #nosec
+		.format(item_conditions=get_item_conditions(filters),
+			sle_conditions=get_sle_conditions(filters)), filters, as_dict=True):
+		if get_key(d) in item_details:
+			item_details[get_key(d)]["fifo_queue"].append([d.serial_no or d.qty, d.posting_date])
+
+	return item_details
+
 def get_fifo_queue(filters, sle=None):
 	item_details = {}
 	transferred_item_details = {}
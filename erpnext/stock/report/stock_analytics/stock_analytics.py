@@ -5,7 +5,8 @@ from __future__ import unicode_literals
 import frappe
 from frappe import _, scrub
 from frappe.utils import getdate, flt
-from erpnext.stock.report.stock_balance.stock_balance import (get_items, get_stock_ledger_entries, get_item_details)
+from erpnext.stock.report.stock_balance.stock_balance import (get_items, get_stock_ledger_entries, get_item_details,
+	get_conditions, use_movement_summary)
 from erpnext.accounts.utils import get_fiscal_year
 from six import iteritems
 
@@ -142,7 +143,10 @@ def get_periodic_data(entry, filters):
 def get_data(filters):
 	data = []
 	items = get_items(filters)
-	sle = get_stock_ledger_entries(filters, items)
+	if use_movement_summary(filters):
+		sle = get_movement_summary_entries(filters, items)
+	else:
+		sle = get_stock_ledger_entries(filters, items)
 	item_details = get_item_details(items, sle, filters)
 	periodic_data = get_periodic_data(sle, filters)
 	ranges = get_period_date_ranges(filters)
@@ -166,6 +170,24 @@ def get_data(filters):
 
 	return data
 
+def get_movement_summary_entries(filters, items):
+	"""Net change of each item by day from the Stock Movement Summary, in the shape of stock ledger entries"""
+	item_conditions_sql = ''
+	if items:
+		item_conditions_sql = ' and sle.item_code in ({})'\
+			.format(', '.join([frappe.db.escape(i, percent=False) for i in items]))
+
+	return frappe.db.sql("""
+		select
+			sle.item_code, sle.posting_date, 'Stock Movement Summary' as voucher_type,
+			sum(sle.qty_change) as actual_qty, sum(sle.value_change) as stock_value_difference
+		from
+			`tabStock Movement Summary` sle
+		where 1=1 %s %s
+		group by sle.item_code, sle.posting_date
+		order by sle.posting_date""" % #nosec
+		(item_conditions_sql, get_conditions(filters)), as_dict=1)
+
 def get_chart_data(columns):
 	labels = [d.get("label") for d in columns[5:]]
 	chart = {
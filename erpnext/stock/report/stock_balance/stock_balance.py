@@ -23,17 +23,23 @@ def execute(filters=None):
 	include_uom = filters.get("include_uom")
 	columns = get_columns(filters)
 	items = get_items(filters)
-	sle = get_stock_ledger_entries(filters, items)
 
-	if filters.get('show_stock_ageing_data'):
-		filters['show_warehouse_wise_stock'] = True
-		item_wise_fifo_queue = get_fifo_queue(filters, sle)
+	if use_movement_summary(filters):
+		iwb_map = get_item_warehouse_map_from_summary(filters, items)
+		sle = [frappe._dict(item_code=item) for (company, item, warehouse) in iwb_map]
+	else:
+		sle = get_stock_ledger_entries(filters, items)
+
+		if filters.get('show_stock_ageing_data'):
+			filters['show_warehouse_wise_stock'] = True
+			item_wise_fifo_queue = get_fifo_queue(filters, sle)
+
+		iwb_map = get_item_warehouse_map(filters, sle)
 
 	# if no stock ledger entry found return
 	if not sle:
 		return columns, []
 
-	iwb_map = get_item_warehouse_map(filters, sle)
 	item_map = get_item_details(items, sle, filters)
 	item_reorder_detail_map = get_item_reorder_details(item_map.keys())
 
@@ -155,7 +161,18 @@ def get_stock_ledger_entries(filters, items):
 
 	conditions = get_conditions(filters)
 
-	return frappe.db.sql("""
+	# ageing needs the whole history, otherwise start from the latest snapshot before the period
+	snapshot_date = None
+	if not filters.get('show_stock_ageing_data'):
+		snapshot_date = frappe.db.sql("""select max(posting_date) from `tabStock Ledger Snapshot`
+			where posting_date < %s""", filters.get("from_date"))[0][0]
+
+	opening_entries = []
+	if snapshot_date:
+		opening_entries = get_snapshot_entries(snapshot_date, item_conditions_sql, conditions)
+		conditions += " and sle.posting_date > %s" % frappe.db.escape(str(snapshot_date))
+
+	return opening_entries + frappe.db.sql("""
 		select
 			sle.item_code, warehouse, sle.posting_date, sle.actual_qty, sle.valuation_rate,
 			sle.company, sle.voucher_type, sle.qty_after_transaction, sle.stock_value_difference,
@@ -166,6 +183,19 @@ def get_stock_ledger_entries(filters, items):
 		order by sle.posting_date, sle.posting_time, sle.creation, sle.actual_qty""" % #nosec
 		(item_conditions_sql, conditions), as_dict=1)
 
+def get_snapshot_entries(snapshot_date, item_conditions_sql, conditions):
+	"""Balances of the snapshot as opening entries in the shape of stock ledger entries"""
+	return frappe.db.sql("""
+		select
+			sle.item_code, warehouse, sle.posting_date, sle.qty_after_transaction as actual_qty,
+			sle.valuation_rate, sle.company, 'Stock Ledger Snapshot' as voucher_type,
+			sle.qty_after_transaction, sle.stock_value as stock_value_difference,
+			sle.item_code as name, sle.name as voucher_no
+		from
+			`tabStock Ledger Snapshot` sle
+		where sle.posting_date = %s %s %s""" % #nosec
+		(frappe.db.escape(str(snapshot_date)), item_conditions_sql, conditions), as_dict=1)
+
 def get_item_warehouse_map(filters, sle):
 	iwb_map = {}
 	from_date = getdate(filters.get("from_date"))
@@ -213,6 +243,64 @@ def get_item_warehouse_map(filters, sle):
 
 	return iwb_map
 
+def use_movement_summary(filters):
+	"""Openings and period totals can be added up from the daily Stock Movement Summary,
+	ageing needs the entries themselves"""
+	return not (filters.get('show_stock_ageing_data') or frappe.flags.ignore_stock_movement_summary)
+
+def get_item_warehouse_map_from_summary(filters, items):
+	"""Same as `get_item_warehouse_map`, from one aggregate over the days of each item and warehouse"""
+	item_conditions_sql = ''
+	if items:
+		item_conditions_sql = ' and sle.item_code in ({})'\
+			.format(', '.join([frappe.db.escape(i, percent=False) for i in items]))
+
+	conditions = get_conditions(filters)
+	from_date = frappe.db.escape(str(getdate(filters.get("from_date"))))
+
+	iwb_map = {}
+	for d in frappe.db.sql("""
+		select
+			sle.company, sle.item_code, sle.warehouse,
+			sum(case when sle.posting_date < {from_date} then sle.qty_change else 0 end) as opening_qty,
+			sum(case when sle.posting_date < {from_date} then sle.value_change else 0 end) as opening_val,
+			sum(case when sle.posting_date >= {from_date} then sle.in_qty else 0 end) as in_qty,
+			sum(case when sle.posting_date >= {from_date} then sle.in_val else 0 end) as in_val,
+			sum(case when sle.posting_date >= {from_date} then sle.out_qty else 0 end) as out_qty,
+			sum(case when sle.posting_date >= {from_date} then sle.out_val else 0 end) as out_val,
+			sum(sle.qty_change) as bal_qty, sum(sle.value_change) as bal_val
+		from
+			`tabStock Movement Summary` sle
+		where 1=1 {item_conditions} {conditions}
+		group by sle.company, sle.item_code, sle.warehouse""".format(from_date=from_date, #nosec
+			item_conditions=item_conditions_sql, conditions=conditions), as_dict=1):
+			iwb_map[(d.company, d.item_code, d.warehouse)] = frappe._dict({
+				"opening_qty": flt(d.opening_qty), "opening_val": flt(d.opening_val),
+				"in_qty": flt(d.in_qty), "in_val": flt(d.in_val),
+				"out_qty": flt(d.out_qty), "out_val": flt(d.out_val),
+				"bal_qty": flt(d.bal_qty), "bal_val": flt(d.bal_val),
+				"val_rate": 0.0
+			})
+
+	# valuation rate at the end of the last day with entries
+	for d in frappe.db.sql("""
+		select sle.company, sle.item_code, sle.warehouse, sle.valuation_rate
+		from
+			`tabStock Movement Summary` sle
+			inner join (
+				select sle.item_code, sle.warehouse, max(sle.posting_date) as posting_date
+				from `tabStock Movement Summary` sle
+				where 1=1 {item_conditions} {conditions}
+				group by sle.item_code, sle.warehouse
+			) latest on latest.item_code = sle.item_code and latest.warehouse = sle.warehouse
+				and latest.posting_date = sle.posting_date""".format( #nosec
+			item_conditions=item_conditions_sql, conditions=conditions), as_dict=1):
+			if (d.company, d.item_code, d.warehouse) in iwb_map:
+				iwb_map[(d.company, d.item_code, d.warehouse)].val_rate = d.valuation_rate
+
+	float_precision = cint(frappe.db.get_default("float_precision")) or 3
+	return filter_items_with_no_transactions(iwb_map, float_precision)
+
 def filter_items_with_no_transactions(iwb_map, float_precision):
 	for (company, item, warehouse) in sorted(iwb_map):
 		qty_dict = iwb_map[(company, item, warehouse)]
@@ -9,8 +9,9 @@ import frappe
 from frappe import _
 from frappe.utils import flt, cint, getdate
 from erpnext.stock.report.stock_balance.stock_balance import (get_item_details,
-	get_item_reorder_details, get_item_warehouse_map, get_items, get_stock_ledger_entries)
-from erpnext.stock.report.stock_ageing.stock_ageing import get_fifo_queue, get_average_age
+	get_item_reorder_details, get_item_warehouse_map, get_items, get_stock_ledger_entries,
+	use_movement_summary, get_item_warehouse_map_from_summary)
+from erpnext.stock.report.stock_ageing.stock_ageing import get_item_ageing, get_average_age
 from six import iteritems
 
 def execute(filters=None):
@@ -21,12 +22,16 @@ def execute(filters=None):
 	columns = get_columns(filters)
 
 	items = get_items(filters)
-	sle = get_stock_ledger_entries(filters, items)
+	if use_movement_summary(filters):
+		iwb_map = get_item_warehouse_map_from_summary(filters, items)
+		sle = [frappe._dict(item_code=item) for (company, item, warehouse) in iwb_map]
+	else:
+		sle = get_stock_ledger_entries(filters, items)
+		iwb_map = get_item_warehouse_map(filters, sle)
 
 	item_map = get_item_details(items, sle, filters)
-	iwb_map = get_item_warehouse_map(filters, sle)
 	warehouse_list = get_warehouse_list(filters)
-	item_ageing = get_fifo_queue(filters)
+	item_ageing = get_item_ageing(filters)
 	data = []
 	item_balance = {}
 	item_value = {}
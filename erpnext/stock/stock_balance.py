@@ -3,9 +3,16 @@
 
 from __future__ import print_function, unicode_literals
 import frappe
+import json
+import multiprocessing
+import os
+import time
+from functools import partial
+from itertools import groupby
 from frappe.utils import flt, cstr, nowdate, nowtime
 from erpnext.stock.utils import update_bin
 from erpnext.stock.stock_ledger import update_entries_after
+from erpnext.stock.doctype.bin_reservation.bin_reservation import rebuild_bin_reservations
 
 def repost(only_actual=False, allow_negative_stock=False, allow_zero_rate=False, only_bin=False):
 	"""
@@ -17,14 +24,7 @@ def repost(only_actual=False, allow_negative_stock=False, allow_zero_rate=False,
 		existing_allow_negative_stock = frappe.db.get_value("Stock Settings", None, "allow_negative_stock")
 		frappe.db.set_value("Stock Settings", None, "allow_negative_stock", 1)
 
-	item_warehouses = frappe.db.sql("""
-		select distinct item_code, warehouse
-		from
-			(select item_code, warehouse from tabBin
-			union
-			select item_code, warehouse from `tabStock Ledger Entry`) a
-	""")
-	for d in item_warehouses:
+	for d in get_item_warehouses():
 		try:
 			repost_stock(d[0], d[1], allow_zero_rate, only_actual, only_bin, allow_negative_stock)
 			frappe.db.commit()
@@ -35,6 +35,126 @@ def repost(only_actual=False, allow_negative_stock=False, allow_zero_rate=False,
 		frappe.db.set_value("Stock Settings", None, "allow_negative_stock", existing_allow_negative_stock)
 	frappe.db.auto_commit_on_many_writes = 0
 
+def get_item_warehouses():
+	return frappe.db.sql("""
+		select distinct item_code, warehouse
+		from
+			(select item_code, warehouse from tabBin
+			union
+			select item_code, warehouse from `tabStock Ledger Entry`) a
+		order by item_code, warehouse
+	""")
+
+def repost_in_partitions(workers=4, partition_size=100, resume=True, only_actual=False,
+	allow_negative_stock=False, allow_zero_rate=False, only_bin=False):
+	"""
+	Repost everything like `repost`, in partitions of (item, warehouse) pairs handed
+	to `workers` processes, each partition is committed at once.
+
+	Items of committed partitions are kept in a checkpoint file of the site, a run
+	that was interrupted carries on from there when resumed with the same options.
+	Returns the failed partitions as a list of (pairs, traceback).
+	"""
+	options = {
+		"only_actual": only_actual,
+		"allow_negative_stock": allow_negative_stock,
+		"allow_zero_rate": allow_zero_rate,
+		"only_bin": only_bin
+	}
+
+	checkpoint_path = frappe.get_site_path("private", "repost_stock_checkpoint.json")
+	checkpoint = get_repost_checkpoint(checkpoint_path) if resume else None
+	if not checkpoint or checkpoint["options"] != options:
+		checkpoint = {"options": options, "items": []}
+
+	reposted_items = set(checkpoint["items"])
+	item_warehouses = [d for d in get_item_warehouses() if d[0] not in reposted_items]
+	partitions = get_repost_partitions(item_warehouses, partition_size)
+
+	if reposted_items:
+		print("Resuming, {0} item(s) already reposted".format(len(reposted_items)))
+
+	if allow_negative_stock:
+		existing_allow_negative_stock = frappe.db.get_value("Stock Settings", None, "allow_negative_stock")
+		frappe.db.set_value("Stock Settings", None, "allow_negative_stock", 1)
+		frappe.db.commit()
+
+	failed, reposted, start = [], 0, time.time()
+
+	# workers are spawned rather than forked so they do not share the connection of this process
+	pool = multiprocessing.get_context("spawn").Pool(workers, initializer=init_repost_worker,
+		initargs=(frappe.local.site, frappe.local.sites_path))
+	try:
+		for pairs, error in pool.imap_unordered(partial(repost_partition, options), partitions):
+			if error:
+				failed.append((pairs, error))
+			else:
+				checkpoint["items"].extend(sorted(set(d[0] for d in pairs)))
+				save_repost_checkpoint(checkpoint_path, checkpoint)
+
+			reposted += len(pairs)
+			elapsed = time.time() - start
+			print("{0}/{1} item warehouses, {2:.1f} per second, {3} partition(s) failed".format(
+				reposted, len(item_warehouses), reposted / elapsed if elapsed else 0, len(failed)))
+	finally:
+		pool.close()
+		pool.join()
+
+		if allow_negative_stock:
+			frappe.db.set_value("Stock Settings", None, "allow_negative_stock", existing_allow_negative_stock)
+			frappe.db.commit()
+
+	if not failed and os.path.exists(checkpoint_path):
+		os.remove(checkpoint_path)
+
+	return failed
+
+def get_repost_partitions(item_warehouses, partition_size):
+	"""Split the sorted (item, warehouse) pairs in partitions of about `partition_size`
+	pairs, all warehouses of an item go in the same partition"""
+	partitions, partition = [], []
+	for item_code, pairs in groupby(item_warehouses, key=lambda d: d[0]):
+		partition.extend(pairs)
+		if len(partition) >= partition_size:
+			partitions.append(partition)
+			partition = []
+
+	if partition:
+		partitions.append(partition)
+
+	return partitions
+
+def get_repost_checkpoint(path):
+	if os.path.exists(path):
+		with open(path, "r") as f:
+			return json.load(f)
+
+def save_repost_checkpoint(path, checkpoint):
+	# written to a temporary file first so a crash cannot leave a truncated checkpoint
+	with open(path + ".tmp", "w") as f:
+		json.dump(checkpoint, f)
+
+	os.rename(path + ".tmp", path)
+
+def init_repost_worker(site, sites_path):
+	# no auto commit on many writes, a partition is committed or rolled back as a whole
+	# so that the checkpoint never skips items that were only partly reposted
+	frappe.init(site=site, sites_path=sites_path)
+	frappe.connect()
+
+def repost_partition(options, pairs):
+	"""Repost the (item, warehouse) `pairs` and commit them together, in a worker of `repost_in_partitions`"""
+	try:
+		for item_code, warehouse in pairs:
+			repost_stock(item_code, warehouse, options["allow_zero_rate"], options["only_actual"],
+				options["only_bin"], options["allow_negative_stock"])
+
+		frappe.db.commit()
+		return pairs, None
+	except Exception:
+		frappe.db.rollback()
+		return pairs, frappe.get_traceback()
+
 def repost_stock(item_code, warehouse, allow_zero_rate=False,
 	only_actual=False, only_bin=False, allow_negative_stock=False):
 
@@ -42,18 +162,12 @@ def repost_stock(item_code, warehouse, allow_zero_rate=False,
 		repost_actual_qty(item_code, warehouse, allow_zero_rate, allow_negative_stock)
 
 	if item_code and warehouse and not only_actual:
-		qty_dict = {
-			"reserved_qty": get_reserved_qty(item_code, warehouse),
-			"indented_qty": get_indented_qty(item_code, warehouse),
-			"ordered_qty": get_ordered_qty(item_code, warehouse),
-			"planned_qty": get_planned_qty(item_code, warehouse)
-		}
 		if only_bin:
-			qty_dict.update({
+			update_bin_qty(item_code, warehouse, {
 				"actual_qty": get_balance_qty_from_sle(item_code, warehouse)
 			})
 
-		update_bin_qty(item_code, warehouse, qty_dict)
+		rebuild_bin_reservations(item_code, warehouse)
 
 def repost_actual_qty(item_code, warehouse, allow_zero_rate=False, allow_negative_stock=False):
 	update_entries_after({ "item_code": item_code, "warehouse": warehouse },
@@ -4,9 +4,11 @@ from __future__ import unicode_literals
 
 import frappe, erpnext
 from frappe import _
-from frappe.utils import cint, flt, cstr, now, now_datetime
+from frappe.utils import cint, flt, cstr, now, now_datetime, getdate
 from erpnext.stock.utils import get_valuation_method, get_incoming_outgoing_rate_for_cancel
-import json
+from erpnext.stock.valuation import FIFOValuation
+from erpnext.stock.doctype.stock_ledger_snapshot.stock_ledger_snapshot import get_snapshot_dates, update_snapshots
+from erpnext.stock.doctype.stock_movement_summary.stock_movement_summary import update_movement_summary
 
 from six import iteritems
 
@@ -16,14 +18,24 @@ class NegativeStockError(frappe.ValidationError): pass
 _exceptions = frappe.local('stockledger_exceptions')
 # _exceptions = []
 
+# number of entries loaded and written back per statement while reposting
+SLE_UPDATE_BATCH_SIZE = 500
+
+# fields recalculated for each Stock Ledger Entry while reposting
+SLE_COMPUTED_FIELDS = ("qty_after_transaction", "valuation_rate", "stock_value",
+	"stock_queue", "stock_value_difference")
+
 def make_sl_entries(sl_entries, allow_negative_stock=False, via_landed_cost_voucher=False):
 	if sl_entries:
 		from erpnext.stock.utils import update_bin
+		from erpnext.stock.doctype.stock_age_lot.stock_age_lot import update_age_lots
 
 		cancel = sl_entries[0].get("is_cancelled")
 		if cancel:
 			set_as_cancel(sl_entries[0].get('voucher_type'), sl_entries[0].get('voucher_no'))
 
+		# lots taken out by the entries of a voucher, for its entries that bring them in
+		transferred_lots = {}
 		for sle in sl_entries:
 			sle_id = None
 			if via_landed_cost_voucher or cancel:
@@ -46,6 +58,7 @@ def make_sl_entries(sl_entries, allow_negative_stock=False, via_landed_cost_vouc
 
 			if sle.get("actual_qty") or sle.get("voucher_type")=="Stock Reconciliation":
 				sle_id = make_entry(sle, allow_negative_stock, via_landed_cost_voucher)
+				update_age_lots(sle, transferred_lots)
 
 			args = sle.copy()
 			args.update({
@@ -53,6 +66,26 @@ def make_sl_entries(sl_entries, allow_negative_stock=False, via_landed_cost_vouc
 			})
 			update_bin(args, allow_negative_stock, via_landed_cost_voucher)
 
+			if sle_id and not cancel:
+				repost_future_sle(args, allow_negative_stock, via_landed_cost_voucher)
+
+def repost_future_sle(args, allow_negative_stock=False, via_landed_cost_voucher=False):
+	"""Back-dated entries only update their own row on submit,
+	the entries after them are queued to be reposted in the background"""
+	from erpnext.stock.doctype.repost_item_valuation.repost_item_valuation import create_repost_item_valuation_entry
+
+	if is_future_sle_exists(args):
+		create_repost_item_valuation_entry({
+			"item_code": args.get("item_code"),
+			"warehouse": args.get("warehouse"),
+			"posting_date": args.get("posting_date"),
+			"posting_time": args.get("posting_time"),
+			"voucher_type": args.get("voucher_type"),
+			"voucher_no": args.get("voucher_no"),
+			"allow_negative_stock": allow_negative_stock,
+			"via_landed_cost_voucher": via_landed_cost_voucher
+		})
+
 
 def set_as_cancel(voucher_type, voucher_no):
 	frappe.db.sql("""update `tabStock Ledger Entry` set is_cancelled=1,
@@ -85,11 +118,14 @@ class update_entries_after(object):
 				"posting_time": "12:00"
 			}
 	"""
-	def __init__(self, args, allow_zero_rate=False, allow_negative_stock=None, via_landed_cost_voucher=False, verbose=1):
+	def __init__(self, args, allow_zero_rate=False, allow_negative_stock=None, via_landed_cost_voucher=False,
+		verbose=1, bulk_update=True):
 		from frappe.model.meta import get_field_precision
 
 		self.exceptions = []
 		self.verbose = verbose
+		self.bulk_update = bulk_update
+		self.pending_sle_updates = []
 		self.allow_zero_rate = allow_zero_rate
 		self.allow_negative_stock = allow_negative_stock
 		self.via_landed_cost_voucher = via_landed_cost_voucher
@@ -112,26 +148,57 @@ class update_entries_after(object):
 			currency=frappe.get_cached_value('Company',  self.company,  "default_currency"))
 
 		self.prev_stock_value = self.previous_sle.stock_value or 0.0
-		self.stock_queue = json.loads(self.previous_sle.stock_queue or "[]")
+		self.stock_queue = FIFOValuation.loads(self.previous_sle.stock_queue)
 		self.valuation_method = get_valuation_method(self.item_code)
 		self.stock_value_difference = 0.0
 		self.build(args.get('sle_id'))
 
 	def build(self, sle_id):
+		snapshot_dates = get_snapshot_dates(self.args.get("posting_date"))
+		snapshot_balances = []
+		from_date = self.args.get("posting_date")
+
 		if sle_id:
 			sle = get_sle_by_id(sle_id)
 			self.process_sle(sle)
+
+			# snapshots after a back-dated entry are refreshed by its repost
+			if snapshot_dates and not is_future_sle_exists(sle):
+				snapshot_balances = [(d, self.get_balance()) for d in snapshot_dates]
 		else:
 			# includes current entry!
-			entries_to_fix = self.get_sle_after_datetime()
-			for sle in entries_to_fix:
+			for sle in self.get_sle_after_datetime():
+				# a full repost (no posting date) rebuilds from its first entry
+				if not from_date:
+					from_date = sle.posting_date
+
+				while snapshot_dates and getdate(sle.posting_date) > snapshot_dates[0]:
+					snapshot_balances.append((snapshot_dates.pop(0), self.get_balance()))
+
 				self.process_sle(sle)
 
+			snapshot_balances += [(d, self.get_balance()) for d in snapshot_dates]
+
+		self.flush_sle_updates()
+
 		if self.exceptions:
 			self.raise_exceptions()
 
+		update_snapshots(self.item_code, self.warehouse, self.company, snapshot_balances)
+
+		# a single entry only changes its own day, a repost every day after it
+		update_movement_summary(self.item_code, self.warehouse, self.company, from_date or "1900-01-01",
+			from_date if sle_id else None)
 		self.update_bin()
 
+	def get_balance(self):
+		return {
+			"qty_after_transaction": self.qty_after_transaction,
+			"valuation_rate": self.valuation_rate,
+			"stock_value": self.stock_value,
+			"stock_queue": self.stock_queue.dumps()
+		}
+
 	def update_bin(self):
 		# update bin
 		bin_name = frappe.db.get_value("Bin", {
@@ -178,7 +245,7 @@ class update_entries_after(object):
 				# assert
 				self.valuation_rate = sle.valuation_rate
 				self.qty_after_transaction = sle.qty_after_transaction
-				self.stock_queue = [[self.qty_after_transaction, self.valuation_rate]]
+				self.stock_queue = FIFOValuation([[self.qty_after_transaction, self.valuation_rate]])
 				self.stock_value = flt(self.qty_after_transaction) * flt(self.valuation_rate)
 			else:
 				if self.valuation_method == "Moving Average":
@@ -188,7 +255,7 @@ class update_entries_after(object):
 				else:
 					self.get_fifo_values(sle)
 					self.qty_after_transaction += flt(sle.actual_qty)
-					self.stock_value = sum((flt(batch[0]) * flt(batch[1]) for batch in self.stock_queue))
+					self.stock_value = self.stock_queue.total_value
 
 		# rounding as per precision
 		self.stock_value = flt(self.stock_value, self.precision)
@@ -201,10 +268,22 @@ class update_entries_after(object):
 		sle.qty_after_transaction = self.qty_after_transaction
 		sle.valuation_rate = self.valuation_rate
 		sle.stock_value = self.stock_value
-		sle.stock_queue = json.dumps(self.stock_queue)
+		sle.stock_queue = self.stock_queue.dumps()
 		sle.stock_value_difference = stock_value_difference
-		sle.doctype="Stock Ledger Entry"
-		frappe.get_doc(sle).db_update()
+
+		if self.bulk_update:
+			self.pending_sle_updates.append(sle)
+			if len(self.pending_sle_updates) >= SLE_UPDATE_BATCH_SIZE:
+				self.flush_sle_updates()
+		else:
+			sle.doctype="Stock Ledger Entry"
+			frappe.get_doc(sle).db_update()
+
+	def flush_sle_updates(self):
+		"""write the computed values of the processed entries back in one statement"""
+		if self.pending_sle_updates:
+			bulk_update_sle_values(self.pending_sle_updates)
+			self.pending_sle_updates = []
 
 	def validate_negative_stock(self, sle):
 		"""
@@ -329,75 +408,25 @@ class update_entries_after(object):
 		outgoing_rate = flt(sle.outgoing_rate)
 
 		if actual_qty > 0:
-			if not self.stock_queue:
-				self.stock_queue.append([0, 0])
-
-			# last row has the same rate, just updated the qty
-			if self.stock_queue[-1][1]==incoming_rate:
-				self.stock_queue[-1][0] += actual_qty
-			else:
-				if self.stock_queue[-1][0] > 0:
-					self.stock_queue.append([actual_qty, incoming_rate])
-				else:
-					qty = self.stock_queue[-1][0] + actual_qty
-					self.stock_queue[-1] = [qty, incoming_rate]
+			self.stock_queue.add_stock(actual_qty, incoming_rate)
 		else:
-			qty_to_pop = abs(actual_qty)
-			while qty_to_pop:
-				if not self.stock_queue:
-					# Get valuation rate from last sle if exists or from valuation rate field in item master
-					allow_zero_valuation_rate = self.check_if_allow_zero_valuation_rate(sle.voucher_type, sle.voucher_detail_no)
-					if not allow_zero_valuation_rate:
-						_rate = get_valuation_rate(sle.item_code, sle.warehouse,
-							sle.voucher_type, sle.voucher_no, self.allow_zero_rate,
-							currency=erpnext.get_company_currency(sle.company))
-					else:
-						_rate = 0
-
-					self.stock_queue.append([0, _rate])
-
-				index = None
-				if outgoing_rate > 0:
-					# Find the entry where rate matched with outgoing rate
-					for i, v in enumerate(self.stock_queue):
-						if v[1] == outgoing_rate:
-							index = i
-							break
-
-					# If no entry found with outgoing rate, collapse stack
-					if index == None:
-						new_stock_value = sum((d[0]*d[1] for d in self.stock_queue)) - qty_to_pop*outgoing_rate
-						new_stock_qty = sum((d[0] for d in self.stock_queue)) - qty_to_pop
-						self.stock_queue = [[new_stock_qty, new_stock_value/new_stock_qty if new_stock_qty > 0 else outgoing_rate]]
-						break
-				else:
-					index = 0
-
-				# select first batch or the batch with same rate
-				batch = self.stock_queue[index]
-				if qty_to_pop >= batch[0]:
-					# consume current batch
-					qty_to_pop = qty_to_pop - batch[0]
-					self.stock_queue.pop(index)
-					if not self.stock_queue and qty_to_pop:
-						# stock finished, qty still remains to be withdrawn
-						# negative stock, keep in as a negative batch
-						self.stock_queue.append([-qty_to_pop, outgoing_rate or batch[1]])
-						break
-
+			def get_rate_for_empty_queue():
+				# Get valuation rate from last sle if exists or from valuation rate field in item master
+				allow_zero_valuation_rate = self.check_if_allow_zero_valuation_rate(sle.voucher_type, sle.voucher_detail_no)
+				if not allow_zero_valuation_rate:
+					return get_valuation_rate(sle.item_code, sle.warehouse,
+						sle.voucher_type, sle.voucher_no, self.allow_zero_rate,
+						currency=erpnext.get_company_currency(sle.company))
 				else:
-					# qty found in current batch
-					# consume it and exit
-					batch[0] = batch[0] - qty_to_pop
-					qty_to_pop = 0
+					return 0
 
-		stock_value = sum((flt(batch[0]) * flt(batch[1]) for batch in self.stock_queue))
-		stock_qty = sum((flt(batch[0]) for batch in self.stock_queue))
+			self.stock_queue.remove_stock(actual_qty, outgoing_rate, get_rate_for_empty_queue)
 
+		stock_qty = self.stock_queue.total_qty
 		if stock_qty:
-			self.valuation_rate = stock_value / flt(stock_qty)
+			self.valuation_rate = self.stock_queue.total_value / flt(stock_qty)
 
-		if not self.stock_queue:
+		if not len(self.stock_queue):
 			self.stock_queue.append([0, sle.incoming_rate or sle.outgoing_rate or self.valuation_rate])
 
 	def check_if_allow_zero_valuation_rate(self, voucher_type, voucher_detail_no):
@@ -421,10 +450,25 @@ class update_entries_after(object):
 		return get_stock_ledger_entries(self.args, "<=", "desc", "limit 1", for_update=False)
 
 	def get_sle_after_datetime(self):
-		"""get Stock Ledger Entries after a particular datetime, for reposting"""
-		return get_stock_ledger_entries(self.previous_sle or frappe._dict({
-				"item_code": self.args.get("item_code"), "warehouse": self.args.get("warehouse") }),
-			">", "asc", for_update=True, check_serial_no=False)
+		"""get Stock Ledger Entries after a particular datetime, for reposting
+
+		Only the names are locked and loaded upfront, full rows are streamed
+		in chunks so that long histories are never held in memory at once"""
+		previous_sle = self.previous_sle or frappe._dict({
+			"item_code": self.args.get("item_code"), "warehouse": self.args.get("warehouse") })
+
+		sle_names = get_stock_ledger_entries(previous_sle, ">", "asc", for_update=True,
+			check_serial_no=False, fields="name")
+
+		for i in range(0, len(sle_names), SLE_UPDATE_BATCH_SIZE):
+			names = [d.name for d in sle_names[i:i + SLE_UPDATE_BATCH_SIZE]]
+			entries = {d.name: d for d in frappe.db.sql("""
+				select *, timestamp(posting_date, posting_time) as "timestamp"
+				from `tabStock Ledger Entry`
+				where name in ({0})""".format(", ".join(["%s"] * len(names))), names, as_dict=1)}
+
+			for name in names:
+				yield entries[name]
 
 	def raise_exceptions(self):
 		deficiency = min(e["diff"] for e in self.exceptions)
@@ -466,7 +510,7 @@ def get_previous_sle(args, for_update=False):
 	return sle and sle[0] or {}
 
 def get_stock_ledger_entries(previous_sle, operator=None,
-	order="desc", limit=None, for_update=False, debug=False, check_serial_no=True):
+	order="desc", limit=None, for_update=False, debug=False, check_serial_no=True, fields=None):
 	"""get stock ledger entries filtered by specific posting datetime conditions"""
 	conditions = " and timestamp(posting_date, posting_time) {0} timestamp(%(posting_date)s, %(posting_time)s)".format(operator)
 	if previous_sle.get("warehouse"):
@@ -486,18 +530,59 @@ def get_stock_ledger_entries(previous_sle, operator=None,
 		conditions += " and name!=%(name)s"
 
 	return frappe.db.sql("""
-		select *, timestamp(posting_date, posting_time) as "timestamp"
+		select %(fields)s
 		from `tabStock Ledger Entry`
 		where item_code = %%(item_code)s
 		%(conditions)s
 		order by timestamp(posting_date, posting_time) %(order)s, creation %(order)s
 		%(limit)s %(for_update)s""" % {
+			"fields": fields or '*, timestamp(posting_date, posting_time) as "timestamp"',
 			"conditions": conditions,
 			"limit": limit or "",
 			"for_update": for_update and "for update" or "",
 			"order": order
 		}, previous_sle, as_dict=1, debug=debug)
 
+def bulk_update_sle_values(entries):
+	"""Update the computed columns of many Stock Ledger Entries with a single
+	multi-row `update ... case` statement per field"""
+	if not entries:
+		return
+
+	names, values = [d.name for d in entries], []
+	set_clauses = []
+	for fieldname in SLE_COMPUTED_FIELDS:
+		set_clauses.append("`{0}` = case name {1} end".format(fieldname,
+			" ".join(["when %s then %s"] * len(entries))))
+		for d in entries:
+			values.extend([d.name, d.get(fieldname)])
+
+	frappe.db.sql("""
+		update `tabStock Ledger Entry`
+		set {0}
+		where name in ({1})""".format(", ".join(set_clauses), ", ".join(["%s"] * len(names))),
+		tuple(values + names))
+
+def is_future_sle_exists(args):
+	"""Returns True if `args` is back-dated, i.e. the ledger of its item and warehouse
+	already has entries after its posting datetime which need to be reposted.
+
+	Cancelled entries count as well, they and their reversals stay in the ledger and
+	their balances are reposted like those of any other entry."""
+	return bool(frappe.db.sql("""
+		select name
+		from `tabStock Ledger Entry`
+		where item_code = %(item_code)s
+			and warehouse = %(warehouse)s
+			and docstatus < 2
+			and timestamp(posting_date, posting_time) > timestamp(%(posting_date)s, %(posting_time)s)
+		limit 1""", {
+			"item_code": args.get("item_code"),
+			"warehouse": args.get("warehouse"),
+			"posting_date": args.get("posting_date"),
+			"posting_time": args.get("posting_time") or "00:00"
+		}))
+
 def get_sle_by_id(sle_id):
 	return frappe.db.get_all('Stock Ledger Entry',
 		fields=['*', 'timestamp(posting_date, posting_time) as timestamp'],
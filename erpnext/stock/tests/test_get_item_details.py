@@ -0,0 +1,66 @@
+from __future__ import unicode_literals
+import unittest
+
+import frappe
+from frappe.test_runner import make_test_objects
+from erpnext.stock.get_item_details import get_item_details, get_bulk_item_details
+
+test_dependencies = ["Item", "Item Price", "Pricing Rule"]
+
+class TestBulkItemDetails(unittest.TestCase):
+	def setUp(self):
+		make_test_objects("Item Price")
+
+	def test_same_as_per_row(self):
+		args = {
+			"company": "_Test Company",
+			"price_list": "_Test Price List",
+			"currency": "INR",
+			"doctype": "Sales Order",
+			"conversion_rate": 1,
+			"price_list_currency": "INR",
+			"plc_conversion_rate": 1,
+			"order_type": "Sales",
+			"customer": "_Test Customer",
+			"transaction_date": frappe.utils.nowdate()
+		}
+
+		items = [
+			{"item_code": "_Test Item", "qty": 5},
+			{"item_code": "_Test Item 2", "qty": 2, "warehouse": "_Test Warehouse 1 - _TC"},
+			{"item_code": "_Test Item", "qty": 3, "uom": "_Test UOM 1"},
+			{"item_code": "_Test Item Home Desktop 100", "qty": 1},
+			{"item_code": "_Test Non Stock Item", "qty": 4}
+		]
+
+		expected = []
+		for item in items:
+			row = dict(args)
+			row.update(item)
+			expected.append(get_item_details(row))
+
+		self.assertEqual(get_bulk_item_details(args, items), expected)
+
+	def test_same_as_per_row_for_purchase(self):
+		args = {
+			"company": "_Test Company",
+			"price_list": "_Test Price List 2",
+			"currency": "INR",
+			"doctype": "Purchase Order",
+			"conversion_rate": 1,
+			"price_list_currency": "INR",
+			"plc_conversion_rate": 1,
+			"supplier": "_Test Supplier",
+			"transaction_date": frappe.utils.nowdate()
+		}
+
+		items = [{"item_code": item_code, "qty": 2}
+			for item_code in ("_Test Item", "_Test Item 2", "_Test FG Item")]
+
+		expected = []
+		for item in items:
+			row = dict(args)
+			row.update(item)
+			expected.append(get_item_details(row))
+
+		self.assertEqual(get_bulk_item_details(args, items), expected)
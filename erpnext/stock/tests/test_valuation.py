@@ -0,0 +1,122 @@
+from __future__ import unicode_literals
+import json
+import random
+import unittest
+from erpnext.stock import valuation
+from erpnext.stock.valuation import FIFOValuation
+from erpnext.stock.utils import get_fifo_rate
+
+class TestFIFOValuation(unittest.TestCase):
+	def test_incoming_and_outgoing(self):
+		queue = FIFOValuation()
+		queue.add_stock(10, 100)
+		queue.add_stock(5, 100)
+		queue.add_stock(5, 120)
+		self.assertEqual(queue, [[15, 100], [5, 120]])
+
+		queue.remove_stock(-16)
+		self.assertEqual(queue, [[4, 120]])
+		self.assertEqual(queue.total_value, 480)
+
+		queue.remove_stock(-6)
+		self.assertEqual(queue, [[-2, 120]])
+
+		queue.add_stock(3, 150)
+		self.assertEqual(queue, [[1, 150]])
+
+	def test_outgoing_rate_match_and_collapse(self):
+		queue = FIFOValuation([[10, 100], [10, 200]])
+		queue.remove_stock(-5, outgoing_rate=200)
+		self.assertEqual(queue, [[10, 100], [5, 200]])
+
+		queue.remove_stock(-5, outgoing_rate=50)
+		self.assertEqual(queue, [[10, 175.0]])
+
+	def test_serialization(self):
+		bins = [[10, 100], [2.5, 120.5], [-1, 10]]
+		queue = FIFOValuation(bins)
+		self.assertEqual(queue.dumps(), json.dumps(bins))
+
+		queue.remove_stock(-3)
+		self.assertEqual(queue.dumps(), json.dumps(queue.get_bins()))
+		self.assertEqual(FIFOValuation.loads(queue.dumps()), queue)
+
+	def test_against_list_implementation(self):
+		random.seed(11)
+		bins, queue = [], FIFOValuation()
+		for i in range(2000):
+			if random.random() < 0.6:
+				qty, rate = random.randint(1, 20), random.choice([10, 20, 30])
+				list_add_stock(bins, qty, rate)
+				queue.add_stock(qty, rate)
+			else:
+				qty = -random.randint(1, 30)
+				list_remove_stock(bins, qty)
+				queue.remove_stock(qty)
+
+			self.assertEqual(queue, bins)
+			self.assertAlmostEqual(queue.total_qty, sum(d[0] for d in bins))
+			self.assertAlmostEqual(queue.total_value, sum(d[0] * d[1] for d in bins), places=4)
+
+	def test_get_fifo_rate(self):
+		self.assertEqual(get_fifo_rate([[10, 100], [10, 200]], 10), 150)
+		self.assertEqual(get_fifo_rate([[10, 100], [10, 200]], -15), 2000.0 / 15)
+
+	def test_large_queue_is_linear(self):
+		"""consuming a queue of 10k lots one unit at a time encodes each lot about once"""
+		encoder = CountingJSON()
+		queue = FIFOValuation()
+		for i in range(10000):
+			queue.add_stock(1, i + 1)
+
+		valuation_json, valuation.json = valuation.json, encoder
+		try:
+			queue.dumps()
+			for i in range(10000):
+				queue.remove_stock(-1)
+				queue.dumps()
+		finally:
+			valuation.json = valuation_json
+
+		self.assertEqual(len(queue), 0)
+		# a queue serialized afresh after every change would encode ~50 million lots
+		self.assertLessEqual(encoder.calls, 2 * 10000)
+
+class CountingJSON(object):
+	def __init__(self):
+		self.calls = 0
+
+	def dumps(self, obj):
+		self.calls += 1
+		return json.dumps(obj)
+
+	def loads(self, s):
+		return json.loads(s)
+
+def list_add_stock(bins, qty, rate):
+	if not bins:
+		bins.append([0, 0])
+
+	if bins[-1][1] == rate:
+		bins[-1][0] += qty
+	elif bins[-1][0] > 0:
+		bins.append([qty, rate])
+	else:
+		bins[-1] = [bins[-1][0] + qty, rate]
+
+def list_remove_stock(bins, qty):
+	qty_to_pop = abs(qty)
+	while qty_to_pop:
+		if not bins:
+			bins.append([0, 0])
+
+		batch = bins[0]
+		if qty_to_pop >= batch[0]:
+			qty_to_pop -= batch[0]
+			bins.pop(0)
+			if not bins and qty_to_pop:
+				bins.append([-qty_to_pop, batch[1]])
+				break
+		else:
+			batch[0] -= qty_to_pop
+			qty_to_pop = 0
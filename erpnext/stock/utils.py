@@ -92,7 +92,7 @@ def get_stock_balance(item_code, warehouse, posting_date=None, posting_time=None
 		"posting_time": posting_time
 	}
 
-	last_entry = get_previous_sle(args)
+	last_entry = get_previous_sle(args) if with_serial_no else get_previous_sle_or_snapshot(args)
 
 	if with_valuation_rate:
 		if with_serial_no:
@@ -109,6 +109,26 @@ def get_stock_balance(item_code, warehouse, posting_date=None, posting_time=None
 	else:
 		return last_entry.qty_after_transaction if last_entry else 0.0
 
+def get_previous_sle_or_snapshot(args):
+	"""Like `get_previous_sle`, but only looks for entries after the latest snapshot
+	before the posting date and falls back to the snapshot if there are none"""
+	from erpnext.stock.stock_ledger import get_previous_sle
+	from erpnext.stock.doctype.stock_ledger_snapshot.stock_ledger_snapshot import get_snapshot_before
+
+	snapshot = get_snapshot_before(args.get("item_code"), args.get("warehouse"), args.get("posting_date"))
+	if not snapshot:
+		return get_previous_sle(args)
+
+	last_entry = frappe.db.sql("""
+		select * from `tabStock Ledger Entry`
+		where item_code = %(item_code)s and warehouse = %(warehouse)s
+			and posting_date > %(snapshot_date)s
+			and timestamp(posting_date, posting_time) <= timestamp(%(posting_date)s, %(posting_time)s)
+		order by timestamp(posting_date, posting_time) desc, creation desc
+		limit 1""", dict(args, snapshot_date=snapshot.posting_date), as_dict=1)
+
+	return last_entry[0] if last_entry else snapshot
+
 def get_serial_nos_data_after_transactions(args):
 	serial_nos = []
 	data = frappe.db.sql(""" SELECT serial_no, actual_qty
@@ -230,29 +250,16 @@ def get_valuation_method(item_code):
 
 def get_fifo_rate(previous_stock_queue, qty):
 	"""get FIFO (average) Rate from Queue"""
+	from erpnext.stock.valuation import FIFOValuation
+
+	if not isinstance(previous_stock_queue, FIFOValuation):
+		previous_stock_queue = FIFOValuation(previous_stock_queue)
+
 	if flt(qty) >= 0:
-		total = sum(f[0] for f in previous_stock_queue)
-		return sum(flt(f[0]) * flt(f[1]) for f in previous_stock_queue) / flt(total) if total else 0.0
+		total = previous_stock_queue.total_qty
+		return previous_stock_queue.total_value / flt(total) if total else 0.0
 	else:
-		available_qty_for_outgoing, outgoing_cost = 0, 0
-		qty_to_pop = abs(flt(qty))
-		while qty_to_pop and previous_stock_queue:
-			batch = previous_stock_queue[0]
-			if 0 < batch[0] <= qty_to_pop:
-				# if batch qty > 0
-				# not enough or exactly same qty in current batch, clear batch
-				available_qty_for_outgoing += flt(batch[0])
-				outgoing_cost += flt(batch[0]) * flt(batch[1])
-				qty_to_pop -= batch[0]
-				previous_stock_queue.pop(0)
-			else:
-				# all from current batch
-				available_qty_for_outgoing += flt(qty_to_pop)
-				outgoing_cost += flt(qty_to_pop) * flt(batch[1])
-				batch[0] -= qty_to_pop
-				qty_to_pop = 0
-
-		return outgoing_cost / available_qty_for_outgoing
+		return previous_stock_queue.get_outgoing_rate(qty)
 
 def get_valid_serial_nos(sr_nos, qty=0, item_code=''):
 	"""split serial nos, validate and return list of valid serial nos"""
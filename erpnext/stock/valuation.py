@@ -0,0 +1,200 @@
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and Contributors
+# License: GNU General Public License v3. See license.txt
+
+from __future__ import unicode_literals
+import json
+from frappe.utils import flt
+
+# queues up to this length get their totals summed afresh after every change so that
+# the results stay identical to a plain `sum` over the queue; longer queues are kept
+# up to date incrementally
+EXACT_TOTALS_QUEUE_LENGTH = 100
+
+class FIFOValuation(object):
+	"""FIFO stock queue of `[qty, rate]` bins as stored in `Stock Ledger Entry.stock_queue`
+
+	Consumed bins are skipped with a head index instead of being popped from the
+	front of a list, total qty and value are maintained as bins change and each
+	bin keeps its JSON encoding so that serializing only re-encodes changed bins.
+
+		queue = FIFOValuation.loads(sle.stock_queue)
+		queue.add_stock(10, 100)
+		queue.remove_stock(4)
+		sle.stock_queue = queue.dumps()
+	"""
+	def __init__(self, bins=None):
+		self.set_bins(bins or [])
+
+	@classmethod
+	def loads(cls, stock_queue):
+		return cls(json.loads(stock_queue or "[]"))
+
+	def set_bins(self, bins):
+		self._bins = [list(d) for d in bins]
+		self._encoded = [None] * len(self._bins)
+		self._head = 0
+		self._serialized = None
+		self.recompute_totals()
+
+	def get_bins(self):
+		return self._bins[self._head:]
+
+	def __len__(self):
+		return len(self._bins) - self._head
+
+	def __iter__(self):
+		return iter(self.get_bins())
+
+	def __getitem__(self, index):
+		return self.get_bins()[index]
+
+	def __eq__(self, other):
+		return self.get_bins() == (other.get_bins() if isinstance(other, FIFOValuation) else other)
+
+	def __ne__(self, other):
+		return not self == other
+
+	def __repr__(self):
+		return self.dumps()
+
+	def dumps(self):
+		"""JSON of the queue, identical to `json.dumps` of the bins as a list"""
+		if self._serialized is None:
+			for i in range(self._head, len(self._bins)):
+				if self._encoded[i] is None:
+					self._encoded[i] = json.dumps(self._bins[i])
+
+			self._serialized = "[" + ", ".join(self._encoded[self._head:]) + "]"
+
+		return self._serialized
+
+	@property
+	def total_qty(self):
+		return self._total_qty
+
+	@property
+	def total_value(self):
+		return self._total_value
+
+	def recompute_totals(self):
+		bins = self.get_bins()
+		self._total_qty = sum(flt(d[0]) for d in bins)
+		self._total_value = sum(flt(d[0]) * flt(d[1]) for d in bins)
+
+	def add_stock(self, qty, rate):
+		"""Add an incoming lot at the back of the queue, merged into the last
+		bin if it has the same rate or is not positive"""
+		if not len(self):
+			self.append([0, 0])
+
+		last = len(self._bins) - 1
+		if self._bins[last][1] == rate:
+			self.set_bin(last, self._bins[last][0] + qty, rate)
+		elif self._bins[last][0] > 0:
+			self.append([qty, rate])
+		else:
+			self.set_bin(last, self._bins[last][0] + qty, rate)
+
+	def remove_stock(self, qty, outgoing_rate=0, get_rate_for_empty_queue=None):
+		"""Consume `qty` from the front of the queue, or from the first bin with `outgoing_rate`.
+
+		If there is not enough stock the remainder is kept as a negative bin;
+		`get_rate_for_empty_queue` gives the rate of a bin created for an empty queue"""
+		qty_to_pop = abs(qty)
+		while qty_to_pop:
+			if not len(self):
+				self.append([0, get_rate_for_empty_queue() if get_rate_for_empty_queue else 0])
+
+			index = None
+			if outgoing_rate > 0:
+				# Find the entry where rate matched with outgoing rate
+				for i in range(self._head, len(self._bins)):
+					if self._bins[i][1] == outgoing_rate:
+						index = i
+						break
+
+				# If no entry found with outgoing rate, collapse stack
+				if index == None:
+					new_stock_value = self.total_value - qty_to_pop*outgoing_rate
+					new_stock_qty = self.total_qty - qty_to_pop
+					self.set_bins([[new_stock_qty, new_stock_value/new_stock_qty if new_stock_qty > 0 else outgoing_rate]])
+					break
+			else:
+				index = self._head
+
+			# select first batch or the batch with same rate
+			batch = self._bins[index]
+			if qty_to_pop >= batch[0]:
+				# consume current batch
+				qty_to_pop = qty_to_pop - batch[0]
+				self.remove_bin(index)
+				if not len(self) and qty_to_pop:
+					# stock finished, qty still remains to be withdrawn
+					# negative stock, keep in as a negative batch
+					self.append([-qty_to_pop, outgoing_rate or batch[1]])
+					break
+
+			else:
+				# qty found in current batch
+				# consume it and exit
+				self.set_bin(index, batch[0] - qty_to_pop, batch[1])
+				qty_to_pop = 0
+
+	def get_outgoing_rate(self, qty):
+		"""Average rate of consuming `qty` from the front of the queue, the queue is not changed"""
+		available_qty_for_outgoing, outgoing_cost = 0, 0
+		qty_to_pop = abs(flt(qty))
+		for batch in self.get_bins():
+			if not qty_to_pop:
+				break
+
+			if 0 < batch[0] <= qty_to_pop:
+				# if batch qty > 0
+				# not enough or exactly same qty in current batch, clear batch
+				available_qty_for_outgoing += flt(batch[0])
+				outgoing_cost += flt(batch[0]) * flt(batch[1])
+				qty_to_pop -= batch[0]
+			else:
+				# all from current batch
+				available_qty_for_outgoing += flt(qty_to_pop)
+				outgoing_cost += flt(qty_to_pop) * flt(batch[1])
+				qty_to_pop = 0
+
+		return outgoing_cost / available_qty_for_outgoing
+
+	def append(self, batch):
+		self._bins.append(batch)
+		self._encoded.append(None)
+		self._update_totals(flt(batch[0]), flt(batch[0]) * flt(batch[1]))
+
+	def set_bin(self, index, qty, rate):
+		batch = self._bins[index]
+		qty_change = flt(qty) - flt(batch[0])
+		value_change = flt(qty) * flt(rate) - flt(batch[0]) * flt(batch[1])
+
+		batch[0], batch[1] = qty, rate
+		self._encoded[index] = None
+		self._update_totals(qty_change, value_change)
+
+	def remove_bin(self, index):
+		batch = self._bins[index]
+		if index == self._head:
+			self._head += 1
+			if self._head > len(self._bins) // 2:
+				# compact once more than half of the list is consumed
+				del self._bins[:self._head]
+				del self._encoded[:self._head]
+				self._head = 0
+		else:
+			del self._bins[index]
+			del self._encoded[index]
+
+		self._update_totals(-flt(batch[0]), -flt(batch[0]) * flt(batch[1]))
+
+	def _update_totals(self, qty_change, value_change):
+		self._serialized = None
+		if len(self) <= EXACT_TOTALS_QUEUE_LENGTH:
+			self.recompute_totals()
+		else:
+			self._total_qty += qty_change
+			self._total_value += value_change
@@ -0,0 +1,29 @@
+# Copyright (c) 2020, Frappe Technologies Pvt. Ltd. and Contributors
+# License: GNU General Public License v3. See license.txt
+
+from __future__ import unicode_literals
+
+import frappe
+from frappe.utils import now
+
+BULK_UPDATE_BATCH_SIZE = 500
+
+def update_in_bulk(doctype, fields, rows, update_modified=True):
+	"""Set `fields` of many rows of `doctype`, each row being the name followed by the values,
+	and their `modified` timestamp like `frappe.db.set_value` unless `update_modified` is False"""
+	for i in range(0, len(rows), BULK_UPDATE_BATCH_SIZE):
+		batch = rows[i:i + BULK_UPDATE_BATCH_SIZE]
+		values = []
+		assignments = []
+		for j, field in enumerate(fields, 1):
+			assignments.append("`{0}` = case name {1} else `{0}` end".format(field,
+				" ".join(["when %s then %s"] * len(batch))))
+			for row in batch:
+				values.extend([row[0], row[j]])
+
+		if update_modified:
+			assignments.append("`modified` = %s, `modified_by` = %s")
+			values.extend([now(), frappe.session.user])
+
+		frappe.db.sql("""update `tab{0}` set {1} where name in %s""".format(doctype, ", ".join(assignments)),
+			values + [tuple(row[0] for row in batch)])